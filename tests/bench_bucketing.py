@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+按时长分桶组批与按先后顺序组批的对比
+
+片段时长分布默认按播客对话模拟：每段发言的时长服从对数正态分布（中位数
+约4秒），其中约三成是“对、嗯、是的”之类不到1.5秒的简短回应，发言之间的
+停顿服从指数分布；再与转录时一样按 chunk_size 合并（见 batching.merge_spans）。
+给出 --audio 时改用这些录音的VAD时间线（见 vad）得到真实的片段分布。
+
+对每个批大小输出两种组批方式的补齐比例（按“批中片段数 × 最长片段”估算
+的解码代价中浪费的部分）和估算的吞吐提升。加 --measure 时用whisperx模型
+实际转录 --audio 的第一个文件并计时（需要安装whisperx和模型）。
+
+用法:
+    python tests/bench_bucketing.py [--hours 3] [--chunk-size 10] [--batch-sizes 4 8 16]
+    python tests/bench_bucketing.py --audio podcast.wav [--measure]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from transcript.batching import bucket_order, merge_spans, padding_ratio, transcribe_bucketed  # noqa: E402
+
+
+def podcast_spans(hours: float, seed: int = 0):
+    """模拟的播客发言区间 [(start, end)]（秒）"""
+    rng = np.random.default_rng(seed)
+    spans = []
+    t = 0.0
+    while t < hours * 3600:
+        if rng.random() < 0.3:
+            length = rng.uniform(0.3, 1.5)
+        else:
+            length = float(np.clip(rng.lognormal(np.log(4.0), 0.8), 0.5, 60))
+        spans.append((t, t + length))
+        t += length + rng.exponential(0.8)
+    return spans
+
+
+def recording_spans(paths):
+    from transcript.vad import get_timeline
+
+    spans = []
+    for path in paths:
+        timeline = get_timeline(Path(path))
+        print(f"{path}: {timeline.duration:.0f}s，语音 {timeline.speech_duration():.0f}s，"
+              f"{len(timeline.speech)} 个区间")
+        spans.append(timeline.speech)
+    return spans
+
+
+def measure(path: Path, spans, batch_size: int):
+    """用whisperx实际转录，返回 (先后顺序耗时, 分桶耗时)"""
+    from transcript.audio import load_pcm
+    from transcript.transcript import load_whisperx_model, prompt
+
+    model = load_whisperx_model(prompt)
+    audio = load_pcm(path)
+    times = []
+    for bucketed in (False, True):
+        start = time.perf_counter()
+        if transcribe_bucketed(model, audio, spans, batch_size, bucketed=bucketed) is None:
+            raise RuntimeError("模型不支持直接批量推理（加载时未指定语言）")
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hours", type=float, default=3, help="模拟的录音时长")
+    parser.add_argument("--audio", nargs="+", help="使用这些16kHz单声道WAV的VAD时间线")
+    parser.add_argument("--chunk-size", type=float, default=10, help="WHISPERX_CHUNK_SIZE")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--measure", action="store_true", help="用whisperx实际计时")
+    args = parser.parse_args()
+
+    if args.audio:
+        groups = recording_spans(args.audio)
+    else:
+        groups = [podcast_spans(args.hours)]
+    segments = [merge_spans(spans, args.chunk_size) for spans in groups]
+    durations = [end - start for spans in segments for start, end in spans]
+    print(f"{len(durations)} 个片段，时长中位数 {np.median(durations):.1f}s，"
+          f"P10 {np.percentile(durations, 10):.1f}s，P90 {np.percentile(durations, 90):.1f}s")
+
+    order = bucket_order(durations)
+    print(f"{'批大小':>6} {'顺序补齐':>10} {'分桶补齐':>10} {'吞吐提升':>10}")
+    for batch_size in args.batch_sizes:
+        arrival = padding_ratio(durations, batch_size)
+        bucketed = padding_ratio(durations, batch_size, order)
+        # 有效工作量相同，吞吐之比等于总代价的反比
+        gain = (1 - bucketed) / (1 - arrival)
+        print(f"{batch_size:>8} {arrival:>10.1%} {bucketed:>10.1%} {gain:>9.2f}x")
+
+    if args.measure:
+        if not args.audio:
+            parser.error("--measure 需要 --audio")
+        batch_size = args.batch_sizes[0]
+        arrival, bucketed = measure(Path(args.audio[0]), segments[0], batch_size)
+        print(f"whisperx实测（batch_size={batch_size}）: 顺序 {arrival:.1f}s，分桶 {bucketed:.1f}s，"
+              f"提升 {arrival / bucketed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
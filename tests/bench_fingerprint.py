@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+抽样指纹与全文哈希的耗时对比
+
+在临时目录中生成不同大小的文件（默认100MB、1GB、10GB；除抽样块外为稀疏
+文件，不占实际磁盘空间），分别计时 sampled_fingerprint 和全文sha256。
+抽样指纹的耗时应与文件大小无关，保持在几毫秒以内。
+
+用法:
+    python tests/bench_fingerprint.py [--sizes 0.1 1 10] [--full-limit 1] [--dir /path]
+
+--full-limit 以上（GB）的文件跳过全文哈希；--dir 指定放在真实磁盘上，
+测试冷缓存时先执行 `sync; echo 3 > /proc/sys/vm/drop_caches`。
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from transcript.cache import SAMPLE_BLOCK, SAMPLE_COUNT, content_hash, sampled_fingerprint  # noqa: E402
+
+
+def make_file(path: Path, size: int):
+    """稀疏文件，在每个抽样位置写入随机数据，保证读到的是真实数据块"""
+    with open(path, "wb") as f:
+        f.truncate(size)
+        step = max(1, (size - SAMPLE_BLOCK) // (SAMPLE_COUNT - 1))
+        for i in range(SAMPLE_COUNT):
+            f.seek(min(i * step, max(0, size - SAMPLE_BLOCK)))
+            f.write(os.urandom(min(SAMPLE_BLOCK, size)))
+
+
+def timeit(func, repeat: int):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[0.1, 1, 10],
+                        help="文件大小（GB）")
+    parser.add_argument("--full-limit", type=float, default=1,
+                        help="超过此大小（GB）跳过全文哈希")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--dir", default=None, help="生成文件的目录")
+    args = parser.parse_args()
+
+    print(f"{'大小':>8} {'抽样(ms)':>10} {'全文(ms)':>12}")
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for gb in args.sizes:
+            path = Path(tmp) / f"{gb}g.bin"
+            make_file(path, int(gb * 1024 ** 3))
+            sampled = timeit(lambda: sampled_fingerprint(path), args.repeat)
+            if gb <= args.full_limit:
+                full = f"{timeit(lambda: content_hash(path), 1) * 1000:>12.1f}"
+            else:
+                full = f"{'跳过':>10}"
+            print(f"{gb:>6}GB {sampled * 1000:>10.2f} {full}")
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
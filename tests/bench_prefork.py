@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+预加载fork工作进程池的内存基准
+
+分别以"每个进程各自加载模型"（spawn）和"父进程预加载后fork"两种方式，
+对 transcript() 路径和 merge() 中的字幕对齐路径（align_subtitles_with_audio，
+merge里唯一加载模型的步骤）各跑一遍，打印每个工作进程的 RSS/PSS/USS。
+
+USS（进程独占内存）是多开一个工作进程的真实代价；fork模式下对齐和说话人
+模型的权重计入共享内存，USS应明显下降。
+
+用法:
+    python tests/bench_prefork.py a.mp4 b.mp4 [-j 2]
+
+需要完整的运行环境（whisperx、speechbrain、ffmpeg及已下载的模型）。
+"""
+
+import argparse
+import multiprocessing
+import shutil
+import sys
+import tempfile
+from functools import partial
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from transcript.pool import _run_job, run_prefork  # noqa: E402
+
+
+def transcript_job(media, output_dir):
+    from transcript.transcript import transcript
+
+    transcript(Path(media), Path(output_dir), enable_diarization=True)
+
+
+def align_job(media, output_dir):
+    from transcript.transcript import align_subtitles_with_audio
+
+    media = Path(media)
+    srt = Path(output_dir) / f"{media.stem}.srt"
+    align_subtitles_with_audio(media, srt, Path(output_dir) / f"{media.stem}-aligned.srt")
+
+
+def run_spawn(func, jobs, workers):
+    """对照组：每个子进程从零开始加载模型"""
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers) as pool:
+        return pool.map(partial(_run_job, func), jobs, chunksize=1)
+
+
+def report(title, results):
+    print(f"\n=== {title} ===")
+    print(f"{'pid':>8} {'RSS(MB)':>10} {'PSS(MB)':>10} {'USS(MB)':>10}  任务")
+    for item in results:
+        mem = item["memory"]
+        print(f"{item['pid']:>8} {mem['rss'] / 1024 ** 2:>10.0f} {mem['pss'] / 1024 ** 2:>10.0f} "
+              f"{mem['uss'] / 1024 ** 2:>10.0f}  {Path(item['job']).name}"
+              + ("  (失败)" if item["error"] else ""))
+    uss = [item["memory"]["uss"] for item in results]
+    print(f"平均USS: {sum(uss) / len(uss) / 1024 ** 2:.0f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预加载fork工作进程池内存基准")
+    parser.add_argument("media", nargs="+", help="音视频文件")
+    parser.add_argument("-j", "--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    output_dir = Path(tempfile.mkdtemp(prefix="bench-prefork-"))
+    jobs = [str(Path(m).resolve()) for m in args.media]
+
+    try:
+        transcript_func = partial(transcript_job, output_dir=str(output_dir))
+        report("transcript() - spawn（各自加载）", run_spawn(transcript_func, jobs, args.workers))
+        report("transcript() - prefork（共享模型）",
+               run_prefork(transcript_func, jobs, args.workers))
+
+        align_func = partial(align_job, output_dir=str(output_dir))
+        report("merge()对齐 - spawn（各自加载）", run_spawn(align_func, jobs, args.workers))
+        report("merge()对齐 - prefork（共享模型）",
+               run_prefork(align_func, jobs, args.workers, preload=("align",)))
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
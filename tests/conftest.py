@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+测试共用的工具：写出16kHz单声道WAV，以及按块“转录”的假ASR后端
+
+    from conftest import SR, BlockBackend, write_wav
+"""
+
+import wave
+
+import numpy as np
+import pytest
+
+from transcript import asr, reuse, vad
+from transcript.audio import PCMBuffer
+
+SR = 16000
+
+
+def write_wav(path, samples, sample_rate: int = SR):
+    """
+    写出16位单声道WAV
+
+    Args:
+        samples: int16数组，或逐块给出的int16数组（长录音不必整段放进内存）
+    """
+    blocks = [samples] if isinstance(samples, np.ndarray) else samples
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        for block in blocks:
+            f.writeframes(np.asarray(block).astype("<i2").tobytes())
+    return path
+
+
+class BlockBackend(asr.ASRBackend):
+    """
+    每 block_seconds 秒一个片段，文本为该块中间的采样值（测试据此核对位置）；
+    记录每次转录的音频时长
+    """
+
+    name = "blocks"
+    block_seconds = 1.0
+    seconds = []
+
+    def available(self):
+        return True
+
+    def transcribe(self, audio_path, prompt):
+        block = int(self.block_seconds * SR)
+        with PCMBuffer(audio_path) as audio:
+            self.seconds.append(len(audio) / SR)
+            return [{"start": i * self.block_seconds, "end": (i + 1) * self.block_seconds,
+                     "text": str(int(audio.pcm[i * block + block // 2]))}
+                    for i in range(len(audio) // block)]
+
+
+@pytest.fixture
+def block_backend(tmp_path, monkeypatch):
+    """只注册 BlockBackend，缓存放在临时目录，清空各模块的进程内记忆"""
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("TRANSCRIPT_ASR_BACKEND", raising=False)
+    monkeypatch.delenv("TRANSCRIPT_CACHE", raising=False)
+    monkeypatch.setattr(asr, "_backends", {})
+    monkeypatch.setattr(vad, "_memo", {})
+    monkeypatch.setattr(reuse, "_memo", {})
+    monkeypatch.setattr(BlockBackend, "seconds", [])
+    asr.register_backend(BlockBackend)
+    return BlockBackend
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+测试转录批大小的内存自适应与OOM回退（使用假模型）
+"""
+
+import numpy as np
+import pytest
+
+from transcript import hardware
+from transcript.transcript import asr_windows, is_out_of_memory, transcribe_array
+
+SR = 16000
+GB = 1024 ** 3
+
+
+class FakeModel:
+    """batch_size超过max_batch时抛出内存错误，每个窗口返回一个片段"""
+
+    def __init__(self, max_batch, error=MemoryError("std::bad_alloc")):
+        self.max_batch = max_batch
+        self.error = error
+        self.calls = []
+
+    def transcribe(self, audio, batch_size, **kwargs):
+        self.calls.append((len(audio), batch_size))
+        if batch_size > self.max_batch:
+            raise self.error
+        return {"segments": [{"start": 1.0, "end": 2.0, "text": "你好",
+                              "words": [{"word": "你", "start": 1.0, "end": 1.5}]}]}
+
+
+@pytest.fixture
+def plenty_of_memory(monkeypatch):
+    monkeypatch.setattr(hardware, "available_memory", lambda: 64 * GB)
+
+
+def test_batch_size_for_memory():
+    assert hardware.batch_size_for_memory(16, available=64 * GB) == 16
+    assert hardware.batch_size_for_memory(16, available=3 * GB) == 4
+    assert hardware.batch_size_for_memory(16, available=GB) == 1
+    # 无法读取内存时使用上限
+    assert hardware.batch_size_for_memory(16, available=0) == 16
+
+
+def test_is_out_of_memory():
+    assert is_out_of_memory(MemoryError())
+    assert is_out_of_memory(RuntimeError("CUDA out of memory"))
+    assert not is_out_of_memory(ValueError("bad input"))
+
+
+def test_windows_cut_at_quiet_point():
+    audio = np.ones(25 * SR, dtype=np.float32)
+    audio[12 * SR:int(12.5 * SR)] = 0
+    bounds = asr_windows(audio, window=10, search=5)
+    assert bounds[0] == (0, 12 * SR)
+    assert bounds[-1][1] == len(audio)
+    assert all(a[1] == b[0] for a, b in zip(bounds, bounds[1:]))
+
+
+def test_oom_halves_and_retries_only_current_window(plenty_of_memory, monkeypatch):
+    monkeypatch.setattr("transcript.transcript.ASR_WINDOW_SECONDS", 10)
+    audio = np.ones(25 * SR, dtype=np.float32)
+    model = FakeModel(max_batch=2)
+
+    segments, batch = transcribe_array(model, audio, batch_size=8, chunk_size=5)
+
+    assert batch == 2
+    # 第一个窗口 8 -> 4 -> 2，之后的窗口直接用2
+    assert [b for _, b in model.calls] == [8, 4, 2, 2, 2]
+    assert len(segments) == 3
+    # 时间戳按窗口起点平移
+    starts = [s["start"] for s in segments]
+    assert starts[0] == 1.0 and starts[1] > 10
+    assert segments[1]["words"][0]["start"] == segments[1]["start"]
+
+
+def test_other_errors_propagate(plenty_of_memory):
+    model = FakeModel(max_batch=0, error=ValueError("bad input"))
+    with pytest.raises(ValueError):
+        transcribe_array(model, np.ones(SR, dtype=np.float32), batch_size=4, chunk_size=5)
+    assert len(model.calls) == 1
+
+
+def test_memory_caps_initial_batch(monkeypatch):
+    monkeypatch.setattr(hardware, "available_memory", lambda: 3 * GB)
+    model = FakeModel(max_batch=16)
+    _, batch = transcribe_array(model, np.ones(SR, dtype=np.float32), batch_size=16, chunk_size=5)
+    assert batch == 4
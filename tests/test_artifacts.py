@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+测试零拷贝的文件搬运
+"""
+
+import os
+
+import pytest
+
+from transcript import artifacts
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    artifacts.report()
+
+
+@pytest.fixture
+def cross_device(monkeypatch):
+    """模拟跨设备：硬链接和reflink都不可用"""
+    monkeypatch.setattr(artifacts, "_hardlink", lambda src, dst: False)
+    monkeypatch.setattr(artifacts, "_reflink", lambda src, dst: False)
+
+
+def make_source(tmp_path, data=b"x" * 4096):
+    src = tmp_path / "raw" / "talk.mp4"
+    src.parent.mkdir(exist_ok=True)
+    src.write_bytes(data)
+    return src
+
+
+def test_stage_links_and_reuses(tmp_path):
+    src = make_source(tmp_path)
+    dst = tmp_path / "work" / "talk.mp4"
+
+    assert artifacts.stage(src, dst) in ("hardlink", "reflink")
+    assert dst.read_bytes() == src.read_bytes()
+    assert dst.stat().st_mtime_ns == src.stat().st_mtime_ns
+    assert artifacts.stats() == {"files": 1, "avoided": 4096, "copied": 0}
+
+    assert artifacts.stage(src, dst) == "reuse"
+    assert artifacts.stats()["files"] == 1
+
+
+def test_stage_falls_back_to_validated_symlink(tmp_path, cross_device, monkeypatch):
+    src = make_source(tmp_path)
+    dst = tmp_path / "work" / "talk.mp4"
+
+    assert artifacts.stage(src, dst) == "symlink"
+    assert dst.is_symlink()
+    assert artifacts.stage(src, dst) == "reuse"
+
+    # 只改mtime、内容不变：默认的抽样指纹包含mtime，视为变化；全文指纹
+    # 按内容判断，仍然有效
+    os.utime(src, ns=(0, 10 ** 18))
+    assert not artifacts.is_valid(src, dst)
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TRANSCRIPT_FINGERPRINT", "full")
+    assert artifacts.stage(src, dst) == "symlink"
+    os.utime(src, ns=(0, 2 * 10 ** 18))
+    assert artifacts.is_valid(src, dst)
+
+    # 内容变化：重新放置
+    src.write_bytes(b"y" * 4096)
+    assert not artifacts.is_valid(src, dst)
+    assert artifacts.stage(src, dst) == "symlink"
+    assert artifacts.is_valid(src, dst)
+
+
+def test_stage_replaces_stale_copy(tmp_path):
+    src = make_source(tmp_path)
+    dst = tmp_path / "work" / "talk.mp4"
+    dst.parent.mkdir()
+    dst.write_bytes(b"stale")
+
+    assert artifacts.stage(src, dst) != "reuse"
+    assert dst.read_bytes() == src.read_bytes()
+
+
+def test_publish_never_symlinks(tmp_path, cross_device):
+    src = make_source(tmp_path)
+    dst = tmp_path / "out" / "talk-final.mp4"
+
+    assert artifacts.publish(src, dst) == "copy"
+    assert not dst.is_symlink()
+    assert dst.read_bytes() == src.read_bytes()
+    assert artifacts.stats() == {"files": 1, "avoided": 0, "copied": 4096}
+
+
+def test_publish_overwrites_previous_output(tmp_path, capsys):
+    src = make_source(tmp_path)
+    dst = tmp_path / "out" / "talk-final.mp4"
+    dst.parent.mkdir()
+    dst.write_bytes(b"old output")
+
+    assert artifacts.publish(src, dst) in ("reflink", "copy")
+    assert dst.read_bytes() == src.read_bytes()
+
+    artifacts.report()
+    assert "文件搬运: 1 个文件" in capsys.readouterr().out
+    assert artifacts.stats()["files"] == 0
+
+
+def test_publish_survives_in_place_rewrite(tmp_path):
+    src = make_source(tmp_path)
+    dst = tmp_path / "out" / "talk-final.mp4"
+    dst.parent.mkdir()
+    # 以前用硬链接发布的成品
+    os.link(src, dst)
+
+    artifacts.publish(src, dst)
+    assert not dst.samefile(src)
+
+    # 工作文件被就地截断重写，成品不受影响
+    with open(src, "wb") as f:
+        f.write(b"partial")
+    assert dst.read_bytes() == b"x" * 4096
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+测试ASR后端选择、回退以及与后端无关的说话人分离阶段（使用假后端）
+"""
+
+import wave
+
+import pysubs2
+import pytest
+
+from transcript import asr
+from transcript import transcript as core
+
+
+def make_backend(name, fail=False, calls=None, priority=100):
+    class FakeBackend(asr.ASRBackend):
+        def available(self):
+            return True
+
+        def transcribe(self, audio_path, prompt):
+            if calls is not None:
+                calls.append(name)
+            if fail:
+                raise RuntimeError(f"{name} failed")
+            return [{"start": 0.0, "end": 1.0, "text": f"来自{name}"}]
+
+    FakeBackend.name = name
+    FakeBackend.priority = priority
+    return FakeBackend
+
+
+@pytest.fixture
+def backends(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("TRANSCRIPT_ASR_BACKEND", raising=False)
+    monkeypatch.delenv("TRANSCRIPT_ASR_EXPLORE", raising=False)
+    registry = {}
+    monkeypatch.setattr(asr, "_backends", registry)
+    return registry
+
+
+@pytest.fixture
+def wav(tmp_path):
+    path = tmp_path / "audio.wav"
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(b"\0\0" * 16000 * 2)
+    return path
+
+
+def names(backends):
+    return [backend.name for backend in backends]
+
+
+def test_fastest_first_then_unmeasured(backends, monkeypatch):
+    asr.register_backend(make_backend("slow", priority=1))
+    asr.register_backend(make_backend("fast", priority=2))
+    asr.register_backend(make_backend("new", priority=3))
+
+    asr.record_speed("slow", elapsed=10, duration=10)
+    asr.record_speed("fast", elapsed=1, duration=10)
+
+    assert names(asr.select_backends()) == ["fast", "slow", "new"]
+    assert names(asr.select_backends("slow"))[0] == "slow"
+
+    # 探索模式：没有测量数据的后端先跑一次
+    monkeypatch.setenv("TRANSCRIPT_ASR_EXPLORE", "1")
+    assert names(asr.select_backends()) == ["new", "fast", "slow"]
+
+
+def test_realtime_factor_recorded(backends, wav):
+    backend = asr.register_backend(make_backend("a"))()
+    assert backend.realtime_factor() is None
+    backend.run(wav, "")
+    assert backend.realtime_factor() is not None
+    assert asr.load_speeds()["a"]["runs"] == 1
+    assert asr.audio_duration(wav) == 2.0
+
+
+def test_fallback_to_next_backend(backends, wav, tmp_path):
+    calls = []
+    asr.register_backend(make_backend("broken", fail=True, calls=calls, priority=1))
+    asr.register_backend(make_backend("ok", calls=calls, priority=2))
+
+    srt = tmp_path / "out.srt"
+    used = core.transcribe_to_srt(wav, srt, "")
+
+    assert used == "ok"
+    assert calls == ["broken", "ok"]
+    assert pysubs2.load(str(srt))[0].text == "来自ok"
+
+
+def test_all_backends_fail_leaves_empty_srt(backends, wav, tmp_path):
+    asr.register_backend(make_backend("broken", fail=True))
+    srt = tmp_path / "out.srt"
+    with pytest.raises(RuntimeError):
+        core.transcribe_to_srt(wav, srt, "")
+    assert srt.exists() and not srt.read_text().strip()
+
+
+def test_diarization_is_backend_independent(backends, wav, tmp_path, monkeypatch):
+    asr.register_backend(make_backend("whisper.cpp"))
+    seen = []
+
+    def fake_diarize(segments, input_audio):
+        seen.append(segments)
+        subs = pysubs2.load_from_whisper(segments)
+        for event in subs:
+            event.text = f"[SPEAKER_00] {event.text}"
+        return subs
+
+    monkeypatch.setattr(core, "diarize_segments", fake_diarize)
+    srt = tmp_path / "out.srt"
+    core.transcribe_to_srt(wav, srt, "", enable_diarization=True)
+
+    assert seen[0][0]["text"] == "来自whisper.cpp"
+    assert pysubs2.load(str(srt))[0].text.startswith("[SPEAKER_00]")
+
+
+def test_results_cached_by_audio_settings_and_prompt(backends, wav, tmp_path, monkeypatch):
+    calls = []
+    asr.register_backend(make_backend("whisper.cpp", calls=calls))
+    srt = tmp_path / "out.srt"
+
+    core.transcribe_to_srt(wav, srt, "提示")
+    core.transcribe_to_srt(wav, srt, "提示")
+    assert calls == ["whisper.cpp"]
+    assert pysubs2.load(str(srt))[0].text == "来自whisper.cpp"
+
+    # 相同内容的另一个文件同样命中
+    copy = tmp_path / "copy.wav"
+    copy.write_bytes(wav.read_bytes())
+    core.transcribe_to_srt(copy, srt, "提示")
+    assert len(calls) == 1
+
+    core.transcribe_to_srt(wav, srt, "另一个提示")
+    assert len(calls) == 2
+
+    monkeypatch.setattr(asr.ASRBackend, "settings", lambda self: {"model": "small"})
+    core.transcribe_to_srt(wav, srt, "提示")
+    assert len(calls) == 3
+
+    monkeypatch.setenv("TRANSCRIPT_CACHE", "0")
+    core.transcribe_to_srt(wav, srt, "提示")
+    assert len(calls) == 4
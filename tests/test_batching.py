@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+测试按时长分桶的语音片段批处理（使用假的whisperx流水线）
+"""
+
+import numpy as np
+import pytest
+
+from transcript import batching, vad
+from transcript.transcript import transcribe_array
+
+SR = 16000
+
+
+class FakePipeline:
+    """模拟 FasterWhisperPipeline：按batch_size组批，文本为片段时长（秒）"""
+
+    def __init__(self, tokenizer="zh"):
+        self.tokenizer = tokenizer
+        self.batches = []
+
+    def __call__(self, inputs, batch_size, num_workers=0):
+        items = [item["inputs"] for item in inputs]
+        for first in range(0, len(items), batch_size):
+            batch = items[first:first + batch_size]
+            self.batches.append([len(x) / SR for x in batch])
+            for x in batch:
+                yield {"text": f"{len(x) / SR:g}"}
+
+    def transcribe(self, audio, **kwargs):
+        return {"segments": [{"start": 0.0, "end": len(audio) / SR, "text": "整段"}]}
+
+
+def test_merge_spans():
+    spans = [(0, 2), (2.5, 6), (7, 12), (13, 40)]
+    assert batching.merge_spans(spans, 10) == [(0, 6), (7, 12), (13, 23), (23, 33), (33, 40)]
+
+
+def test_padding_ratio_drops_when_bucketed():
+    durations = [10, 1, 1, 1, 10, 1, 1, 1]
+    arrival = batching.padding_ratio(durations, 4)
+    bucketed = batching.padding_ratio(durations, 4, batching.bucket_order(durations))
+    assert arrival == pytest.approx(1 - 26 / 80)
+    assert bucketed == pytest.approx(1 - 26 / 44)
+
+
+def test_bucketed_batches_restore_order():
+    model = FakePipeline()
+    spans = [(0, 1), (2, 10), (11, 12), (13, 20), (21, 21.5), (22, 30)]
+    audio = np.zeros(30 * SR, dtype=np.float32)
+
+    segments = batching.transcribe_bucketed(model, audio, spans, batch_size=3)
+
+    assert model.batches == [[8, 8, 7], [1, 1, 0.5]]
+    assert [(s["start"], s["end"]) for s in segments] == spans
+    assert [s["text"] for s in segments] == ["1", "8", "1", "7", "0.5", "8"]
+
+
+def test_unsupported_model_falls_back():
+    assert batching.transcribe_bucketed(FakePipeline(tokenizer=None), np.zeros(SR), [(0, 1)], 4) is None
+
+
+def test_transcribe_array_uses_timeline(monkeypatch):
+    timeline = vad.VADTimeline([(1, 3), (3.5, 20), (25, 26)], 30)
+    audio = np.zeros(30 * SR, dtype=np.float32)
+
+    # 默认使用whisperx自带的VAD和组批
+    monkeypatch.delenv("TRANSCRIPT_BUCKET_BATCH", raising=False)
+    model = FakePipeline()
+    segments, _ = transcribe_array(model, audio, batch_size=2, chunk_size=10, timeline=timeline)
+    assert [s["text"] for s in segments] == ["整段"] and not model.batches
+
+    monkeypatch.setenv("TRANSCRIPT_BUCKET_BATCH", "1")
+    model = FakePipeline()
+    segments, _ = transcribe_array(model, audio, batch_size=2, chunk_size=10, timeline=timeline)
+    assert [(s["start"], s["end"]) for s in segments] == [(1, 3), (3.5, 13.5), (13.5, 20), (25, 26)]
+    assert model.batches == [[10, 6.5], [2, 1]]
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+测试长录音分块并行转录
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pysubs2
+import pytest
+
+from conftest import SR, BlockBackend
+from conftest import write_wav as write_samples
+from transcript import asr, chunks
+from transcript import transcript as core
+from transcript import vad
+from transcript.audio import PCMBuffer
+
+BLOCK = SR // 2
+
+
+def write_wav(path, seconds):
+    """每0.5秒一块，采样值为块序号+1，转录结果据此核对位置"""
+    return write_samples(path, np.repeat(np.arange(1, seconds * 2 + 1, dtype=np.int16), BLOCK))
+
+
+class HalfSecondBackend(BlockBackend):
+    """把每0.5秒“转录”为该块的采样值"""
+
+    block_seconds = 0.5
+
+
+class SerialBackend(HalfSecondBackend):
+    name = "serial"
+
+    def supports_parallel(self):
+        return False
+
+
+@pytest.fixture
+def backends(block_backend, tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CHUNK_SECONDS", "10")
+    monkeypatch.setenv("TRANSCRIPT_THREAD_DIR", str(tmp_path / "threads"))
+    asr.register_backend(HalfSecondBackend)
+    asr.register_backend(SerialBackend)
+
+
+def test_plan_chunks_at_pauses():
+    timeline = vad.VADTimeline([(0, 8), (9, 21), (22, 36)], 36)
+    planned = chunks.plan_chunks(36, timeline, seconds=10, overlap=1)
+
+    assert [(c.keep_start, c.keep_end) for c in planned] == [(0, 8.5), (8.5, 21.5), (21.5, 36)]
+    assert (planned[1].start, planned[1].end) == (7.5, 22.5)
+    assert planned[0].start == 0 and planned[-1].end == 36
+    # 没有时间线时切在目标位置
+    assert [c.keep_end for c in chunks.plan_chunks(40, None, seconds=10)] == [10, 20, 30, 40]
+    # 不足1.5块时不切分
+    assert len(chunks.plan_chunks(14, None, seconds=10)) == 1
+
+
+def test_stitch_drops_overlap_duplicates():
+    planned = [chunks.Chunk(0, 0, 12, 0, 10), chunks.Chunk(1, 8, 20, 10, 20)]
+    results = [
+        [{"start": 0, "end": 5, "text": "一"}, {"start": 8, "end": 10.5, "text": "二"},
+         {"start": 10.5, "end": 12, "text": "三"}],
+        [{"start": 0.5, "end": 2.5, "text": "二"}, {"start": 2.6, "end": 4, "text": "三"},
+         {"start": 4, "end": 12, "text": "四"}],
+    ]
+    stitched = chunks.stitch(planned, results)
+    assert [s["text"] for s in stitched] == ["一", "二", "三", "四"]
+    assert stitched[2]["start"] == pytest.approx(10.6)
+    assert stitched[3]["end"] == 20
+
+
+def test_parallel_workers(backends, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_ASR_WORKERS", "3")
+    assert chunks.parallel_workers(asr.get_backend("blocks"), 40) == 3
+    assert chunks.parallel_workers(asr.get_backend("blocks"), 12) == 1
+    assert chunks.parallel_workers(asr.get_backend("serial"), 40) == 1
+    monkeypatch.setenv("TRANSCRIPT_ASR_WORKERS", "1")
+    assert chunks.parallel_workers(asr.get_backend("blocks"), 40) == 1
+
+
+def test_transcribe_chunked_matches_serial(backends, tmp_path):
+    wav = write_wav(tmp_path / "audio.wav", 45)
+    timeline = vad.VADTimeline([(0, 45)], 45)
+
+    segments = chunks.transcribe_chunked(asr.get_backend("blocks"), wav, "", 2, timeline=timeline)
+
+    assert [s["text"] for s in segments] == [str(i) for i in range(1, 91)]
+    assert [s["start"] for s in segments] == pytest.approx([i * 0.5 for i in range(90)])
+    assert not (tmp_path / "audio_chunks").exists()
+
+
+def test_transcribe_to_srt_uses_chunks(backends, tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_ASR_WORKERS", "2")
+    wav = write_wav(tmp_path / "audio.wav", 30)
+    srt = tmp_path / "out.srt"
+
+    assert core.transcribe_to_srt(wav, srt, "", backend="blocks") == "blocks"
+
+    subs = pysubs2.load(str(srt))
+    assert len(subs) == 60
+    assert subs[59].text == "60" and subs[59].start == 29500
+
+
+class FlakyBackend(HalfSecondBackend):
+    """转录到含有第 FAIL_AT 秒的块时失败，记录转录过的块"""
+
+    name = "flaky"
+
+    def transcribe(self, audio_path, prompt):
+        with PCMBuffer(audio_path) as audio:
+            first, last = int(audio.pcm[0]), int(audio.pcm[-1])
+        with open(os.environ["CALLS_LOG"], "a") as f:
+            f.write(f"{first}\n")
+        fail_at = os.environ.get("FAIL_AT")
+        if fail_at and first <= int(fail_at) * 2 < last:
+            raise RuntimeError("crash")
+        return super().transcribe(audio_path, prompt)
+
+
+def calls(tmp_path):
+    log = tmp_path / "calls.log"
+    return log.read_text().split() if log.exists() else []
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_resume_from_checkpoint(backends, tmp_path, monkeypatch, workers):
+    monkeypatch.setenv("TRANSCRIPT_ASR_WORKERS", str(workers))
+    monkeypatch.setenv("TRANSCRIPT_CHECKPOINT", "1")
+    monkeypatch.setenv("CALLS_LOG", str(tmp_path / "calls.log"))
+    monkeypatch.setenv("FAIL_AT", "25")
+    monkeypatch.setattr(asr, "_backends", {})
+    asr.register_backend(FlakyBackend)
+    wav = write_wav(tmp_path / "audio.wav", 40)
+    srt = tmp_path / "out.srt"
+
+    with pytest.raises(RuntimeError):
+        core.transcribe_to_srt(wav, srt, "", backend="flaky")
+    done = list((tmp_path / "checkpoints").glob("*/chunk_*.json"))
+    assert len(done) == (3 if workers > 1 else 2)
+    first_run = len(calls(tmp_path))
+
+    monkeypatch.delenv("FAIL_AT")
+    core.transcribe_to_srt(wav, srt, "", backend="flaky")
+
+    # 只重新转录失败（以及失败后没有开始）的块
+    assert len(calls(tmp_path)) - first_run == 4 - len(done)
+    subs = pysubs2.load(str(srt))
+    assert [event.text for event in subs] == [str(i) for i in range(1, 81)]
+    assert not (tmp_path / "checkpoints").exists()
+
+
+def test_checkpoint_keyed_by_settings(backends, tmp_path, monkeypatch):
+    wav = write_wav(tmp_path / "audio.wav", 40)
+    backend = asr.get_backend("blocks")
+    planned = chunks.plan_chunks(40)
+
+    checkpoint = chunks.Checkpoint.for_chunks(backend, wav, "提示一", planned)
+    checkpoint.save(0, [{"start": 0, "end": 1, "text": "旧"}])
+
+    assert chunks.Checkpoint.for_chunks(backend, wav, "提示一", planned).load(0)[0]["text"] == "旧"
+    assert chunks.Checkpoint.for_chunks(backend, wav, "提示二", planned).load(0) is None
+    assert chunks.Checkpoint.for_chunks(backend, wav, "提示一", planned[:2]).load(0) is None
+
+    # 模型、计算类型等设置变化
+    monkeypatch.setattr(type(backend), "settings", lambda self: {"compute_type": "float16"})
+    assert chunks.Checkpoint.for_chunks(backend, wav, "提示一", planned).load(0) is None
+
+
+def test_checkpoints_only_for_long_runs(backends, monkeypatch):
+    backend = asr.get_backend("blocks")
+    monkeypatch.delenv("TRANSCRIPT_CHECKPOINT", raising=False)
+    monkeypatch.setattr(chunks, "CHECKPOINT_MIN_RUNTIME", 100)
+
+    # 不足1.5块时不分块；默认按预计耗时（时长 × 实时率）决定
+    assert not chunks.checkpoints_enabled(backend, 14)
+    assert not chunks.checkpoints_enabled(backend, 40)
+    assert chunks.checkpoints_enabled(backend, 200)
+    monkeypatch.setattr(type(backend), "realtime_factor", lambda self: 3.0)
+    assert chunks.checkpoints_enabled(backend, 40)
+
+    monkeypatch.setenv("TRANSCRIPT_CHECKPOINT", "0")
+    assert not chunks.checkpoints_enabled(backend, 200)
+    monkeypatch.setenv("TRANSCRIPT_CHECKPOINT", "1")
+    assert chunks.checkpoints_enabled(backend, 40)
+    assert not chunks.checkpoints_enabled(backend, 14)
+
+
+class CountingBackend(HalfSecondBackend):
+    """记录转录时磁盘上已经截取的块WAV数"""
+
+    name = "counting"
+    on_disk = []
+
+    def transcribe(self, audio_path, prompt):
+        self.on_disk.append(len(list(Path(audio_path).parent.glob("chunk_*.wav"))))
+        return super().transcribe(audio_path, prompt)
+
+
+def test_chunk_wavs_written_lazily(backends, tmp_path, monkeypatch):
+    monkeypatch.setattr(CountingBackend, "on_disk", [])
+    wav = write_wav(tmp_path / "audio.wav", 40)
+
+    segments = chunks.transcribe_chunked(CountingBackend(), wav, "", 1,
+                                         timeline=vad.VADTimeline([(0, 40)], 40))
+
+    assert len(segments) == 80
+    assert CountingBackend.on_disk == [1, 1, 1, 1]
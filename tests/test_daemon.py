@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+测试常驻模型守护进程的通信和回退逻辑（不加载真实模型）
+"""
+
+import threading
+
+import pytest
+
+from transcript import daemon
+
+
+@pytest.fixture
+def socket_env(tmp_path, monkeypatch):
+    path = tmp_path / "daemon.sock"
+    monkeypatch.setenv("TRANSCRIPT_DAEMON_SOCKET", str(path))
+    return path
+
+
+def test_request_falls_back_when_not_running(socket_env):
+    """守护进程未运行时返回None，由调用方在进程内执行"""
+    assert not daemon.is_running()
+    assert daemon.request("transcribe", audio="/nonexistent.wav") is None
+
+
+def test_ping_and_shutdown(socket_env):
+    server = daemon.ModelDaemon(socket_env)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        assert daemon.is_running()
+        result = daemon.request("ping")
+        assert result["models"] == []
+
+        # 未知操作返回错误，客户端回退
+        assert daemon.request("no-such-op") is None
+    finally:
+        assert daemon.stop()
+        thread.join(timeout=5)
+        server.server_close()
+
+    assert not thread.is_alive()
+    assert not socket_env.exists()
+    assert not daemon.is_running()
+
+
+def test_stale_socket_is_replaced(socket_env):
+    """异常退出留下的socket文件不应阻止新的守护进程启动"""
+    socket_env.write_text("")
+    server = daemon.ModelDaemon(socket_env)
+    server.server_close()
+    assert not socket_env.exists()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+测试大文件的抽样指纹
+"""
+
+import os
+import time
+
+import numpy as np
+import pytest
+
+from conftest import write_wav
+from transcript import cache
+
+
+def sparse_file(path, size, marks=()):
+    """稀疏文件：只在给定偏移处写入数据"""
+    with open(path, "wb") as f:
+        f.truncate(size)
+        for offset, data in marks:
+            f.seek(offset)
+            f.write(data)
+    return path
+
+
+def test_small_file_hashes_everything(tmp_path):
+    a = tmp_path / "a.bin"
+    a.write_bytes(b"x" * 1000)
+    b = tmp_path / "b.bin"
+    b.write_bytes(b"x" * 500 + b"y" + b"x" * 499)
+    assert cache.sampled_fingerprint(a) != cache.sampled_fingerprint(b)
+
+
+def test_sampled_blocks_and_size(tmp_path):
+    size = 100 * 1024 * 1024
+    base = cache.sampled_fingerprint(sparse_file(tmp_path / "a.bin", size))
+
+    # 头、尾的变化以及大小变化都会改变指纹
+    assert cache.sampled_fingerprint(sparse_file(tmp_path / "b.bin", size, [(0, b"!")])) != base
+    assert cache.sampled_fingerprint(sparse_file(tmp_path / "c.bin", size, [(size - 1, b"!")])) != base
+    assert cache.sampled_fingerprint(sparse_file(tmp_path / "d.bin", size + 1)) != base
+
+    # 保留mtime的副本得到相同指纹；include_mtime=False 时只比较抽样
+    copy = sparse_file(tmp_path / "e.bin", size)
+    stat = os.stat(tmp_path / "a.bin")
+    os.utime(copy, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.sampled_fingerprint(copy) == base
+    os.utime(copy, ns=(0, 12345))
+    assert cache.sampled_fingerprint(copy) != base
+    assert (cache.sampled_fingerprint(copy, include_mtime=False)
+            == cache.sampled_fingerprint(tmp_path / "a.bin", include_mtime=False))
+
+
+def test_same_size_middle_change(tmp_path, monkeypatch):
+    """抽样读不到的中间块被改写、大小不变时，指纹也要变化"""
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("TRANSCRIPT_FINGERPRINT", raising=False)
+    samples = np.zeros(16000 * 120, dtype=np.int16)
+    path = tmp_path / "a.wav"
+
+    write_wav(path, samples)
+    media, decoded = cache.file_fingerprint(path), cache.decoded_fingerprint(path)
+    sampled = cache.sampled_fingerprint(path, include_mtime=False)
+    size = path.stat().st_size
+
+    # 第一个和第二个抽样块之间的位置
+    samples[len(samples) // 30] = 1234
+    write_wav(path, samples)
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 10 ** 9))
+    assert path.stat().st_size == size
+    # 抽样本身看不到这个变化
+    assert cache.sampled_fingerprint(path, include_mtime=False) == sampled
+    assert cache.file_fingerprint(path) != media
+    assert cache.decoded_fingerprint(path) != decoded
+
+
+def test_decoded_fingerprint_memoized(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    path = write_wav(tmp_path / "a.wav", np.ones(16000, dtype=np.int16))
+    digest = cache.decoded_fingerprint(path)
+
+    # 硬链接共享inode和mtime，不重新读取
+    link = tmp_path / "link.wav"
+    os.link(path, link)
+    monkeypatch.setattr(cache, "pcm_hash", lambda path: pytest.fail("不应重新计算"))
+    assert cache.decoded_fingerprint(link) == digest
+
+
+def test_time_independent_of_size(tmp_path):
+    path = sparse_file(tmp_path / "huge.bin", 10 * 1024 ** 3, [(5 * 1024 ** 3, b"data")])
+    cache.sampled_fingerprint(path)
+    start = time.perf_counter()
+    for _ in range(10):
+        cache.sampled_fingerprint(path)
+    # 只读取 SAMPLE_COUNT * SAMPLE_BLOCK 字节（约1MB）
+    assert (time.perf_counter() - start) / 10 < 0.05
+
+
+def test_decoded_fingerprint_ignores_container(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    samples = np.arange(-4000, 4000, dtype=np.int16)
+
+    def write(path, extra=b""):
+        write_wav(path, samples)
+        if extra:
+            # 在data块前插入LIST块，模拟不同的封装元数据
+            data = path.read_bytes()
+            idx = data.index(b"data")
+            chunk = b"LIST" + len(extra).to_bytes(4, "little") + extra
+            path.write_bytes(data[:idx] + chunk + data[idx:])
+        return path
+
+    a = write(tmp_path / "a.wav")
+    b = write(tmp_path / "b.wav", extra=b"INFOtest")
+    assert cache.sampled_fingerprint(a) != cache.sampled_fingerprint(b)
+    assert cache.decoded_fingerprint(a) == cache.decoded_fingerprint(b)
+    assert cache.combined_fingerprint(a, decoded=a) != cache.file_fingerprint(a)
+
+
+def test_pipeline_uses_sampled_fingerprint(tmp_path, monkeypatch):
+    media = tmp_path / "m.bin"
+    media.write_bytes(b"abc")
+    monkeypatch.delenv("TRANSCRIPT_FINGERPRINT", raising=False)
+    assert cache.file_fingerprint(media).startswith("s-")
+
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TRANSCRIPT_FINGERPRINT", "full")
+    assert cache.file_fingerprint(media) == cache.content_hash(media)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+测试按VAD时间线跳过长静音的转录
+"""
+
+import wave
+
+import numpy as np
+import pysubs2
+import pytest
+
+from conftest import SR
+from conftest import write_wav as write_samples
+from transcript import asr
+from transcript import transcript as core
+from transcript import vad
+from transcript.gate import SpeechMap, skip_silence_threshold
+
+
+def write_wav(path, seconds, speech):
+    """speech为 [(开始秒, 结束秒)]，语音部分为递增的采样值，方便核对位置"""
+    samples = np.zeros(seconds * SR, dtype=np.int16)
+    for start, end in speech:
+        samples[start * SR:end * SR] = np.arange((end - start) * SR) % 8000 + 1000
+    return write_samples(path, samples)
+
+
+def test_threshold_from_env(monkeypatch):
+    monkeypatch.delenv("TRANSCRIPT_SKIP_SILENCE", raising=False)
+    assert skip_silence_threshold() is None
+    monkeypatch.setenv("TRANSCRIPT_SKIP_SILENCE", "5")
+    assert skip_silence_threshold() == 5
+    assert skip_silence_threshold(0) is None
+
+
+def test_map_from_timeline():
+    timeline = vad.VADTimeline([(10, 20), (22, 30), (60, 70)], 100)
+    speech_map = SpeechMap.from_timeline(timeline, min_gap=5, margin=0.5)
+
+    # 2秒的停顿保留，开头、结尾和30-60秒的静音去掉，语音两侧各留0.5秒
+    assert speech_map.spans == [(9.5, 30.5), (59.5, 70.5)]
+    assert speech_map.compact_duration == pytest.approx(32)
+    assert speech_map.skipped == pytest.approx(68)
+
+    assert speech_map.to_original(0) == 9.5
+    assert speech_map.to_original(20.9) == pytest.approx(30.4)
+    assert speech_map.to_original(21.5) == pytest.approx(60)
+    segments = [{"start": 1.0, "end": 19.0, "words": [{"start": 18.0, "end": 19.0}]},
+                {"start": 22.0, "end": 25.0, "words": [{"start": 24.0, "end": 25.0}]}]
+    speech_map.remap_segments(segments)
+    assert segments[0]["start"] == 10.5 and segments[0]["end"] == pytest.approx(28.5)
+    assert segments[1]["start"] == pytest.approx(60.5)
+    assert segments[1]["words"][0] == {"start": pytest.approx(62.5), "end": pytest.approx(63.5)}
+
+
+def test_segments_at_span_junction():
+    speech_map = SpeechMap([(9.5, 30.5), (59.5, 70.5)], 100)
+
+    # 终点正好落在交界：属于前一个区间，而不是后一个区间的起点
+    assert speech_map.to_original(21.0) == pytest.approx(59.5)
+    assert speech_map.to_original(21.0, end=True) == pytest.approx(30.5)
+
+    segments = [{"start": 19.0, "end": 21.0, "words": [{"start": 20.0, "end": 21.0}]},
+                {"start": 20.0, "end": 23.0, "words": [{"start": 20.5, "end": 21.5}]}]
+    speech_map.remap_segments(segments)
+    assert (segments[0]["start"], segments[0]["end"]) == (pytest.approx(28.5), pytest.approx(30.5))
+    assert segments[0]["words"][0]["end"] == pytest.approx(30.5)
+    # 跨过交界的片段和词：终点限制在起点所在区间的末尾，不跨过被跳过的静音
+    assert (segments[1]["start"], segments[1]["end"]) == (pytest.approx(29.5), pytest.approx(30.5))
+    assert segments[1]["words"][0] == {"start": pytest.approx(30.0), "end": pytest.approx(30.5)}
+
+
+def test_no_long_silence_keeps_everything():
+    timeline = vad.VADTimeline([(0, 10), (11, 20)], 20)
+    speech_map = SpeechMap.from_timeline(timeline, min_gap=5)
+    assert speech_map.spans == [(0, 20)]
+    assert speech_map.skipped == 0
+
+
+def test_compact_wav(tmp_path):
+    wav = write_wav(tmp_path / "a.wav", 10, [(1, 3), (7, 9)])
+    speech_map = SpeechMap([(1, 3), (7, 9)], 10)
+    out = speech_map.compact(wav, tmp_path / "speech.wav")
+
+    with wave.open(str(wav)) as f:
+        original = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+    with wave.open(str(out)) as f:
+        assert f.getframerate() == SR and f.getnchannels() == 1
+        compact = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+
+    np.testing.assert_array_equal(compact, np.concatenate([original[SR:3 * SR], original[7 * SR:9 * SR]]))
+
+
+def test_transcribe_skips_silence(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("TRANSCRIPT_ASR_BACKEND", raising=False)
+    monkeypatch.setattr(vad, "_memo", {})
+    monkeypatch.setattr(asr, "_backends", {})
+    wav = write_wav(tmp_path / "audio.wav", 40, [(2, 5), (30, 33)])
+    seen = []
+
+    @asr.register_backend
+    class FakeBackend(asr.ASRBackend):
+        name = "fake"
+
+        def available(self):
+            return True
+
+        def transcribe(self, audio_path, prompt):
+            seen.append(asr.audio_duration(audio_path))
+            # 拼接后的音频中第二段语音紧跟在第一段之后
+            return [{"start": 0.0, "end": 3.0, "text": "一"},
+                    {"start": seen[0] - 3.3, "end": seen[0] - 0.3, "text": "二"}]
+
+    srt = tmp_path / "out.srt"
+    core.transcribe_to_srt(wav, srt, "", skip_silence=5)
+
+    assert seen[0] < 10
+    subs = pysubs2.load(str(srt))
+    assert subs[1].start == pytest.approx(30000, abs=200)
+    assert subs[1].end == pytest.approx(33000, abs=200)
+
+
+def test_no_long_silence_still_chunks(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(vad, "_memo", {})
+    wav = write_wav(tmp_path / "audio.wav", 20, [(0, 20)])
+    calls = []
+    monkeypatch.setattr(core, "run_asr", lambda backend, audio, prompt, source=None:
+                        calls.append(audio) or [])
+
+    # 没有可以跳过的静音时同样走分块转录（及检查点）
+    assert core.transcribe_speech_only(object(), wav, "", min_gap=5) == []
+    assert calls == [wav]
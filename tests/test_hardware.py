@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+测试Linux硬件探测与参数档案缓存（不做真实校准）
+"""
+
+import sys
+import types
+
+import pytest
+
+from transcript import hardware
+
+CPUINFO = """processor\t: 0
+model name\t: Intel(R) Xeon(R) Gold 6248
+physical id\t: 0
+core id\t\t: 0
+flags\t\t: fpu sse2 avx avx2 avx512f avx512_vnni
+
+processor\t: 1
+model name\t: Intel(R) Xeon(R) Gold 6248
+physical id\t: 0
+core id\t\t: 0
+flags\t\t: fpu sse2 avx avx2 avx512f avx512_vnni
+
+processor\t: 2
+model name\t: Intel(R) Xeon(R) Gold 6248
+physical id\t: 0
+core id\t\t: 1
+flags\t\t: fpu sse2 avx avx2 avx512f avx512_vnni
+
+processor\t: 3
+model name\t: Intel(R) Xeon(R) Gold 6248
+physical id\t: 0
+core id\t\t: 1
+flags\t\t: fpu sse2 avx avx2 avx512f avx512_vnni
+"""
+
+GB = 1024 ** 3
+
+
+def make_info(**overrides):
+    info = {"model": "test cpu", "machine": "x86_64", "logical": 8, "physical": 4,
+            "avx2": True, "avx512": False, "vnni": False,
+            "total": 32 * GB, "available": 24 * GB}
+    info.update(overrides)
+    return info
+
+
+def test_parse_cpuinfo():
+    info = hardware.parse_cpuinfo(CPUINFO)
+    assert info["logical"] == 4
+    assert info["physical"] == 2
+    assert info["avx2"] and info["avx512"] and info["vnni"]
+    assert info["model"].startswith("Intel")
+
+
+def test_parse_meminfo():
+    mem = hardware.parse_meminfo("MemTotal:       16384 kB\nMemAvailable:    8192 kB\n")
+    assert mem == {"total": 16384 * 1024, "available": 8192 * 1024}
+
+
+def test_candidates_follow_simd_and_memory():
+    configs = hardware.candidate_configs(make_info())
+    assert {c[0] for c in configs} == {"int8"}
+    assert {c[1] for c in configs} == {4, 8}
+    assert max(configs[0][2]) == 32
+
+    # 没有AVX2时也尝试float32，但内存不够时放弃
+    configs = hardware.candidate_configs(make_info(avx2=False, available=6 * GB))
+    assert {c[0] for c in configs} == {"int8"}
+    assert max(configs[0][2]) == 8
+
+    configs = hardware.candidate_configs(make_info(avx2=False))
+    assert {c[0] for c in configs} == {"int8", "float32"}
+
+
+def test_candidates_skip_configs_that_do_not_fit():
+    # 可用内存放不下模型：int8也跳过，启发式退回最小的批
+    assert hardware.candidate_configs(make_info(available=3 * GB)) == []
+    profile = hardware.heuristic_profile(make_info(available=3 * GB))
+    assert (profile["compute_type"], profile["batch_size"]) == ("int8", 1)
+
+
+def test_heuristic_profile_caps_batch():
+    profile = hardware.heuristic_profile(make_info())
+    assert profile["batch_size"] == 16
+    assert profile["threads"] == 4
+    assert not profile["calibrated"]
+
+
+@pytest.fixture
+def tuner(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("TRANSCRIPT_RECALIBRATE", raising=False)
+    monkeypatch.delenv("TRANSCRIPT_CALIBRATE", raising=False)
+    monkeypatch.setattr(hardware, "hardware_info", lambda: make_info())
+    monkeypatch.setattr("transcript.resolver.resolve", lambda kind: tmp_path / "snap-1")
+
+    calls = []
+
+    def fake_calibrate(info, snapshot):
+        calls.append(snapshot)
+        return {"device": "cpu", "compute_type": "int8", "threads": 8,
+                "batch_size": 8, "calibrated": True}
+
+    monkeypatch.setattr(hardware, "calibrate", fake_calibrate)
+    return calls
+
+
+def test_profile_cached(tuner):
+    first = hardware.tune()
+    second = hardware.tune()
+    assert first == second
+    assert first["threads"] == 8
+    assert len(tuner) == 1
+
+
+def test_hardware_change_recalibrates(tuner, monkeypatch):
+    hardware.tune()
+    monkeypatch.setattr(hardware, "hardware_info", lambda: make_info(logical=16, physical=8))
+    hardware.tune()
+    assert len(tuner) == 2
+
+
+def test_recalibrate_env(tuner, monkeypatch):
+    hardware.tune()
+    monkeypatch.setenv("TRANSCRIPT_RECALIBRATE", "1")
+    hardware.tune()
+    assert len(tuner) == 2
+
+
+def test_no_model_uses_heuristic_without_caching(tuner, monkeypatch):
+    monkeypatch.setattr("transcript.resolver.resolve", lambda kind: None)
+    profile = hardware.tune()
+    assert not profile["calibrated"]
+    assert not tuner
+    assert not (hardware.cache_dir() / hardware.PROFILE_NAME).exists()
+
+
+class FakeWhisperModel:
+    """记录同时存活的实例数和解码调用"""
+
+    live = 0
+    peak = 0
+    generated = []
+
+    def __init__(self, path, device, compute_type, cpu_threads, local_files_only):
+        np = pytest.importorskip("numpy")
+        FakeWhisperModel.live += 1
+        FakeWhisperModel.peak = max(FakeWhisperModel.peak, FakeWhisperModel.live)
+        self.feature_extractor = lambda audio: np.zeros((80, 3000), dtype=np.float32)
+        self.feature_extractor.nb_max_frames = 3000
+        self.hf_tokenizer = None
+        self.model = types.SimpleNamespace(is_multilingual=True, generate=self._generate)
+
+    def __del__(self):
+        FakeWhisperModel.live -= 1
+
+    def encode(self, features):
+        return features
+
+    def _generate(self, encoded, prompts, **options):
+        FakeWhisperModel.generated.append((len(prompts), options))
+
+
+class FakeTokenizer:
+    sot_sequence = (1, 2, 3)
+    no_timestamps = 4
+    eot = 5
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+def test_calibrate_decodes_and_releases_models(monkeypatch):
+    monkeypatch.setitem(sys.modules, "faster_whisper",
+                        types.SimpleNamespace(WhisperModel=FakeWhisperModel))
+    monkeypatch.setitem(sys.modules, "faster_whisper.tokenizer",
+                        types.SimpleNamespace(Tokenizer=FakeTokenizer))
+    monkeypatch.setattr(FakeWhisperModel, "generated", [])
+    # 校准时的可用内存比探测时少：只剩能容纳 int8 + 8个窗口的内存
+    free = int(3 * GB * 0.5) + hardware.RESERVED_BYTES + 8 * hardware.BATCH_ITEM_BYTES
+    monkeypatch.setattr(hardware, "available_memory", lambda: free)
+
+    profile = hardware.calibrate(make_info(avx2=False), None)
+
+    assert FakeWhisperModel.peak == 1 and FakeWhisperModel.live == 0
+    assert {t["compute_type"] for t in profile["trials"]} == {"int8"}
+    assert max(t["batch_size"] for t in profile["trials"]) == 8
+    # 真实解码：屏蔽结束符，解码固定数量的token
+    batch, options = FakeWhisperModel.generated[-1]
+    assert options["suppress_tokens"] == [FakeTokenizer.eot]
+    assert options["max_length"] == 4 + hardware.CALIBRATION_TOKENS
+
+
+def test_calibrate_charges_model_load_to_budget(monkeypatch):
+    monkeypatch.setitem(sys.modules, "faster_whisper",
+                        types.SimpleNamespace(WhisperModel=FakeWhisperModel))
+    monkeypatch.setitem(sys.modules, "faster_whisper.tokenizer",
+                        types.SimpleNamespace(Tokenizer=FakeTokenizer))
+    monkeypatch.setattr(FakeWhisperModel, "generated", [])
+    monkeypatch.setattr(hardware, "available_memory", lambda: 0)
+
+    # 每次加载模型耗时100秒（模拟时钟）
+    clock = [0.0]
+    loads = []
+
+    class SlowModel(FakeWhisperModel):
+        def __init__(self, *args, **kwargs):
+            clock[0] += 100
+            loads.append(kwargs["compute_type"])
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(sys.modules["faster_whisper"], "WhisperModel", SlowModel)
+    ticks = iter(range(1, 1000))
+    monkeypatch.setattr(hardware, "time", types.SimpleNamespace(
+        time=lambda: clock[0], perf_counter=lambda: next(ticks)))
+
+    # 四组候选，但加载第二组后预计超出180秒预算
+    profile = hardware.calibrate(make_info(avx2=False), None, budget=180)
+    assert len(loads) == 1
+    assert profile["calibrated"]
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+测试一次解码、多种产物的媒体导入（用桩程序代替ffmpeg/ffprobe）
+"""
+
+import os
+import shutil
+import sys
+import wave
+
+import numpy as np
+import pytest
+
+from transcript import ingest
+from transcript import transcript as core
+from transcript.audio import frame_energy
+
+SR = 16000
+
+# 桩ffmpeg：把 -i 指定的16kHz单声道WAV的PCM写到stdout，并记录调用
+FAKE_FFMPEG = r'''
+import os, sys, wave
+args = sys.argv[1:]
+source = args[args.index("-i") + 1]
+with open(os.environ["FAKE_CALLS"], "a") as log:
+    log.write("ffmpeg\n")
+with wave.open(source, "rb") as f:
+    sys.stdout.buffer.write(f.readframes(f.getnframes()))
+'''
+
+# 桩ffprobe：-select_streams时列出视频包，否则输出封装信息
+FAKE_FFPROBE = r'''
+import json, os, sys
+args = sys.argv[1:]
+with open(os.environ["FAKE_CALLS"], "a") as log:
+    log.write("ffprobe\n")
+if "-select_streams" in args:
+    print("0.000000,K__")
+    print("0.040000,___")
+    print("N/A,K__")
+    print("2.000000,K__")
+    print("2.040000,___")
+else:
+    print(json.dumps({
+        "format": {"duration": "12.500000", "format_name": "mov,mp4"},
+        "streams": [{"codec_type": "video"}, {"codec_type": "audio", "sample_rate": "48000"}],
+    }))
+'''
+
+
+@pytest.fixture
+def fake_tools(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for name, script in (("ffmpeg", FAKE_FFMPEG), ("ffprobe", FAKE_FFPROBE)):
+        path = bin_dir / name
+        path.write_text(f"#!{sys.executable}\n{script}")
+        path.chmod(0o755)
+    calls = tmp_path / "calls.log"
+    calls.write_text("")
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_CALLS", str(calls))
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("TRANSCRIPT_CACHE", raising=False)
+    monkeypatch.setenv("TRANSCRIPT_THREAD_DIR", str(tmp_path / "threads"))
+
+    def read():
+        names = calls.read_text().split()
+        calls.write_text("")
+        return names
+
+    return read
+
+
+def write_media(path, seconds=3, seed=0):
+    """用WAV充当媒体文件（桩ffmpeg直接读取）"""
+    samples = np.random.default_rng(seed).integers(-8000, 8000, seconds * SR).astype(np.int16)
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SR)
+        f.writeframes(samples.tobytes())
+    return samples
+
+
+def test_single_decode_produces_all_outputs(tmp_path, fake_tools):
+    media = tmp_path / "work" / "talk.mp4"
+    media.parent.mkdir()
+    samples = write_media(media)
+
+    metadata = ingest.ingest(media)
+
+    assert sorted(fake_tools()) == ["ffmpeg", "ffprobe", "ffprobe"]
+    assert metadata["duration"] == 12.5
+    assert [s["codec_type"] for s in metadata["streams"]] == ["video", "audio"]
+    assert ingest.load_keyframes(metadata) == [0.0, 2.0]
+
+    audio = ingest.audio_path(metadata)
+    assert audio.parent == media.parent / "ingest" / "talk.mp4"
+    with wave.open(str(audio), "rb") as f:
+        assert (f.getframerate(), f.getnchannels()) == (SR, 1)
+        np.testing.assert_array_equal(np.frombuffer(f.readframes(f.getnframes()), "<i2"), samples)
+
+    expected = frame_energy((samples / 32768.0).astype(np.float32), SR // 10)
+    np.testing.assert_allclose(ingest.load_envelope(metadata), expected, rtol=1e-5)
+
+
+def test_later_stages_reuse_ingest_without_probing(tmp_path, fake_tools):
+    media = tmp_path / "talk.mp4"
+    write_media(media)
+    ingest.ingest(media)
+    fake_tools()
+
+    assert ingest.ingest(media)["duration"] == 12.5
+    assert core.probe_duration(media) == 12.5
+    assert fake_tools() == []
+
+
+def test_changed_source_is_not_reused(tmp_path, fake_tools):
+    media = tmp_path / "talk.mp4"
+    write_media(media)
+    ingest.ingest(media)
+
+    write_media(media, seconds=2, seed=1)
+    assert ingest.load(media) is None
+
+
+def test_original_file_matches_working_copy(tmp_path, fake_tools):
+    """cut阶段按原始文件路径查找工作目录中副本的导入结果"""
+    import shutil
+
+    raw = tmp_path / "raw" / "talk.mp4"
+    raw.parent.mkdir()
+    write_media(raw)
+    work = tmp_path / "work"
+    work.mkdir()
+    shutil.copy2(raw, work / raw.name)
+    ingest.ingest(work / raw.name)
+
+    assert ingest.load(raw, work)["duration"] == 12.5
+
+
+def test_cached_wav_is_not_decoded_again(tmp_path, fake_tools):
+    samples = write_media(tmp_path / "a.mp4")
+    for name in ("one", "two"):
+        (tmp_path / name).mkdir()
+        # 保留mtime的副本（cp -p）
+        shutil.copy2(tmp_path / "a.mp4", tmp_path / name / "talk.mp4")
+
+    first = ingest.ingest(tmp_path / "one" / "talk.mp4")
+    fake_tools()
+    second = ingest.ingest(tmp_path / "two" / "talk.mp4")
+
+    # 只需要两次解封装探测，不再解码
+    assert sorted(fake_tools()) == ["ffprobe", "ffprobe"]
+    assert ingest.audio_path(first).samefile(ingest.audio_path(second))
+    np.testing.assert_allclose(ingest.load_envelope(second), ingest.load_envelope(first),
+                               rtol=1e-5)
+    assert len(ingest.load_envelope(second)) == len(samples) // (SR // 10)
+
+
+def test_find_envelope_by_linked_wav(tmp_path, fake_tools):
+    from transcript import cache
+
+    media = tmp_path / "talk.mp4"
+    write_media(media)
+    metadata = ingest.ingest(media)
+
+    wav = tmp_path / "talk_transcription.wav"
+    cache.place(ingest.audio_path(metadata), wav)
+    np.testing.assert_array_equal(ingest.find_envelope(wav), ingest.load_envelope(metadata))
+    assert ingest.find_envelope(tmp_path / "other.wav") is None
+
+
+def test_stream_transcription_ingests_while_decoding(tmp_path, fake_tools, monkeypatch):
+    monkeypatch.setattr("transcript.hardware.available_memory", lambda: 0)
+
+    class Model:
+        def transcribe(self, audio, batch_size, **kwargs):
+            return {"segments": [{"start": 0.0, "end": len(audio) / SR, "text": "x"}]}
+
+    media = tmp_path / "talk.mp4"
+    write_media(media)
+    core.whisperx_transcribe_stream(media, "", tee=tmp_path / "tee.wav", model=Model())
+
+    assert fake_tools().count("ffmpeg") == 1
+    metadata = ingest.load(media)
+    assert metadata["duration"] == 12.5
+    assert ingest.load_keyframes(metadata) == [0.0, 2.0]
+
+
+def test_off_keyframe_cut_warning(capsys):
+    core._warn_off_keyframe([(0, 1000), (2100, 3000), (5000, 6000)], [0.0, 2.0, 4.0])
+    out = capsys.readouterr().out
+    assert "片段 1" not in out
+    assert "片段 2 起点 5.000s" in out
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+测试持久化的媒体信息缓存（用桩程序代替ffprobe）
+"""
+
+import os
+import sys
+
+import pytest
+
+from transcript import mediainfo
+from transcript import transcript as core
+
+# 桩ffprobe：输出固定的封装信息，并记录调用次数
+FAKE_FFPROBE = r'''
+import json, os, sys
+with open(os.environ["FAKE_CALLS"], "a") as log:
+    log.write("ffprobe\n")
+if "missing" in sys.argv[-1]:
+    sys.stderr.write("Invalid data found")
+    sys.exit(1)
+print(json.dumps({
+    "format": {"duration": "5.250000", "format_name": "mov,mp4"},
+    "streams": [
+        {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080,
+         "avg_frame_rate": "30000/1001", "r_frame_rate": "30000/1001"},
+        {"codec_type": "audio", "codec_name": "aac", "sample_rate": "48000", "channels": 2},
+    ],
+}))
+'''
+
+
+@pytest.fixture
+def fake_ffprobe(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    ffprobe = bin_dir / "ffprobe"
+    ffprobe.write_text(f"#!{sys.executable}\n{FAKE_FFPROBE}")
+    ffprobe.chmod(0o755)
+    calls = tmp_path / "calls.log"
+    calls.write_text("")
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_CALLS", str(calls))
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("TRANSCRIPT_CACHE", raising=False)
+    return lambda: len(calls.read_text().split())
+
+
+def test_summary_fields(tmp_path, fake_ffprobe):
+    media = tmp_path / "opening.mp4"
+    media.write_bytes(b"video")
+
+    info = mediainfo.probe(media)
+    assert info["duration"] == 5.25
+    assert info["codecs"] == ["h264", "aac"]
+    assert info["video"]["frame_rate"] == pytest.approx(29.97, abs=0.01)
+    assert (info["video"]["width"], info["video"]["height"]) == (1920, 1080)
+    assert info["audio"] == {"codec": "aac", "sample_rate": 48000, "channels": 2}
+    assert len(info["streams"]) == 2
+
+
+def test_call_sites_share_one_probe(tmp_path, fake_ffprobe):
+    media = tmp_path / "opening.mp4"
+    media.write_bytes(b"video")
+
+    assert core.probe_duration(media) == 5.25
+    assert core.get_audio_info(media) == (48000, 2)
+    assert mediainfo.probe(media)["video"]["codec"] == "h264"
+    assert fake_ffprobe() == 1
+
+
+def test_changed_file_is_probed_again(tmp_path, fake_ffprobe):
+    media = tmp_path / "opening.mp4"
+    media.write_bytes(b"video")
+    mediainfo.probe(media)
+
+    media.write_bytes(b"re-encoded video")
+    mediainfo.probe(media)
+    assert fake_ffprobe() == 2
+
+
+def test_disabled_cache_always_probes(tmp_path, fake_ffprobe, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE", "0")
+    media = tmp_path / "opening.mp4"
+    media.write_bytes(b"video")
+
+    mediainfo.probe(media)
+    mediainfo.probe(media)
+    assert fake_ffprobe() == 2
+    assert not (tmp_path / "cache" / mediainfo.INDEX_NAME).exists()
+
+
+def test_probe_failure(tmp_path, fake_ffprobe):
+    media = tmp_path / "missing.mp4"
+    media.write_bytes(b"garbage")
+
+    with pytest.raises(RuntimeError, match="Invalid data"):
+        mediainfo.probe(media)
+    assert core.get_audio_info(media) == (None, None)
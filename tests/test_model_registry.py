@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+测试模型注册表的共享与LRU淘汰（使用假模型，不加载真实权重）
+"""
+
+from transcript import models
+from transcript.models import ModelKey, ModelRegistry
+
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = name
+
+
+def make_registry(monkeypatch, budget, sizes):
+    """按模型名返回固定大小，避免依赖真实RSS变化"""
+    monkeypatch.setattr(models, "current_rss", lambda: 0)
+    monkeypatch.setattr(models, "estimate_model_size",
+                        lambda model: sizes[model.name])
+    return ModelRegistry(budget=budget)
+
+
+def test_shared_instance(monkeypatch):
+    registry = make_registry(monkeypatch, 0, {"asr": 10})
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return FakeModel("asr")
+
+    key = ModelKey("asr", "cpu", "int8")
+    first = registry.get(key, loader)
+    second = registry.get(key, loader)
+
+    assert first is second
+    assert len(calls) == 1
+    assert registry.stats()[0]["hits"] == 1
+
+
+def test_key_includes_device_and_compute_type(monkeypatch):
+    registry = make_registry(monkeypatch, 0, {"asr": 10})
+    a = registry.get(ModelKey("asr", "cpu", "int8"), lambda: FakeModel("asr"))
+    b = registry.get(ModelKey("asr", "cpu", "float32"), lambda: FakeModel("asr"))
+    assert a is not b
+    assert len(registry) == 2
+
+
+def test_lru_eviction(monkeypatch):
+    registry = make_registry(monkeypatch, 100, {"asr": 60, "align": 30, "speaker": 30})
+    asr = ModelKey("asr", "cpu", "int8")
+    align = ModelKey("align", "cpu", "float32")
+    speaker = ModelKey("speaker", "cpu", "float32")
+
+    registry.get(asr, lambda: FakeModel("asr"))
+    registry.get(align, lambda: FakeModel("align"))
+    # 访问asr使align成为最久未使用
+    registry.get(asr, lambda: FakeModel("asr"))
+    registry.get(speaker, lambda: FakeModel("speaker"))
+
+    assert asr in registry
+    assert speaker in registry
+    assert align not in registry
+    assert registry.resident_bytes == 90
+
+
+def test_oversized_model_is_kept(monkeypatch):
+    """单个模型超过预算时仍然保留，只淘汰其它模型"""
+    registry = make_registry(monkeypatch, 50, {"small": 10, "huge": 80})
+    registry.get(ModelKey("small", "cpu", "int8"), lambda: FakeModel("small"))
+    huge = ModelKey("huge", "cpu", "int8")
+    registry.get(huge, lambda: FakeModel("huge"))
+
+    assert list(s["name"] for s in registry.stats()) == ["huge"]
+
+
+def test_budget_from_env(monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_MODEL_RAM_GB", "2")
+    assert models.default_budget() == 2 * 1024 ** 3
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+测试内存映射PCM音频缓冲区，以及按窗口处理时峰值内存不随时长增长
+"""
+
+import struct
+import subprocess
+import sys
+import textwrap
+import wave
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from conftest import SR
+from conftest import write_wav as write_samples
+from transcript.audio import PCMBuffer, frame_energy
+from transcript.transcript import _shift_times, align_groups
+
+ROOT = Path(__file__).parent.parent
+
+
+def random_blocks(seconds, seed=0, block_seconds=60):
+    """逐块生成随机PCM（长录音不必整段放进内存）"""
+    rng = np.random.default_rng(seed)
+    remaining = int(seconds * SR)
+    while remaining:
+        n = min(remaining, block_seconds * SR)
+        yield rng.integers(-20000, 20000, n, dtype=np.int16)
+        remaining -= n
+
+
+def write_wav(path, seconds, seed=0):
+    """分块写入随机PCM，返回前10秒的int16数据用于比对"""
+    write_samples(path, random_blocks(seconds, seed))
+    return next(random_blocks(seconds, seed))[:10 * SR]
+
+
+def test_values_match_float_decoding(tmp_path):
+    path = tmp_path / "a.wav"
+    head = write_wav(path, 12)
+    with PCMBuffer(path) as audio:
+        assert len(audio) == 12 * SR
+        assert audio.duration == 12
+        window = audio[SR:2 * SR]
+        assert window.dtype == np.float32
+        np.testing.assert_allclose(window, head[SR:2 * SR] / 32768.0)
+        np.testing.assert_allclose(audio.window(0.5, 1.0), head[SR // 2:SR] / 32768.0)
+        # 零拷贝的int16视图
+        assert audio.pcm.base is not None
+        assert audio.pcm[5] == head[5]
+
+
+def test_extra_chunks_before_data(tmp_path):
+    """ffmpeg写出的WAV在fmt和data之间有LIST块"""
+    samples = np.arange(100, dtype=np.int16)
+    fmt = struct.pack("<HHIIHH", 1, 1, SR, SR * 2, 2, 16)
+    info = b"INFOISFT\x05\x00\x00\x00Lavf\x00\x00"
+    body = (b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+            + b"LIST" + struct.pack("<I", len(info)) + info
+            + b"data" + struct.pack("<I", 0xFFFFFFFF) + samples.tobytes())
+    path = tmp_path / "ffmpeg.wav"
+    path.write_bytes(b"RIFF" + struct.pack("<I", len(body)) + body)
+
+    with PCMBuffer(path) as audio:
+        assert len(audio) == 100
+        assert audio.pcm[99] == 99
+
+
+def test_rejects_other_formats(tmp_path):
+    path = tmp_path / "stereo.wav"
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(44100)
+        f.writeframes(b"\0" * 400)
+    with pytest.raises(ValueError):
+        PCMBuffer(path)
+
+
+def test_frame_energy_matches_direct(tmp_path):
+    path = tmp_path / "a.wav"
+    head = write_wav(path, 10)
+    frame = SR // 10
+    with PCMBuffer(path) as audio:
+        energy = frame_energy(audio, frame, block_seconds=3)
+    direct = ((head / 32768.0).reshape(-1, frame) ** 2).mean(axis=1)
+    np.testing.assert_allclose(energy, direct, rtol=1e-5)
+
+
+def test_align_groups_and_shift():
+    segments = [{"start": float(i * 100), "end": float(i * 100 + 5), "text": str(i)} for i in range(15)]
+    groups = align_groups(segments, window=600)
+    assert [len(g) for g in groups] == [6, 6, 3]
+    assert sum(groups, []) == segments
+
+    segment = {"start": 100.0, "end": 101.0, "words": [{"word": "a", "start": 100.5, "end": 100.8}]}
+    shifted = _shift_times(segment, -100)
+    assert shifted["words"][0]["start"] == pytest.approx(0.5)
+    assert segment["start"] == 100.0
+
+
+PEAK_SCRIPT = textwrap.dedent("""
+    import resource, sys
+    sys.path.insert(0, {root!r})
+    from transcript.audio import PCMBuffer
+    from transcript import transcript as core
+
+    class Model:
+        def transcribe(self, audio, batch_size, **kwargs):
+            return {{"segments": [{{"start": 0.0, "end": 1.0, "text": str(float(abs(audio).mean()))}}]}}
+
+    core.ASR_WINDOW_SECONDS = 60
+    audio = PCMBuffer(sys.argv[1])
+    segments, _ = core.transcribe_array(Model(), audio, batch_size=1, chunk_size=5)
+    # 模拟说话人分离按片段切片
+    for start in range(0, len(audio), 16000 * 5):
+        audio[start:start + 16000 * 2]
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+""")
+
+
+def peak_rss_kb(tmp_path, wav):
+    script = tmp_path / "peak.py"
+    script.write_text(PEAK_SCRIPT.format(root=str(ROOT)))
+    output = subprocess.run([sys.executable, str(script), str(wav)],
+                            capture_output=True, text=True, check=True)
+    return int(output.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="依赖Linux的ru_maxrss单位和madvise")
+def test_peak_rss_flat_as_duration_grows(tmp_path):
+    short, long = tmp_path / "short.wav", tmp_path / "long.wav"
+    write_wav(short, 2 * 60)
+    write_wav(long, 30 * 60)
+
+    short_peak = peak_rss_kb(tmp_path, short)
+    long_peak = peak_rss_kb(tmp_path, long)
+
+    # 30分钟的int16数据约55MB，整段解码为float32约110MB；按窗口处理时
+    # 峰值只多出一个窗口的量级
+    growth_mb = (long_peak - short_peak) / 1024
+    assert growth_mb < 20, f"峰值内存增长 {growth_mb:.1f}MB"
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+测试预加载后fork的工作进程池：模型内存应与父进程写时复制共享
+
+用一个大的numpy数组代替真实模型，真实模型的RSS基准见 tests/bench_prefork.py
+"""
+
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from transcript.models import ModelKey, get_registry
+from transcript.pool import memory_stats, run_prefork
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"),
+                                reason="需要/proc/self/smaps_rollup统计USS")
+
+MODEL_MB = 256
+
+SHARED_KEY = ModelKey("fake-shared", "cpu", "float32")
+UNSAFE_KEY = ModelKey("fake-ct2", "cpu", "int8")
+
+
+def _use_shared_model(job):
+    model = get_registry().get(SHARED_KEY, lambda: None)
+    # 读取全部权重，模拟推理
+    return float(model.sum()) + job
+
+
+def _unsafe_model_visible(job):
+    return UNSAFE_KEY in get_registry()
+
+
+@pytest.fixture
+def fake_models():
+    registry = get_registry()
+    registry.get(SHARED_KEY, lambda: np.ones(MODEL_MB * 1024 * 1024 // 8))
+    registry.get(UNSAFE_KEY, lambda: object(), fork_safe=False)
+    yield
+    registry.evict(SHARED_KEY)
+    registry.evict(UNSAFE_KEY)
+
+
+def test_workers_share_model_memory(fake_models):
+    results = run_prefork(_use_shared_model, [0, 1, 2], workers=3, preload=())
+
+    assert [item["error"] for item in results] == [None, None, None]
+    assert results[1]["result"] == MODEL_MB * 1024 * 1024 // 8 + 1
+
+    model_bytes = MODEL_MB * 1024 * 1024
+    for item in results:
+        uss = item["memory"]["uss"]
+        print(f"worker {item['pid']}: USS={uss / 1024 ** 2:.0f}MB "
+              f"RSS={item['memory']['rss'] / 1024 ** 2:.0f}MB")
+        # 独占内存远小于模型大小，说明权重没有被复制
+        assert uss < model_bytes * 0.25
+
+
+def test_fork_unsafe_models_are_dropped_in_workers(fake_models):
+    results = run_prefork(_unsafe_model_visible, [0], workers=1, preload=())
+    assert results[0]["result"] is False
+    # 父进程中仍然可用
+    assert UNSAFE_KEY in get_registry()
+
+
+def test_job_errors_are_reported():
+    results = run_prefork(_use_shared_model, [0], workers=1, preload=())
+    assert results[0]["error"]
+    assert memory_stats()["rss"] > 0
+
+
+def test_gen_preloads_only_used_models(monkeypatch):
+    from transcript import pool
+
+    calls = []
+    monkeypatch.setattr(pool, "run_prefork",
+                        lambda func, jobs, workers=None, preload=(), worker_bytes=0:
+                        calls.append(preload) or [])
+    pool.transcribe_files(["a.mp4"])
+    pool.transcribe_files(["a.mp4"], enable_diarization=False)
+    assert calls == [("asr", "asr-server", "speaker"), ("asr", "asr-server")]
+
+
+def test_workers_capped_by_memory(monkeypatch, capsys):
+    from transcript import hardware, pool
+
+    # 可用内存只够两个工作进程
+    monkeypatch.setattr(hardware, "available_memory",
+                        lambda: hardware.RESERVED_BYTES + 2 * pool.WORKER_BYTES + 1)
+    results = run_prefork(_unsafe_model_visible, [0, 1, 2, 3], workers=4, preload=(),
+                          worker_bytes=pool.WORKER_BYTES)
+    assert [item["error"] for item in results] == [None] * 4
+    assert "启动 2 个工作进程" in capsys.readouterr().out
+
+
+def test_duplicate_stems_are_rejected(monkeypatch):
+    from transcript import pool
+
+    monkeypatch.setattr(pool, "run_prefork", lambda *args, **kwargs: [])
+    with pytest.raises(ValueError, match="lecture"):
+        pool.transcribe_files(["a/lecture.mp4", "b/lecture.mp4", "c/other.mp4"])
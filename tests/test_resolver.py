@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+测试模型文件解析器（在临时目录中构造Hugging Face缓存布局）
+"""
+
+import hashlib
+
+import pytest
+
+from transcript import resolver
+
+
+def make_hf_snapshot(root, repo_id, files, revision="0123abcd"):
+    """按HF缓存布局创建 refs/main、blobs 和指向blob的快照符号链接"""
+    repo = root / f"models--{repo_id.replace('/', '--')}"
+    (repo / "refs").mkdir(parents=True)
+    (repo / "refs" / "main").write_text(revision)
+    blobs = repo / "blobs"
+    blobs.mkdir()
+    snapshot = repo / "snapshots" / revision
+    snapshot.mkdir(parents=True)
+
+    for name, content in files.items():
+        blob = blobs / hashlib.sha256(content).hexdigest()
+        blob.write_bytes(content)
+        (snapshot / name).symlink_to(blob)
+    return snapshot
+
+
+@pytest.fixture
+def hf_home(tmp_path, monkeypatch):
+    monkeypatch.setenv("HF_HOME", str(tmp_path))
+    monkeypatch.delenv("HF_HUB_CACHE", raising=False)
+    monkeypatch.delenv("HUGGINGFACE_HUB_CACHE", raising=False)
+    return tmp_path
+
+
+def speaker_files():
+    spec = resolver.MODEL_SPECS["speaker"]
+    return {name: f"{name} content".encode() for name in spec.required}
+
+
+def test_missing_model(hf_home):
+    assert resolver.resolve("speaker") is None
+
+
+def test_resolve_pins_snapshot(hf_home):
+    snapshot = make_hf_snapshot(hf_home / "hub", "speechbrain/spkrec-ecapa-voxceleb",
+                                speaker_files())
+
+    assert resolver.resolve("speaker") == snapshot
+    manifest = resolver._load_manifest()
+    assert manifest["speaker"]["revision"] == "0123abcd"
+    assert set(manifest["speaker"]["files"]) == set(speaker_files())
+
+    # 固定后不再依赖refs/main
+    (snapshot.parent.parent / "refs" / "main").unlink()
+    assert resolver.resolve("speaker") == snapshot
+
+
+def test_incomplete_snapshot_is_ignored(hf_home):
+    files = speaker_files()
+    files.pop("classifier.ckpt")
+    make_hf_snapshot(hf_home / "hub", "speechbrain/spkrec-ecapa-voxceleb", files)
+    assert resolver.resolve("speaker") is None
+
+
+def test_weights_any_of(hf_home):
+    spec = resolver.MODEL_SPECS["align"]
+    files = {name: b"{}" for name in spec.required}
+    files["pytorch_model.bin"] = b"weights"
+    # 旧代码把模型下载到 HF_HOME 根目录
+    snapshot = make_hf_snapshot(hf_home, spec.repo_id, files)
+    assert resolver.resolve("align") == snapshot
+
+
+def test_verify_detects_corruption(hf_home):
+    snapshot = make_hf_snapshot(hf_home / "hub", "speechbrain/spkrec-ecapa-voxceleb",
+                                speaker_files())
+    assert resolver.verify("speaker")
+    assert resolver._load_manifest()["speaker"]["verified"]
+
+    # 内容被改写（大小不变）
+    target = (snapshot / "label_encoder.txt").resolve()
+    target.write_bytes(target.read_bytes()[::-1])
+    assert not resolver.verify("speaker")
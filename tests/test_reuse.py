@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+测试按内容分块复用已转录文件的片段
+"""
+
+import numpy as np
+import pysubs2
+import pytest
+
+from conftest import SR, write_wav
+from transcript import reuse
+from transcript import transcript as core
+
+
+def blocks(ids):
+    """每秒一块随机信号，中间的采样为块编号，转录结果（见 conftest.BlockBackend）据此核对"""
+    parts = []
+    for block_id in ids:
+        samples = np.random.default_rng(block_id).integers(-8000, 8000, SR).astype(np.int16)
+        samples[SR // 2] = block_id
+        parts.append(samples)
+    return np.concatenate(parts)
+
+
+@pytest.fixture
+def backend(block_backend):
+    return block_backend
+
+
+def test_chunks_survive_insertion(tmp_path):
+    original = blocks(range(1000, 1120))
+    edited = np.concatenate([blocks(range(2000, 2007)), original[20 * SR:]])
+
+    a = reuse.content_chunks(write_wav(tmp_path / "a.wav", original))
+    b = reuse.content_chunks(write_wav(tmp_path / "b.wav", edited))
+
+    assert all(reuse.REUSE_MIN_CHUNK * SR <= end - start <= reuse.REUSE_MAX_CHUNK * SR
+               for start, end, _ in a[:-1])
+    shared = {digest for _, _, digest in a} & {digest for _, _, digest in b}
+    # 编辑点之后的块全部相同
+    tail = [digest for start, _, digest in a if start >= 25 * SR]
+    assert set(tail) <= shared
+
+
+def test_chunk_bounds_limits():
+    bounds = reuse.chunk_bounds(np.array([10, 50, 55, 300]), 400, 20, 100)
+    assert bounds == [0, 50, 150, 250, 300, 400]
+
+
+def test_gaps():
+    assert reuse.gaps([(10, 20), (20.2, 50)], 60) == [(0, 10), (50, 60)]
+
+
+def test_reexported_file_reuses_segments(backend, tmp_path):
+    original = blocks(range(1000, 1120))
+    edited = np.concatenate([blocks(range(2000, 2010)), original[20 * SR:]])
+    first = write_wav(tmp_path / "first.wav", original)
+    second = write_wav(tmp_path / "second.wav", edited)
+
+    core.transcribe_to_srt(first, tmp_path / "first.srt", "")
+    assert backend.seconds == [120]
+
+    srt = tmp_path / "second.srt"
+    core.transcribe_to_srt(second, srt, "")
+
+    # 只转录新的片头和复用区间边界附近的少量音频
+    assert len(backend.seconds) == 2 and backend.seconds[1] < 30
+    subs = pysubs2.load(str(srt))
+    expected = [str(i) for i in range(2000, 2010)] + [str(i) for i in range(1020, 1120)]
+    assert [event.text for event in subs] == expected
+    assert [event.start for event in subs] == [i * 1000 for i in range(110)]
+
+
+def test_different_settings_not_reused(backend, tmp_path):
+    original = blocks(range(1000, 1060))
+    edited = np.concatenate([blocks(range(2000, 2005)), original[5 * SR:]])
+
+    core.transcribe_to_srt(write_wav(tmp_path / "a.wav", original), tmp_path / "a.srt", "提示一")
+    core.transcribe_to_srt(write_wav(tmp_path / "b.wav", edited), tmp_path / "b.srt", "提示二")
+    assert backend.seconds == [60, 60]
+
+
+def test_index_updates_are_not_lost(backend, tmp_path):
+    import threading
+
+    wavs = [write_wav(tmp_path / f"{i}.wav", blocks(range(100 * i, 100 * i + 30)))
+            for i in range(1, 5)]
+    threads = [threading.Thread(target=reuse.remember, args=(wav, [], "s" * 64)) for wav in wavs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    index = reuse.load_index()
+    for wav in wavs:
+        assert all(digest in index for _, _, digest in reuse.content_chunks(wav))
+
+
+def test_index_expires_and_caps(backend, tmp_path):
+    from transcript import cache
+
+    first = write_wav(tmp_path / "a.wav", blocks(range(1000, 1030)))
+    second = write_wav(tmp_path / "b.wav", blocks(range(2000, 2030)))
+    reuse.remember(first, [], "s" * 64)
+
+    # 记录已被缓存淘汰：条目随下一次登记删除
+    key = reuse._record_key(first, "s" * 64)
+    cache.entry_path("reuse", key, ".json").unlink()
+    reuse.remember(second, [], "s" * 64)
+    assert {entry[0] for entry in reuse.load_index().values()} == {reuse._record_key(second, "s" * 64)}
+
+    chunks = reuse.content_chunks(second)
+    reuse.update_index(chunks, reuse._record_key(second, "s" * 64), limit=2)
+    assert list(reuse.load_index()) == [digest for _, _, digest in chunks[-2:]]
+
+
+def test_predecode_is_opt_in(backend, tmp_path, monkeypatch):
+    monkeypatch.delenv("TRANSCRIPT_REUSE_PREDECODE", raising=False)
+    reuse.remember(write_wav(tmp_path / "a.wav", blocks(range(1000, 1030))), [], "s" * 64)
+    # 索引非空也不放弃边解码边转录
+    assert not reuse.predecode()
+
+    monkeypatch.setenv("TRANSCRIPT_REUSE_PREDECODE", "1")
+    assert reuse.predecode()
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "empty"))
+    assert not reuse.predecode()
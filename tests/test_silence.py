@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试向量化的静音检测和静音索引
+"""
+
+import wave
+
+import numpy as np
+import pytest
+
+from transcript import transcript as core
+from transcript.audio import PCMBuffer
+from transcript.silence import SilenceIndex, window_energy
+
+SR = 16000
+
+
+def reference_boundaries(audio_segment, sample_rate=16000, silence_threshold=0.01,
+                         min_silence_duration=0.3):
+    """改写前的逐窗口实现，作为对照"""
+    window_size = int(0.1 * sample_rate)
+    energy = []
+    for i in range(0, len(audio_segment) - window_size, window_size // 2):
+        window = audio_segment[i:i + window_size]
+        energy.append(np.mean(window ** 2))
+
+    boundaries = []
+    in_silence = False
+    silence_start = 0
+    for i, is_silent in enumerate(np.array(energy) < silence_threshold):
+        time_pos = i * (window_size // 2) / sample_rate
+        if is_silent and not in_silence:
+            silence_start = time_pos
+            in_silence = True
+        elif not is_silent and in_silence:
+            silence_duration = time_pos - silence_start
+            if silence_duration >= min_silence_duration:
+                boundaries.append(silence_start + silence_duration / 2)
+            in_silence = False
+    return boundaries
+
+
+def speech(seconds, pauses, seed=0):
+    """随机信号，pauses为 [(开始秒, 结束秒)] 的静音段"""
+    rng = np.random.default_rng(seed)
+    audio = rng.uniform(-0.5, 0.5, int(seconds * SR)).astype(np.float32)
+    for start, end in pauses:
+        audio[int(start * SR):int(end * SR)] = 0
+    return audio
+
+
+def test_window_energy_matches_loop():
+    audio = speech(3, [(1, 1.5)])
+    expected = [np.mean(audio[i:i + 1600].astype(np.float64) ** 2)
+                for i in range(0, len(audio) - 1600, 800)]
+    np.testing.assert_allclose(window_energy(audio, 1600, 800), expected, rtol=1e-5)
+    # 窗口不是步长整数倍时同样正确
+    expected = [np.mean(audio[i:i + 1000].astype(np.float64) ** 2)
+                for i in range(0, len(audio) - 1000, 600)]
+    np.testing.assert_allclose(window_energy(audio, 1000, 600), expected, rtol=1e-5)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_boundaries_match_reference(seed):
+    rng = np.random.default_rng(seed)
+    pauses = []
+    t = 0.5
+    while t < 28:
+        length = rng.uniform(0.1, 1.2)
+        pauses.append((t, t + length))
+        t += length + rng.uniform(0.3, 3)
+    # 以静音结尾：末尾的静音不算边界
+    pauses.append((29.5, 30))
+    audio = speech(30, pauses, seed)
+
+    assert core.detect_silence_boundaries(audio) == pytest.approx(reference_boundaries(audio))
+
+
+def test_index_query():
+    audio = speech(60, [(10, 11), (30, 30.2), (40, 42), (59, 60)])
+    index = SilenceIndex.from_audio(audio)
+
+    # 0.2秒的停顿短于默认的0.3秒，被忽略；结尾的静音保留在索引中
+    assert len(index) == 3
+    (s1, e1, energy), = index.query(5, 20)
+    assert s1 == pytest.approx(10, abs=0.1) and e1 == pytest.approx(11, abs=0.1)
+    assert energy < 1e-3
+    assert index.query(12, 39) == []
+    assert index.silence_in(41, 100) == pytest.approx(2, abs=0.2)
+    assert index.is_silent(41) and not index.is_silent(20)
+    assert index.boundaries(30, 50) == [pytest.approx(41, abs=0.1)]
+
+
+def test_index_from_pcm_buffer_and_envelope(tmp_path):
+    from transcript.audio import frame_energy
+
+    audio = speech(20, [(5, 6), (12, 14)])
+    path = tmp_path / "a.wav"
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SR)
+        f.writeframes((audio * 32767).astype("<i2").tobytes())
+
+    with PCMBuffer(path) as buffer:
+        from_buffer = SilenceIndex.from_audio(buffer)
+    from_envelope = SilenceIndex.from_envelope(frame_energy(audio, SR // 10))
+
+    assert len(from_buffer) == len(from_envelope) == 2
+    for (a, b, _), (c, d, _) in zip(from_buffer, from_envelope):
+        assert a == pytest.approx(c, abs=0.1) and b == pytest.approx(d, abs=0.1)
+
+
+def test_save_and_load(tmp_path):
+    index = SilenceIndex.from_audio(speech(10, [(2, 3)]))
+    index.save(tmp_path / "silence.npz")
+    loaded = SilenceIndex.load(tmp_path / "silence.npz")
+    assert list(loaded) == list(index)
+    assert loaded.duration == 10
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+启动耗时测试
+
+`transcript status` 和 `transcript resume` 的剪辑阶段（cut）不需要ASR，
+不应该在启动时导入torch/whisperx。这里在独立的子进程中运行，避免受到
+其它测试已导入模块的影响。
+"""
+
+import json
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 不含torch的启动应当远低于这个值；导入torch通常需要数秒
+STARTUP_BUDGET_SECONDS = 1.5
+
+HEAVY_MODULES = ("torch", "whisperx", "speechbrain", "ctranslate2")
+
+
+def run_snippet(code: str):
+    """在新的解释器里执行代码，返回 (耗时, 最后一行输出解析出的JSON)"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(code)],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=60
+    )
+    elapsed = time.perf_counter() - start
+    assert result.returncode == 0, result.stdout + result.stderr
+    return elapsed, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_status_does_not_import_heavy_modules():
+    """transcript status 不应导入torch/whisperx"""
+    elapsed, loaded = run_snippet(f"""
+        import json, sys
+        sys.argv = ["transcript", "status"]
+        from transcript.cli import main
+        main()
+        print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))
+    """)
+    print(f"transcript status 用时 {elapsed:.3f}s")
+    assert loaded == []
+    assert elapsed < STARTUP_BUDGET_SECONDS
+
+
+def test_cut_path_does_not_import_heavy_modules(tmp_path):
+    """cut() 只需要ffmpeg和字幕处理，不应导入torch/whisperx"""
+    pytest.importorskip("jieba")
+    pytest.importorskip("pysubs2")
+
+    name = f"startup-test-{tmp_path.name}"
+    working_dir = tmp_path / name
+    working_dir.mkdir()
+    media = working_dir / f"{name}.wav"
+    media.write_bytes(b"")
+    (working_dir / f"{name}.srt").write_text(
+        "1\n00:00:01,000 --> 00:00:02,000\n保留这一行\n", encoding="utf-8"
+    )
+
+    log_file = Path("/tmp/transcript.log")
+    backup = log_file.read_bytes() if log_file.exists() else None
+    log_file.write_text(json.dumps({
+        "working_dir": str(working_dir),
+        "name": name,
+        "raw_file": str(media),
+        "file_type": "audio",
+    }), encoding="utf-8")
+
+    try:
+        elapsed, loaded = run_snippet(f"""
+            import json, sys
+            from transcript.transcript import cut
+            cut()
+            print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))
+        """)
+    finally:
+        if backup is None:
+            log_file.unlink()
+        else:
+            log_file.write_bytes(backup)
+
+    print(f"cut() 用时 {elapsed:.3f}s")
+    assert loaded == []
+    assert (working_dir / "cut" / "list.text").exists()
+
+
+def test_module_import_is_cheap():
+    """导入transcript.transcript不应检测设备或导入重依赖"""
+    elapsed, state = run_snippet(f"""
+        import json, sys
+        import transcript.transcript as t
+        print(json.dumps({{
+            "loaded": [m for m in {HEAVY_MODULES!r} + ("jieba", "pysubs2", "opencc")
+                       if m in sys.modules],
+            "device_config": t._device_config,
+        }}))
+    """)
+    print(f"import transcript.transcript 用时 {elapsed:.3f}s")
+    assert state == {"loaded": [], "device_config": None}
+    assert elapsed < STARTUP_BUDGET_SECONDS
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+测试流式解码与流式切窗（用读取WAV的桩程序代替ffmpeg）
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from conftest import SR, write_wav
+from transcript import transcript as core
+from transcript.audio import PCMBuffer, stream_pcm
+
+# 桩ffmpeg：读取 -i 指定的16kHz单声道WAV，按小块把PCM写到stdout；
+# 文件名包含 broken 时中途以非零状态退出
+FAKE_FFMPEG = r'''
+import sys, wave
+args = sys.argv[1:]
+source = args[args.index("-i") + 1]
+with wave.open(source, "rb") as f:
+    total = f.getnframes()
+    sent = 0
+    while sent < total:
+        data = f.readframes(1234)
+        sys.stdout.buffer.write(data)
+        sent += 1234
+        if "broken" in source and sent > total // 2:
+            sys.stderr.write("decode error")
+            sys.exit(1)
+'''
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    ffmpeg = bin_dir / "ffmpeg"
+    ffmpeg.write_text(f"#!{sys.executable}\n{FAKE_FFMPEG}")
+    ffmpeg.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+def speech_with_pauses(seconds, seed=0):
+    """每20秒有1秒静音的随机信号"""
+    rng = np.random.default_rng(seed)
+    samples = rng.integers(-8000, 8000, seconds * SR).astype(np.int16)
+    for pause in range(19, seconds, 20):
+        samples[pause * SR:(pause + 1) * SR] = 0
+    return samples
+
+
+def test_chunks_and_tee(tmp_path, fake_ffmpeg):
+    samples = speech_with_pauses(25)
+    source = tmp_path / "input.wav"
+    write_wav(source, samples)
+
+    tee = tmp_path / "tee.wav"
+    chunks = list(stream_pcm(source, chunk_seconds=2, tee=tee))
+
+    assert all(len(c) == 2 * SR for c in chunks[:-1])
+    np.testing.assert_allclose(np.concatenate(chunks), samples / 32768.0)
+    with PCMBuffer(tee) as audio:
+        np.testing.assert_array_equal(audio.pcm, samples)
+
+
+def test_decode_error_removes_partial_tee(tmp_path, fake_ffmpeg):
+    source = tmp_path / "broken.wav"
+    write_wav(source, speech_with_pauses(10))
+    tee = tmp_path / "tee.wav"
+
+    with pytest.raises(RuntimeError, match="decode error"):
+        list(stream_pcm(source, chunk_seconds=1, tee=tee))
+    assert not tee.exists()
+
+
+def test_stream_windows_match_whole_file_windows():
+    samples = speech_with_pauses(130) / 32768.0
+    samples = samples.astype(np.float32)
+    chunks = (samples[i:i + 3 * SR] for i in range(0, len(samples), 3 * SR))
+
+    streamed = list(core.stream_windows(chunks, window=20, search=5))
+    expected = core.asr_windows(samples, window=20, search=5)
+
+    assert [start for start, _ in streamed] == [start for start, _ in expected]
+    np.testing.assert_array_equal(np.concatenate([w for _, w in streamed]), samples)
+    # 切分点落在静音段
+    for start, _ in streamed[1:]:
+        assert samples[start] == 0
+
+
+def test_stream_transcription_matches_file_transcription(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setattr(core, "ASR_WINDOW_SECONDS", 30)
+    monkeypatch.setattr("transcript.hardware.available_memory", lambda: 0)
+
+    class Model:
+        def transcribe(self, audio, batch_size, **kwargs):
+            return {"segments": [{"start": 0.5, "end": len(audio) / SR, "text": "x"}]}
+
+    samples = speech_with_pauses(100)
+    source = tmp_path / "input.wav"
+    write_wav(source, samples)
+
+    tee = tmp_path / "tee.wav"
+    streamed = core.whisperx_transcribe_stream(source, "", tee=tee, model=Model())
+    with PCMBuffer(tee) as audio:
+        expected, _ = core.transcribe_array(Model(), audio, batch_size=4, chunk_size=5)
+
+    assert streamed == expected
+    assert len(streamed) > 1
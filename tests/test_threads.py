@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+测试全局线程预算的分配与回收
+"""
+
+import json
+import multiprocessing
+
+import pytest
+
+from transcript.threads import ThreadBudget
+
+
+@pytest.fixture
+def budget(tmp_path):
+    return ThreadBudget(total=12, state_dir=tmp_path)
+
+
+def test_single_stage_gets_everything(budget):
+    with budget.lease("torch") as lease:
+        assert lease.threads == 12
+    assert budget.active() == []
+
+
+def test_concurrent_stages_split_by_weight(budget):
+    with budget.lease("asr") as asr:
+        assert asr.threads == 12
+        with budget.lease("ffmpeg") as ffmpeg:
+            # asr权重2，ffmpeg权重1
+            assert asr.threads == 8
+            assert ffmpeg.threads == 4
+        # ffmpeg结束后asr份额恢复
+        assert asr.threads == 12
+
+
+def test_limit(budget):
+    with budget.lease("asr", limit=6) as lease:
+        assert lease.threads == 6
+    assert budget.share("asr", limit=6) == 6
+
+
+def test_share_does_not_register(budget):
+    with budget.lease("asr"):
+        assert budget.share("torch") == 4
+        assert len(budget.active()) == 1
+
+
+def test_never_below_one_thread(tmp_path):
+    budget = ThreadBudget(total=2, state_dir=tmp_path)
+    with budget.lease("asr"), budget.lease("torch"), budget.lease("ffmpeg") as lease:
+        assert lease.threads == 1
+
+
+def _hold_lease(state_dir, started, done):
+    budget = ThreadBudget(total=12, state_dir=state_dir)
+    with budget.lease("asr"):
+        started.set()
+        done.wait(10)
+
+
+def test_visible_across_processes(budget, tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    started, done = ctx.Event(), ctx.Event()
+    proc = ctx.Process(target=_hold_lease, args=(tmp_path, started, done))
+    proc.start()
+    try:
+        assert started.wait(10)
+        assert budget.share("asr") == 6
+    finally:
+        done.set()
+        proc.join(10)
+    assert budget.share("asr") == 12
+
+
+def test_stale_lease_removed(budget, tmp_path):
+    proc = multiprocessing.get_context("fork").Process(target=lambda: None)
+    proc.start()
+    proc.join()
+    stale = tmp_path / f"{proc.pid}-0-asr.json"
+    stale.write_text(json.dumps({"pid": proc.pid, "stage": "asr", "weight": 2}))
+
+    assert budget.share("torch") == 12
+    assert not stale.exists()
+
+
+@pytest.fixture
+def shared_budget(budget, monkeypatch):
+    from transcript import threads
+
+    monkeypatch.delenv("WHISPERX_THREADS", raising=False)
+    monkeypatch.setattr(threads, "_budget", budget)
+    return budget
+
+
+def test_stream_decode_and_asr_do_not_oversubscribe(shared_budget, monkeypatch):
+    from transcript import ingest
+    from transcript import transcript as core
+
+    used = {}
+
+    def fake_load(prompt, threads=None):
+        used["asr"] = threads
+        return object()
+
+    def fake_stream(source, tee=None, threads=None):
+        used["ffmpeg"] = threads
+        yield from ()
+
+    monkeypatch.setattr(core, "load_whisperx_model", fake_load)
+    monkeypatch.setattr(ingest, "ingest_stream", fake_stream)
+    monkeypatch.setattr(core, "transcribe_windows", lambda *args: (list(args[1]), 1))
+
+    core.whisperx_transcribe_stream("talk.mp4", "")
+    # 转录模型加载时解码已经登记，两者之和不超过预算
+    assert used == {"asr": 8, "ffmpeg": 4}
+    assert shared_budget.active() == []
+
+
+def test_whisperx_model_follows_thread_share(shared_budget, monkeypatch):
+    from transcript import models
+    from transcript import transcript as core
+
+    loads = []
+    monkeypatch.setattr(models, "_registry", models.ModelRegistry(budget=0))
+    monkeypatch.setattr(core, "get_device_config", lambda: ("cpu", "int8"))
+    monkeypatch.setattr(core, "_load_whisperx_model",
+                        lambda prompt, device, compute_type, threads: loads.append(threads) or object())
+
+    first = core.load_whisperx_model("")
+    assert core.load_whisperx_model("") is first and loads == [12]
+
+    # 与ffmpeg同时运行时份额降到8：旧模型会超订CPU，按新份额重新加载
+    with shared_budget.lease("ffmpeg"):
+        second = core.load_whisperx_model("")
+    assert second is not first and loads == [12, 8]
+    assert len(models.get_registry()) == 1
+
+    # 份额回到12（不到两倍）时继续使用8线程的模型
+    assert core.load_whisperx_model("") is second and loads == [12, 8]
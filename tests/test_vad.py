@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+测试共享的VAD时间线
+"""
+
+import numpy as np
+import pytest
+
+from conftest import SR
+from conftest import write_wav as write_samples
+from transcript import transcript as core
+from transcript import vad
+
+
+def energy_with_speech(seconds, speech, level=0.05, noise=1e-6):
+    """每0.1秒一帧的能量，speech为 [(开始秒, 结束秒)]"""
+    energy = np.full(int(seconds * 10), noise)
+    for start, end in speech:
+        energy[int(start * 10):int(end * 10)] = level
+    return energy
+
+
+def test_timeline_from_energy():
+    # 2.0-2.2秒的短停顿并入语音
+    energy = energy_with_speech(10, [(1, 2), (2.2, 3), (6, 8)])
+    timeline = vad.VADTimeline.from_energy(energy)
+
+    assert timeline.duration == pytest.approx(10)
+    assert len(timeline.speech) == 2
+    (s1, e1), (s2, e2) = timeline.speech
+    assert (s1, e1) == (pytest.approx(0.9), pytest.approx(3.1))
+    assert (s2, e2) == (pytest.approx(5.9), pytest.approx(8.1))
+
+    assert timeline.is_speech(2.1) and not timeline.is_speech(4)
+    assert timeline.speech_duration() == pytest.approx(4.4)
+    assert timeline.trim(0, 5) == (pytest.approx(0.9), pytest.approx(3.1))
+    assert timeline.trim(3.5, 5.5) is None
+    assert timeline.pauses(0, 10)[1] == (pytest.approx(3.1), pytest.approx(5.9))
+
+
+def test_nearest_pause_and_snap():
+    timeline = vad.VADTimeline([(0, 10), (12, 20), (21, 30)], 30)
+
+    assert timeline.nearest_pause(10.5, 1) == 10.5
+    assert timeline.nearest_pause(14, 3) == pytest.approx(11)
+    assert timeline.nearest_pause(19, 3) == pytest.approx(20.5)
+    assert timeline.nearest_pause(15, 1) is None
+    assert timeline.nearest_pause(14, 7, lo=13) == pytest.approx(20.5)
+    assert timeline.snap(9.8, 0.3) == pytest.approx(10.1, abs=0.11)
+    assert timeline.snap(5, 0.3) == 5
+
+
+def write_wav(path, seconds, speech):
+    rng = np.random.default_rng(0)
+    samples = np.zeros(seconds * SR, dtype=np.int16)
+    for start, end in speech:
+        samples[start * SR:end * SR] = rng.integers(-8000, 8000, (end - start) * SR)
+    return write_samples(path, samples)
+
+
+def test_timeline_computed_once(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("TRANSCRIPT_CACHE", raising=False)
+    monkeypatch.setattr(vad, "_memo", {})
+    wav = write_wav(tmp_path / "a.wav", 10, [(1, 4), (6, 9)])
+
+    calls = []
+    compute = vad.compute_timeline
+    monkeypatch.setattr(vad, "compute_timeline", lambda path: calls.append(path) or compute(path))
+
+    first = vad.get_timeline(wav)
+    assert vad.get_timeline(wav) is first
+
+    # 新进程（清空进程内记录）读取磁盘缓存；相同音频的副本也命中
+    monkeypatch.setattr(vad, "_memo", {})
+    copy = tmp_path / "b.wav"
+    copy.write_bytes(wav.read_bytes())
+    assert vad.get_timeline(copy).speech == first.speech
+    assert len(calls) == 1
+    assert len(first.speech) == 2
+
+
+def test_asr_windows_cut_at_pause():
+    audio = np.ones(100 * SR, dtype=np.float32)
+    timeline = vad.VADTimeline([(0, 27), (28, 100)], 100)
+    windows = core.asr_windows(audio, window=30, search=5, timeline=timeline)
+    assert windows[0] == (0, int(27.5 * SR))
+
+
+def test_split_long_segment_at_pause():
+    segment = {"start": 0.0, "end": 8.0, "text": "一二三四，五六七八九十"}
+    timeline = vad.VADTimeline([(0, 5), (5.6, 8)], 8)
+
+    plain = core.split_long_segments_by_punctuation([segment])
+    snapped = core.split_long_segments_by_punctuation([segment], timeline=timeline)
+
+    assert plain[0]["end"] == pytest.approx(8 * 5 / 11)
+    assert snapped[0]["end"] == pytest.approx(5.3)
+    assert snapped[1]["start"] == pytest.approx(5.3)
+
+
+def test_cut_plan_snaps_to_pauses():
+    timeline = vad.VADTimeline([(0, 10.3), (10.5, 20.3), (20.5, 30)], 30)
+    to_del = [[3, 10200, 20100]]
+
+    assert core.plan_slices(to_del, 30000) == [(0, 10200), (20100, 30000)]
+    assert core.plan_slices(to_del, 30000, timeline) == [(0, 10400), (20400, 30000)]
+    # 剪辑点已经在停顿中时不移动
+    assert core.plan_slices([[3, 10400, 20100]], 30000, timeline)[0] == (0, 10400)
+
+
+def test_cut_plan_drops_empty_slices():
+    timeline = vad.VADTimeline([(0, 10.3), (10.5, 30)], 30)
+    # 两个删除区间之间的保留部分很短，两个剪辑点都移到同一个停顿
+    to_del = [[1, 5000, 10250], [3, 10550, 20000]]
+    slices = core.plan_slices(to_del, 30000, timeline)
+    assert slices == [(0, 5000), (20000, 30000)]
+
+
+def test_subtitles_follow_snapped_slices():
+    slices = [(0, 10400), (20400, 30000)]
+    # 剪辑点后移了200ms，删除区间之后的字幕按实际保留的片段平移
+    assert core.map_to_slices(21000, slices) == 10400 + 600
+    assert core.map_to_slices(10300, slices) == 10300
+    # 落在删除部分中的时间移到下一个保留片段的开头
+    assert core.map_to_slices(20200, slices) == 10400
+    assert core.map_to_slices(30000, slices) == 20000
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+测试按内容寻址的WAV缓存（用假的ffmpeg命令代替真实解码）
+"""
+
+import re
+import shutil
+
+import pytest
+
+from transcript import cache
+from transcript import transcript as core
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("TRANSCRIPT_CACHE", raising=False)
+    monkeypatch.setenv("TRANSCRIPT_THREAD_DIR", str(tmp_path / "threads"))
+    calls = []
+
+    def execute(cmd, **kwargs):
+        source = re.search(r"-i '([^']+)'", cmd).group(1)
+        target = re.search(r"-y '([^']+)'", cmd).group(1)
+        calls.append(source)
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            dst.write(b"RIFF" + src.read())
+
+    monkeypatch.setattr(core, "execute", execute)
+    monkeypatch.setattr(core, "get_audio_info", lambda path: (16000, 1))
+    return calls
+
+
+def test_repeated_conversion_hits_cache(tmp_path, fake_ffmpeg):
+    media = tmp_path / "talk.mp4"
+    media.write_bytes(b"video-bytes")
+
+    first = tmp_path / "work" / "talk_transcription.wav"
+    second = tmp_path / "work" / "talk_alignment.wav"
+    core.ensure_16khz_mono_wav(media, first, force_convert=True)
+    core.ensure_16khz_mono_wav(media, second, force_convert=True)
+    core.ensure_16khz_mono_wav(media, first, force_convert=True)
+
+    assert len(fake_ffmpeg) == 1
+    assert first.read_bytes() == second.read_bytes() == b"RIFFvideo-bytes"
+
+
+def test_changed_media_is_decoded_again(tmp_path, fake_ffmpeg):
+    media = tmp_path / "talk.mp4"
+    media.write_bytes(b"version-1")
+    output = tmp_path / "out.wav"
+    core.ensure_16khz_mono_wav(media, output, force_convert=True)
+
+    media.write_bytes(b"version-2-longer")
+    core.ensure_16khz_mono_wav(media, output, force_convert=True)
+
+    assert len(fake_ffmpeg) == 2
+    assert output.read_bytes() == b"RIFFversion-2-longer"
+
+
+def test_same_content_elsewhere_hits_cache(tmp_path, fake_ffmpeg):
+    a = tmp_path / "a.mp4"
+    b = tmp_path / "copy" / "b.mp4"
+    b.parent.mkdir()
+    a.write_bytes(b"same")
+    # 保留mtime的副本（cp -p）
+    shutil.copy2(a, b)
+    core.ensure_16khz_mono_wav(a, tmp_path / "a.wav", force_convert=True)
+    core.ensure_16khz_mono_wav(b, tmp_path / "b.wav", force_convert=True)
+    assert len(fake_ffmpeg) == 1
+
+
+def test_cache_disabled(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE", "0")
+    media = tmp_path / "talk.mp4"
+    media.write_bytes(b"x")
+    core.ensure_16khz_mono_wav(media, tmp_path / "1.wav", force_convert=True)
+    core.ensure_16khz_mono_wav(media, tmp_path / "2.wav", force_convert=True)
+    assert len(fake_ffmpeg) == 2
+
+
+def test_fingerprint_memoized(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TRANSCRIPT_FINGERPRINT", "full")
+    media = tmp_path / "m.bin"
+    media.write_bytes(b"abc")
+    digest = cache.file_fingerprint(media)
+
+    monkeypatch.setattr(cache, "content_hash", lambda path: pytest.fail("不应重新计算"))
+    assert cache.file_fingerprint(media) == digest
+
+
+def test_prune_keeps_recent(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TRANSCRIPT_CACHE_GB", str(150 / 1024 ** 3))
+
+    paths = []
+    for i, key in enumerate(["aa1", "bb2", "cc3"]):
+        path, hit = cache.get_or_create("wav", key, lambda p: p.write_bytes(b"x" * 60))
+        assert not hit
+        paths.append(path)
+
+    # 超过150字节上限，最旧的被淘汰
+    assert not paths[0].exists()
+    assert paths[1].exists() and paths[2].exists()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+测试whisper.cpp服务后端（使用本地的桩服务，不需要whisper.cpp）
+"""
+
+import socket
+import subprocess
+import sys
+import time
+import wave
+
+import pytest
+
+from transcript import asr, whisper_server
+from transcript import transcript as core
+
+# 桩服务：解析multipart，返回verbose_json格式的片段；文本中带回收到的音频字节数和prompt
+STUB_SERVER = r'''
+import argparse, json, re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int)
+args, _ = parser.parse_known_args()
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *a):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b"stub")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        boundary = re.search("boundary=(.+)", self.headers["Content-Type"]).group(1).encode()
+        fields = {}
+        for part in body.split(b"--" + boundary)[1:-1]:
+            header, _, value = part.partition(b"\r\n\r\n")
+            name = re.search(rb'name="([^"]+)"', header).group(1).decode()
+            fields[name] = value[:-2]
+        result = {"text": "", "segments": [
+            {"id": 0, "start": 0.0, "end": 1.5,
+             "text": " bytes=%d" % len(fields["file"])},
+            {"id": 1, "start": 1.5, "end": 2.0,
+             "text": " prompt=%s format=%s" % (fields["prompt"].decode(), fields["response_format"].decode())},
+        ]}
+        data = json.dumps(result).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+ThreadingHTTPServer((args.host, args.port), Handler).serve_forever()
+'''
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_running(url):
+    for _ in range(100):
+        if whisper_server.is_running(url):
+            return
+        time.sleep(0.05)
+    raise TimeoutError(url)
+
+
+@pytest.fixture
+def wav(tmp_path):
+    path = tmp_path / "audio.wav"
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(b"\1\0" * 16000 * 3)
+    return path
+
+
+@pytest.fixture
+def stub_binary(tmp_path, monkeypatch):
+    """把桩服务伪装成whisper.cpp目录中的whisper-server"""
+    cpp_dir = tmp_path / "whisper.cpp"
+    cpp_dir.mkdir()
+    binary = cpp_dir / "whisper-server"
+    binary.write_text(f"#!{sys.executable}\n{STUB_SERVER}")
+    binary.chmod(0o755)
+    model = cpp_dir / "ggml-test.bin"
+    model.write_bytes(b"model")
+
+    monkeypatch.setattr(core, "cpp_path", cpp_dir)
+    monkeypatch.setattr(core, "cpp_model", model)
+    monkeypatch.setattr(whisper_server, "DEFAULT_URL", f"http://127.0.0.1:{free_port()}")
+    monkeypatch.delenv("TRANSCRIPT_WHISPER_SERVER_URL", raising=False)
+    monkeypatch.setenv("TRANSCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TRANSCRIPT_THREAD_DIR", str(tmp_path / "threads"))
+    yield binary
+    whisper_server.stop()
+
+
+def test_external_server(tmp_path, wav, monkeypatch):
+    url = f"http://127.0.0.1:{free_port()}"
+    script = tmp_path / "stub.py"
+    script.write_text(STUB_SERVER)
+    proc = subprocess.Popen([sys.executable, str(script), "--port", url.rsplit(":", 1)[1]])
+    try:
+        wait_until_running(url)
+        monkeypatch.setenv("TRANSCRIPT_WHISPER_SERVER_URL", url)
+
+        backend = asr.get_backend("whisper.cpp-server")
+        assert backend.available()
+        segments = backend.transcribe(wav, "提示")
+
+        header = 44
+        assert segments[0] == {"start": 0.0, "end": 1.5,
+                               "text": f"bytes={wav.stat().st_size}"}
+        assert wav.stat().st_size == header + 16000 * 3 * 2
+        assert segments[1]["text"] == "prompt=提示 format=verbose_json"
+        # 外部服务不归本进程管理
+        assert whisper_server._process is None
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def test_server_started_once_and_reused(stub_binary, wav):
+    backend = asr.get_backend("whisper.cpp-server")
+    assert backend.available()
+
+    backend.transcribe(wav, "")
+    process = whisper_server._process
+    assert process is not None and process.poll() is None
+
+    segments = backend.transcribe(wav, "")
+    assert whisper_server._process is process
+    assert segments[0]["end"] == 1.5
+
+    whisper_server.stop()
+    process.wait(5)
+    assert not whisper_server.is_running()
+
+
+def test_parse_legacy_centiseconds():
+    payload = {"segments": [{"t0": 150, "t1": 320, "text": " 你好 "}, {"t0": 320, "t1": 400, "text": ""}]}
+    assert whisper_server.parse_segments(payload) == [{"start": 1.5, "end": 3.2, "text": "你好"}]
+
+
+def test_unavailable_without_binary(tmp_path, monkeypatch):
+    monkeypatch.delenv("TRANSCRIPT_WHISPER_SERVER_URL", raising=False)
+    monkeypatch.setattr(core, "cpp_path", tmp_path)
+    assert not asr.get_backend("whisper.cpp-server").available()
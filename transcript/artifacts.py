@@ -0,0 +1,189 @@
+"""
+零拷贝的文件搬运
+
+transcript() 要把输入视频放进 /tmp/transcript/<name>，merge() 要把成品放到
+输出目录，多GB的文件直接复制会让每个任务的磁盘I/O翻倍。这里按代价从低到高
+依次尝试：
+
+- 硬链接：同一文件系统，不占额外空间
+- reflink（写时复制克隆，Linux上的btrfs/XFS等支持）：两个文件互不影响
+- 符号链接：只用于放进工作目录的输入文件（stage），跨设备时代替复制；
+  链接时记下源文件的大小、mtime和内容指纹，之后复用前先校验，源文件被
+  修改过就重新放置
+- 复制：以上都不可用时
+
+stage() 用于工作目录中只读的输入，publish() 用于交付给用户的成品。成品只用
+reflink或复制：工作目录中的文件（aligned.srt、main.* 等）之后可能被就地
+改写，硬链接或符号链接会让交付出去的文件跟着被截断或改变。每次搬运省下
+的字节数会累计，report() 输出汇总。
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+# 记录符号链接源文件信息的文件（位于链接所在目录）
+LINKS_NAME = ".artifacts.json"
+
+# Linux的FICLONE ioctl（_IOW(0x94, 9, int)）
+FICLONE = 0x40049409
+
+_stats = {"files": 0, "avoided": 0, "copied": 0}
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    except OSError:
+        dst.unlink(missing_ok=True)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def _hardlink(src: Path, dst: Path) -> bool:
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:
+        return False
+
+
+def _load_links(directory: Path) -> dict:
+    try:
+        with open(directory / LINKS_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_links(directory: Path, links: dict):
+    tmp = directory / f"{LINKS_NAME}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(links, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, directory / LINKS_NAME)
+    except OSError as e:
+        print(f"⚠️ 无法记录链接信息: {e}")
+
+
+def _symlink(src: Path, dst: Path) -> bool:
+    from .cache import file_fingerprint
+
+    try:
+        os.symlink(src, dst)
+    except OSError:
+        return False
+    stat = src.stat()
+    links = _load_links(dst.parent)
+    links[dst.name] = {
+        "source": str(src),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "fingerprint": file_fingerprint(src),
+    }
+    _save_links(dst.parent, links)
+    return True
+
+
+def is_valid(src: Path, dst: Path) -> bool:
+    """
+    dst是否仍然是src内容的有效副本：硬链接/符号链接指向同一个文件，且
+    符号链接登记时的内容指纹没有变化；复制/reflink得到的文件大小和mtime
+    一致
+    """
+    src, dst = Path(src).resolve(), Path(dst)
+    if not dst.exists():
+        return False
+
+    if dst.is_symlink():
+        if Path(os.path.realpath(dst)) != src:
+            return False
+        record = _load_links(dst.parent).get(dst.name)
+        if record is None:
+            return False
+        stat = src.stat()
+        if (stat.st_size, stat.st_mtime_ns) == (record["size"], record["mtime_ns"]):
+            return True
+        # 大小或mtime变化时按指纹判断（TRANSCRIPT_FINGERPRINT=full 时只是touch过仍然有效）
+        from .cache import file_fingerprint
+
+        return file_fingerprint(src) == record["fingerprint"]
+
+    if dst.samefile(src):
+        return True
+    src_stat, dst_stat = src.stat(), dst.stat()
+    return (src_stat.st_size, src_stat.st_mtime_ns) == (dst_stat.st_size, dst_stat.st_mtime_ns)
+
+
+def _place(src: Path, dst: Path, methods) -> str:
+    src, dst = Path(src), Path(dst)
+    if dst.is_symlink() or dst.exists():
+        if "hardlink" in dict(methods) and dst.exists() and dst.samefile(src) \
+                and not dst.is_symlink():
+            return "hardlink"
+        # 与src共享inode的旧成品也要断开，否则改写src会改变它
+        dst.unlink()
+    dst.parent.mkdir(parents=True, exist_ok=True)
+
+    size = src.stat().st_size
+    for name, method in methods:
+        if method(src, dst):
+            _stats["files"] += 1
+            _stats["avoided"] += size
+            return name
+
+    shutil.copy2(src, dst)
+    _stats["files"] += 1
+    _stats["copied"] += size
+    return "copy"
+
+
+def stage(src: Path, dst: Path) -> str:
+    """
+    把只读的输入文件放进工作目录：硬链接 > reflink > 符号链接 > 复制；
+    dst已经是src的有效副本时直接复用
+
+    Returns:
+        str: 使用的方式（"reuse" / "hardlink" / "reflink" / "symlink" / "copy"）
+    """
+    src, dst = Path(src).resolve(), Path(dst)
+    if is_valid(src, dst):
+        return "reuse"
+    if dst.is_symlink() or dst.exists():
+        print(f"⚠️ 工作目录中的 {dst.name} 与源文件不一致，重新放置")
+    return _place(src, dst, (("hardlink", _hardlink), ("reflink", _reflink),
+                             ("symlink", _symlink)))
+
+
+def publish(src: Path, dst: Path) -> str:
+    """
+    把成品放到输出位置：reflink > 复制。不用硬链接：之后就地改写工作目录
+    中的文件会直接改变（甚至截断）交付出去的成品
+
+    Returns:
+        str: 使用的方式（"reflink" / "copy"）
+    """
+    return _place(src, dst, (("reflink", _reflink),))
+
+
+def stats() -> dict:
+    """本进程累计的 {"files", "avoided", "copied"}（字节）"""
+    return dict(_stats)
+
+
+def report(reset: bool = True):
+    """输出累计避免复制的字节数"""
+    if _stats["files"]:
+        print(f"💾 文件搬运: {_stats['files']} 个文件，避免复制 "
+              f"{_stats['avoided'] / 1024 ** 2:.1f}MB，实际复制 "
+              f"{_stats['copied'] / 1024 ** 2:.1f}MB")
+    if reset:
+        for key in _stats:
+            _stats[key] = 0
@@ -0,0 +1,383 @@
+"""
+可插拔的语音识别（ASR）后端
+
+每个后端实现 available() 和 transcribe()，返回统一格式的片段列表
+[{"start": 秒, "end": 秒, "text": 文本}]，说话人分离等后续阶段只依赖这个格式，
+与具体后端无关。
+
+每次转录后记录后端在本机的实时率（处理耗时 / 音频时长，越小越快），保存在
+$TRANSCRIPT_CACHE_DIR/asr_speed.json。select_backends() 按实测实时率从快到慢
+排列可用后端，还没有测量数据的后端按 priority 排在后面，只在前面的后端失败
+时才会用到。设置 TRANSCRIPT_ASR_EXPLORE=1 时没有测量数据的后端排在最前，
+真实任务跑过一次后就有了数据。
+
+环境变量 TRANSCRIPT_ASR_BACKEND 可以指定后端（例如 whisper.cpp）。
+
+转录结果按 result_key()（解码后音频的指纹、后端及其设置、提示词和分块
+参数）缓存在 $TRANSCRIPT_CACHE_DIR/asr/ 中，修改词典或说话人分离后重新运行
+`transcript gen` 时直接复用，不再重跑一遍模型。
+
+新增后端：
+
+    @register_backend
+    class MyBackend(ASRBackend):
+        name = "my-asr"
+        def available(self): ...
+        def transcribe(self, audio_path, prompt): ...
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+SPEED_NAME = "asr_speed.json"
+
+# 实时率的指数滑动平均系数：新测量值的权重
+SPEED_SMOOTHING = 0.3
+
+# 转录结果缓存的格式版本，片段格式变化时递增
+RESULT_VERSION = 1
+
+_backends = {}
+
+
+def register_backend(cls):
+    """注册后端类（可用作装饰器）"""
+    _backends[cls.name] = cls
+    return cls
+
+
+def get_backend(name: str):
+    """按名称返回后端实例"""
+    try:
+        return _backends[name]()
+    except KeyError:
+        raise ValueError(f"未知ASR后端: {name}（可选: {', '.join(_backends)}）")
+
+
+def backend_names():
+    return list(_backends)
+
+
+def audio_duration(audio_path: Path) -> float:
+    """WAV音频时长（秒），无法读取时返回0"""
+    try:
+        with wave.open(str(audio_path), "rb") as f:
+            return f.getnframes() / float(f.getframerate())
+    except (OSError, wave.Error, EOFError):
+        return 0.0
+
+
+def _speed_path() -> Path:
+    from .cache import cache_dir
+
+    return cache_dir() / SPEED_NAME
+
+
+def load_speeds() -> dict:
+    """返回 {后端名: {"rtf": 实时率, "runs": 次数}}"""
+    try:
+        with open(_speed_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_speed(name: str, elapsed: float, duration: float):
+    """记录一次转录的实时率"""
+    if duration <= 0:
+        return
+    rtf = elapsed / duration
+    speeds = load_speeds()
+    entry = speeds.get(name)
+    if entry:
+        entry["rtf"] = (1 - SPEED_SMOOTHING) * entry["rtf"] + SPEED_SMOOTHING * rtf
+        entry["runs"] += 1
+    else:
+        speeds[name] = {"rtf": rtf, "runs": 1}
+
+    path = _speed_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(speeds, f, indent=2)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ 无法保存ASR速度记录: {e}")
+
+
+class ASRBackend:
+    """ASR后端接口"""
+
+    name = ""
+    # 没有测量数据时的先后顺序（越小越优先）
+    priority = 100
+
+    def available(self) -> bool:
+        raise NotImplementedError
+
+    def supports_parallel(self) -> bool:
+        """能否在多个进程中同时转录同一录音的不同分块（见 chunks）"""
+        return True
+
+    def settings(self) -> dict:
+        """影响转录结果的设置（模型、计算类型等），作为结果缓存键的一部分"""
+        return {}
+
+    def transcribe(self, audio_path: Path, prompt: str):
+        """
+        转录16kHz单声道WAV
+
+        Returns:
+            list: [{"start", "end", "text"}]，时间单位为秒
+        """
+        raise NotImplementedError
+
+    def transcribe_media(self, source: Path, wav_path: Path, prompt: str):
+        """
+        从任意音视频文件转录，并在wav_path留下16kHz单声道WAV供后续阶段使用
+
+        默认先完成媒体导入（一次解码，走WAV缓存，见 ingest）再转录；能边
+        解码边转录的后端可以覆盖。
+        """
+        from . import cache
+        from .ingest import audio_path, ingest
+
+        cache.place(audio_path(ingest(source)), wav_path)
+        return self.transcribe(wav_path, prompt)
+
+    def realtime_factor(self):
+        """本机实测的实时率（耗时/音频时长），没有数据时返回None"""
+        entry = load_speeds().get(self.name)
+        return entry["rtf"] if entry else None
+
+    def run(self, audio_path: Path, prompt: str, source: Path = None):
+        """
+        转录并记录实时率
+
+        Args:
+            audio_path: 16kHz单声道WAV；给出source时由本方法生成
+            source: 原始音视频文件（解码时间计入实时率）
+        """
+        start = time.perf_counter()
+        if source is not None:
+            segments = self.transcribe_media(source, audio_path, prompt)
+        else:
+            segments = self.transcribe(audio_path, prompt)
+        elapsed = time.perf_counter() - start
+        duration = audio_duration(audio_path)
+        record_speed(self.name, elapsed, duration)
+        if duration:
+            print(f"⏱️  {self.name} 实时率 {elapsed / duration:.3f}（{elapsed:.0f}s / {duration:.0f}s 音频）")
+        return segments
+
+
+@register_backend
+class WhisperXBackend(ASRBackend):
+    """whisperx（faster-whisper批量推理），优先使用常驻模型守护进程"""
+
+    name = "whisperx"
+    priority = 10
+
+    def available(self) -> bool:
+        return importlib.util.find_spec("whisperx") is not None
+
+    def settings(self) -> dict:
+        from . import batching
+        from . import transcript as core
+
+        device, compute_type = core.get_device_config()
+        return {
+            "model": core.whisperx_model,
+            "device": device,
+            "compute_type": compute_type,
+            "batch_size": os.environ.get("WHISPERX_BATCH_SIZE", "8"),
+            "chunk_size": os.environ.get("WHISPERX_CHUNK_SIZE", "10"),
+            "bucket_batch": batching.enabled(),
+        }
+
+    def supports_parallel(self) -> bool:
+        """守护进程只有一份常驻模型，GPU上多个进程只会争抢显存"""
+        from . import daemon
+        from . import transcript as core
+
+        return not daemon.is_running() and core.get_device_config()[0] == "cpu"
+
+    def transcribe(self, audio_path: Path, prompt: str):
+        from . import transcript as core
+        from .daemon import request as daemon_request
+
+        segments = daemon_request("transcribe", audio=str(audio_path), prompt=prompt)
+        if segments is None:
+            segments, _ = core.whisperx_transcribe(audio_path, prompt)
+        return segments
+
+    def transcribe_media(self, source: Path, wav_path: Path, prompt: str):
+        """WAV缓存未命中且没有守护进程时边解码边转录，解码结果同时写入缓存"""
+        from . import cache
+        from . import daemon
+        from . import transcript as core
+
+        if daemon.is_running():
+            return super().transcribe_media(source, wav_path, prompt)
+
+        if not cache.enabled():
+            return core.whisperx_transcribe_stream(source, prompt, tee=wav_path)
+
+        result = {}
+
+        def decode_and_transcribe(target: Path):
+            result["segments"] = core.whisperx_transcribe_stream(source, prompt, tee=target)
+
+        cached, hit = cache.get_or_create("wav", core.wav_cache_key(source),
+                                          decode_and_transcribe, suffix=".wav")
+        cache.place(cached, wav_path)
+        if hit:
+            print(f"♻️  复用已解码的16kHz单声道音频: {wav_path}")
+            return self.transcribe(wav_path, prompt)
+        return result["segments"]
+
+
+@register_backend
+class WhisperCppBackend(ASRBackend):
+    """whisper.cpp命令行（whisper-cli）"""
+
+    name = "whisper.cpp"
+    priority = 20
+
+    def available(self) -> bool:
+        from . import transcript as core
+
+        return (Path(core.cpp_path) / "whisper-cli").exists() and Path(core.cpp_model).exists()
+
+    def settings(self) -> dict:
+        from . import transcript as core
+
+        return {"model": Path(core.cpp_model).name}
+
+    def transcribe(self, audio_path: Path, prompt: str):
+        import pysubs2
+
+        from . import transcript as core
+
+        with tempfile.TemporaryDirectory(prefix="whisper-cpp-") as tmp:
+            output_srt = Path(tmp) / f"{Path(audio_path).stem}.srt"
+            core.transcript_cpp(Path(audio_path), output_srt, prompt)
+            subs = pysubs2.load(str(output_srt))
+
+        return [
+            {"start": event.start / 1000, "end": event.end / 1000, "text": event.plaintext}
+            for event in subs
+        ]
+
+
+@register_backend
+class WhisperCppServerBackend(ASRBackend):
+    """常驻的whisper.cpp服务（whisper-server），模型只加载一次"""
+
+    name = "whisper.cpp-server"
+    priority = 15
+
+    def available(self) -> bool:
+        from . import transcript as core
+        from . import whisper_server
+
+        if "TRANSCRIPT_WHISPER_SERVER_URL" in os.environ:
+            return True
+        return (whisper_server.find_server_binary(core.cpp_path) is not None
+                and Path(core.cpp_model).exists())
+
+    def supports_parallel(self) -> bool:
+        # 所有进程共用同一个服务，请求按顺序处理
+        return False
+
+    def settings(self) -> dict:
+        from . import transcript as core
+
+        return {"model": Path(core.cpp_model).name,
+                "server": os.environ.get("TRANSCRIPT_WHISPER_SERVER_URL", "")}
+
+    def start(self) -> str:
+        """确保服务在运行，返回服务地址"""
+        from . import transcript as core
+        from . import whisper_server
+        from .threads import get_budget
+
+        threads = get_budget().share("asr", limit=core.asr_thread_limit())
+        return whisper_server.start(core.cpp_path, core.cpp_model, threads)
+
+    def transcribe(self, audio_path: Path, prompt: str):
+        from . import transcript as core
+        from . import whisper_server
+        from .threads import thread_lease
+
+        url = self.start()
+        # 服务的线程数在启动时已确定，登记租约是为了让其它阶段让出CPU
+        with thread_lease("asr", limit=core.asr_thread_limit()):
+            return whisper_server.transcribe(audio_path, prompt, url)
+
+
+def settings_key(backend, prompt: str, options: dict = None) -> str:
+    """
+    与音频无关的转录设置的键：后端及其设置、提示词和其它参数相同时，同一段
+    音频的转录结果相同
+
+    Args:
+        backend: ASR后端
+        options: 其它影响结果的参数（跳过静音、分块等）
+    """
+    key = {
+        "version": RESULT_VERSION,
+        "backend": backend.name,
+        "settings": backend.settings(),
+        "prompt": prompt,
+        "options": options or {},
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def result_key(backend, wav: Path, prompt: str, options: dict = None) -> str:
+    """转录结果的缓存键：转录设置（见 settings_key）加上WAV解码后音频的指纹"""
+    from .cache import decoded_fingerprint
+
+    settings = settings_key(backend, prompt, options)
+    return hashlib.sha256(f"{settings}:{decoded_fingerprint(Path(wav))}".encode()).hexdigest()
+
+
+def select_backends(preferred: str = None):
+    """
+    返回按优先顺序排列的可用后端
+
+    Args:
+        preferred: 指定的后端名，默认读取 TRANSCRIPT_ASR_BACKEND；指定的后端
+            排在最前，其余后端作为失败时的备选
+
+    其余后端按实测实时率从快到慢排列，没有测量数据的按 priority 排在最后
+    （TRANSCRIPT_ASR_EXPLORE=1 时排在最前）
+    """
+    preferred = preferred or os.environ.get("TRANSCRIPT_ASR_BACKEND")
+    backends = [cls() for cls in _backends.values()]
+    backends = [backend for backend in backends if backend.available()]
+
+    speeds = load_speeds()
+    explore = os.environ.get("TRANSCRIPT_ASR_EXPLORE", "0") == "1"
+
+    def order(backend):
+        if backend.name == preferred:
+            return (0, 0, 0)
+        entry = speeds.get(backend.name)
+        # 按实测实时率排序；没有测量数据的后端默认排在后面，探索模式下先跑一次
+        if entry is None:
+            return (1 if explore else 3, 0, backend.priority)
+        return (2, entry["rtf"], backend.priority)
+
+    if preferred and preferred not in [backend.name for backend in backends]:
+        print(f"⚠️ 指定的ASR后端 {preferred} 不可用，自动选择")
+
+    return sorted(backends, key=order)
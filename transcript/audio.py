@@ -0,0 +1,292 @@
+"""
+内存映射的16kHz单声道PCM音频
+
+whisperx.load_audio 会把整个文件解码成float32数组，多小时的录音每个阶段都要
+占用数GB内存。PCMBuffer 直接内存映射（缓存中的）16位WAV文件：
+
+- buffer.pcm 是int16的零拷贝视图
+- buffer[a:b] / buffer.window(秒, 秒) 只把这一段转换为float32（与
+  whisperx.load_audio 的取值范围相同），读完后把映射的页面还给内核，
+  常驻内存不随文件时长增长
+- 支持 len()、shape、切片，可以直接替代float32数组传给按段切片的代码
+
+stream_pcm() 则用ffmpeg把媒体文件直接解码到管道，逐块产出float32数组，
+转录和静音分析可以在解码的同时开始。
+"""
+
+import mmap
+import os
+import struct
+import subprocess
+from pathlib import Path
+
+SAMPLE_RATE = 16000
+
+# frame_energy等逐块处理时每块的时长（秒）
+BLOCK_SECONDS = 60
+
+# 流式解码时每次产出的时长（秒）
+STREAM_CHUNK_SECONDS = 10
+
+
+def parse_wav_header(f):
+    """
+    解析WAV头，返回 (sample_rate, channels, bits, data_offset, data_size)
+
+    支持ffmpeg写出的带LIST等附加块的文件；data块大小无效（超过4GB或流式
+    写出）时取到文件末尾。
+    """
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise ValueError("不是WAV文件")
+
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("WAV文件缺少data块")
+        chunk_id, size = header[:4], struct.unpack("<I", header[4:])[0]
+        if chunk_id == b"fmt ":
+            data = f.read(size)
+            audio_format, channels, sample_rate = struct.unpack("<HHI", data[:8])
+            bits = struct.unpack("<H", data[14:16])[0]
+            fmt = (audio_format, channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV文件缺少fmt块")
+            offset = f.tell()
+            file_size = os.fstat(f.fileno()).st_size
+            if size == 0 or size == 0xFFFFFFFF or offset + size > file_size:
+                size = file_size - offset
+            audio_format, channels, sample_rate, bits = fmt
+            # 0xFFFE为WAVE_FORMAT_EXTENSIBLE
+            if audio_format not in (1, 0xFFFE):
+                raise ValueError(f"不支持的WAV编码: {audio_format}")
+            return sample_rate, channels, bits, offset, size
+        else:
+            f.seek(size + (size & 1), os.SEEK_CUR)
+
+
+class PCMBuffer:
+    """16kHz单声道16位WAV的内存映射视图"""
+
+    ndim = 1
+
+    def __init__(self, path: Path):
+        import numpy as np
+
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            sample_rate, channels, bits, offset, size = parse_wav_header(self._file)
+            if (sample_rate, channels, bits) != (SAMPLE_RATE, 1, 16):
+                raise ValueError(f"需要16kHz单声道16位WAV，实际为 "
+                                 f"{sample_rate}Hz/{channels}声道/{bits}位: {self.path}")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        self.sample_rate = sample_rate
+        self._offset = offset
+        self.pcm = np.frombuffer(self._mmap, dtype="<i2", count=size // 2, offset=offset)
+
+    def __len__(self) -> int:
+        return len(self.pcm)
+
+    @property
+    def shape(self):
+        return (len(self.pcm),)
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / self.sample_rate
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self.pcm))
+            if step != 1:
+                raise ValueError("PCMBuffer只支持连续切片")
+            return self.read(start, stop)
+        return self.pcm[key] / 32768.0
+
+    def read(self, start: int, stop: int):
+        """返回 [start, stop) 采样点的float32副本，并释放对应的映射页面"""
+        import numpy as np
+
+        start, stop = max(0, start), min(len(self.pcm), stop)
+        if stop <= start:
+            return np.zeros(0, dtype=np.float32)
+        window = self.pcm[start:stop].astype(np.float32)
+        window *= 1.0 / 32768.0
+        self.release(start, stop)
+        return window
+
+    def window(self, start: float, end: float):
+        """按秒读取一段float32音频"""
+        return self.read(int(start * self.sample_rate), int(end * self.sample_rate))
+
+    def release(self, start: int, stop: int):
+        """
+        把采样点范围对应的页面从本进程的映射中移除（数据仍在页缓存中），
+        否则顺序读完整个文件后这些页面都会计入RSS
+        """
+        if not hasattr(self._mmap, "madvise") or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        page = mmap.PAGESIZE
+        begin = (self._offset + start * 2) // page * page
+        end = self._offset + stop * 2
+        try:
+            self._mmap.madvise(mmap.MADV_DONTNEED, begin, end - begin)
+        except (OSError, ValueError):
+            pass
+
+    def close(self):
+        self.pcm = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # 仍有零拷贝视图在使用，交给垃圾回收
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_pcm(path: Path):
+    """
+    打开16kHz单声道WAV为PCMBuffer；格式不符时回退为whisperx.load_audio
+    （整段解码为float32数组）
+    """
+    try:
+        return PCMBuffer(path)
+    except (ValueError, OSError) as e:
+        print(f"⚠️ 无法内存映射音频，整段解码: {e}")
+        import whisperx
+
+        return whisperx.load_audio(str(path))
+
+
+def write_spans(wav: Path, output: Path, spans, block_seconds: float = BLOCK_SECONDS):
+    """
+    把16kHz单声道WAV中的若干区间 [(start, end)]（秒）依次拼接写出，
+    逐块复制PCM，不整段载入内存
+
+    Returns:
+        Path: output
+    """
+    import wave
+
+    with PCMBuffer(wav) as audio, wave.open(str(output), "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(audio.sample_rate)
+        block = int(block_seconds * audio.sample_rate)
+        for start, end in spans:
+            first = max(0, int(start * audio.sample_rate))
+            last = min(len(audio), int(end * audio.sample_rate))
+            for begin in range(first, last, block):
+                stop = min(last, begin + block)
+                out.writeframesraw(audio.pcm[begin:stop].tobytes())
+                audio.release(begin, stop)
+    return Path(output)
+
+
+def frame_energy(audio, frame: int, block_seconds: float = BLOCK_SECONDS):
+    """
+    逐帧平均能量，按块处理，不生成与整段音频同样大的临时数组
+
+    Args:
+        audio: float32数组或PCMBuffer
+        frame: 每帧采样点数
+
+    Returns:
+        numpy数组，长度为 len(audio) // frame
+    """
+    import numpy as np
+
+    n_frames = len(audio) // frame
+    energy = np.empty(n_frames, dtype=np.float32)
+    frames_per_block = max(1, int(block_seconds * SAMPLE_RATE) // frame)
+    for first in range(0, n_frames, frames_per_block):
+        last = min(n_frames, first + frames_per_block)
+        block = np.asarray(audio[first * frame:last * frame], dtype=np.float32)
+        frames = block.reshape(last - first, frame)
+        energy[first:last] = np.einsum("ij,ij->i", frames, frames) / frame
+    return energy
+
+
+def stream_pcm(source: Path, chunk_seconds: float = STREAM_CHUNK_SECONDS,
+               tee: Path = None, threads: int = None):
+    """
+    用ffmpeg把任意音视频解码为16kHz单声道PCM，通过管道逐块产出
+
+    Args:
+        source: 输入文件
+        chunk_seconds: 每块的时长（最后一块可能更短）
+        tee: 同时写出的WAV文件路径（正常结束时才是完整文件）
+        threads: ffmpeg线程数
+
+    Yields:
+        float32数组（取值范围与 whisperx.load_audio 相同）
+    """
+    import wave
+
+    import numpy as np
+
+    cmd = ["ffmpeg", "-nostdin", "-v", "error"]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    cmd += ["-i", str(source), "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+            "-f", "s16le", "-acodec", "pcm_s16le", "-"]
+
+    chunk_bytes = int(chunk_seconds * SAMPLE_RATE) * 2
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    writer = None
+    finished = False
+    try:
+        if tee is not None:
+            writer = wave.open(str(tee), "wb")
+            writer.setnchannels(1)
+            writer.setsampwidth(2)
+            writer.setframerate(SAMPLE_RATE)
+
+        carry = b""
+        while True:
+            data = proc.stdout.read(chunk_bytes)
+            if not data:
+                break
+            data = carry + data
+            # 管道可能在采样点中间断开
+            usable = len(data) // 2 * 2
+            data, carry = data[:usable], data[usable:]
+            if not data:
+                continue
+            if writer is not None:
+                writer.writeframesraw(data)
+            samples = np.frombuffer(data, dtype="<i2").astype(np.float32)
+            samples *= 1.0 / 32768.0
+            yield samples
+
+        stderr = proc.stderr.read().decode("utf-8", errors="replace")
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg解码失败: {source}: {stderr.strip()}")
+        finished = True
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+        if writer is not None:
+            writer.close()
+            if not finished:
+                # 不完整的WAV不能留下来被当作缓存使用
+                try:
+                    os.unlink(tee)
+                except OSError:
+                    pass
@@ -0,0 +1,108 @@
+"""
+按时长分桶的语音片段批处理
+
+whisperx 的 transcribe() 按VAD片段出现的先后顺序组批。whisper的编码器
+总是把输入补齐到30秒，但解码器要一直运行到批中最长的一条文本结束，短句
+和长句混在一批里时，短句的解码位置大部分时间都在空转。这里改为：
+
+1. 用共享的VAD时间线（见 vad）得到窗口内的语音区间，按 chunk_size 合并
+   （与 whisperx 的 merge_chunks 相同：相邻区间合并到不超过 chunk_size 秒，
+   过长的区间按 chunk_size 切开）
+2. 按时长从长到短排序后组批，同一批中的片段长度相近
+3. 转录完成后恢复原来的时间顺序
+
+    spans = merge_spans(timeline.speech_in(0, 600), chunk_size=10)
+    segments = transcribe_bucketed(model, audio, spans, batch_size=8)
+
+padding_ratio() 按“每批的解码代价 = 批中片段数 × 最长片段时长”估算补齐
+浪费的比例，tests/bench_bucketing.py 用它比较两种组批方式。
+
+默认关闭，使用 whisperx 自带的VAD和组批方式。设置 TRANSCRIPT_BUCKET_BATCH=1
+启用：这时不再运行 whisperx 的VAD，改用能量VAD时间线切分，并直接调用流水线
+的批量推理接口（依赖 whisperx 的内部实现，升级 whisperx 后需要重新验证）。
+"""
+
+import os
+
+SAMPLE_RATE = 16000
+
+
+def enabled() -> bool:
+    return os.environ.get("TRANSCRIPT_BUCKET_BATCH", "0") == "1"
+
+
+def merge_spans(spans, chunk_size: float):
+    """
+    把按时间排列的语音区间 [(start, end)] 合并成不超过chunk_size秒的片段
+    （片段包含区间之间的短停顿）
+    """
+    merged = []
+    for start, end in spans:
+        # 单个过长的区间按chunk_size切开
+        while end - start > chunk_size:
+            merged.append((start, start + chunk_size))
+            start += chunk_size
+        if merged and end - merged[-1][0] <= chunk_size:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def bucket_order(durations):
+    """按时长从长到短排列的下标（时长相同时保持原来的先后顺序）"""
+    return sorted(range(len(durations)), key=lambda i: -durations[i])
+
+
+def padding_ratio(durations, batch_size: int, order=None) -> float:
+    """
+    按order的顺序每batch_size个组成一批时，补齐浪费的解码代价所占比例
+
+    Args:
+        durations: 每个片段的时长
+        order: 片段的处理顺序，默认为原来的顺序
+    """
+    order = list(range(len(durations))) if order is None else list(order)
+    cost = 0.0
+    for first in range(0, len(order), batch_size):
+        batch = [durations[i] for i in order[first:first + batch_size]]
+        cost += len(batch) * max(batch)
+    return 1 - sum(durations) / cost if cost else 0.0
+
+
+def transcribe_bucketed(model, audio, spans, batch_size: int, sample_rate: int = SAMPLE_RATE,
+                        bucketed: bool = True):
+    """
+    按时长分桶转录语音片段
+
+    直接使用 whisperx 流水线的批量推理接口（FasterWhisperPipeline.__call__），
+    需要模型在加载时指定了语言（tokenizer已创建）；不满足时返回None，由调用方
+    回退为 model.transcribe()
+
+    Args:
+        model: whisperx转录模型
+        audio: float32数组或PCMBuffer
+        spans: 语音片段 [(start, end)]（秒，相对于audio开头）
+        bucketed: 为False时按原来的顺序组批（用于对比测试）
+
+    Returns:
+        list: [{"start", "end", "text"}]，按时间排列；不支持时返回None
+    """
+    if getattr(model, "tokenizer", None) is None or not callable(model):
+        return None
+
+    order = bucket_order([end - start for start, end in spans]) if bucketed else range(len(spans))
+
+    def inputs():
+        for i in order:
+            start, end = spans[i]
+            yield {"inputs": audio[int(start * sample_rate):int(end * sample_rate)]}
+
+    texts = [None] * len(spans)
+    for i, out in zip(order, model(inputs(), batch_size=batch_size, num_workers=0)):
+        text = out["text"]
+        # batch_size为1时流水线返回列表
+        texts[i] = text[0] if isinstance(text, list) else text
+
+    return [{"text": text, "start": round(start, 3), "end": round(end, 3)}
+            for (start, end), text in zip(spans, texts)]
@@ -0,0 +1,302 @@
+"""
+按内容寻址的本地缓存
+
+缓存目录为 $TRANSCRIPT_CACHE_DIR（默认 ~/.cache/transcript）。派生文件（例如
+解码后的16kHz单声道WAV）按"源文件内容指纹 + 生成参数"命名，源文件不变时
+直接复用，不必重新解码：
+
+    wav = get_or_create("wav", key, producer)
+
+源文件的内容指纹默认为抽样指纹（sampled_fingerprint）：文件大小、mtime加上
+头、尾和中间均匀分布的若干块数据的哈希，耗时与文件大小无关，10GB的录音也
+只需几毫秒。抽样读不到的中间部分被改写时mtime也会变化，不会误用旧结果；
+保留mtime的副本（cp -p、rsync -a）仍然命中缓存。设置
+TRANSCRIPT_FINGERPRINT=full 时改为对全文计算sha256，结果以 (路径, 大小, mtime)
+为键记在 fingerprints.json 中，同一个文件只在第一次（或被修改后）计算。
+
+解码后的WAV（decoded_fingerprint）对全部PCM数据计算sha256，用于跨文件比较
+内容（ASR结果、VAD时间线等），同样以 (设备, inode, 大小, mtime) 为键记录，
+从缓存硬链接出来的WAV不会重复计算。
+
+各命名空间的总大小超过 TRANSCRIPT_CACHE_GB（默认20GB）时，按最近使用时间
+淘汰最旧的文件。设置 TRANSCRIPT_CACHE=0 可以关闭缓存。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+FINGERPRINT_INDEX = "fingerprints.json"
+
+# 计算哈希时每次读取的块大小
+HASH_BLOCK = 4 * 1024 * 1024
+
+# 抽样指纹：抽取的块数（含头尾）和每块大小；不超过 SAMPLE_COUNT * SAMPLE_BLOCK
+# 的文件整体参与哈希
+SAMPLE_COUNT = 16
+SAMPLE_BLOCK = 64 * 1024
+
+DEFAULT_LIMIT_GB = 20
+
+_index_lock = threading.Lock()
+
+
+def cache_dir() -> Path:
+    return Path(os.environ.get("TRANSCRIPT_CACHE_DIR",
+                               Path.home() / ".cache" / "transcript"))
+
+
+def enabled() -> bool:
+    return os.environ.get("TRANSCRIPT_CACHE", "1") != "0"
+
+
+def _limit_bytes() -> int:
+    return int(float(os.environ.get("TRANSCRIPT_CACHE_GB", DEFAULT_LIMIT_GB)) * 1024 ** 3)
+
+
+def _load_index() -> dict:
+    try:
+        with open(cache_dir() / FINGERPRINT_INDEX, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index: dict):
+    path = cache_dir() / FINGERPRINT_INDEX
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ 无法保存指纹索引: {e}")
+
+
+def content_hash(path: Path) -> str:
+    """文件内容的sha256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sampled_fingerprint(path: Path, include_mtime: bool = True,
+                        count: int = SAMPLE_COUNT, block: int = SAMPLE_BLOCK) -> str:
+    """
+    抽样指纹：文件大小、mtime + 头、尾及中间均匀分布的count块数据的sha256
+
+    只读取 count * block 字节，耗时与文件大小无关。抽样之间的数据改变而大小
+    不变时只能靠mtime区分，因此默认包含mtime；include_mtime=False 只用于
+    比较抽样本身（例如测试和基准）。
+
+    Returns:
+        str: "s-" 开头的十六进制指纹，与全文哈希区分
+    """
+    path = Path(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        size = stat.st_size
+        digest.update(f"{size}".encode())
+        if include_mtime:
+            digest.update(f":{stat.st_mtime_ns}".encode())
+
+        if size <= count * block:
+            for data in iter(lambda: f.read(HASH_BLOCK), b""):
+                digest.update(data)
+        else:
+            # 第一块从0开始，最后一块紧贴文件末尾，其余均匀分布
+            step = (size - block) / (count - 1)
+            for i in range(count):
+                offset = int(i * step)
+                f.seek(offset)
+                digest.update(offset.to_bytes(8, "little"))
+                digest.update(f.read(block))
+    return f"s-{digest.hexdigest()}"
+
+
+def pcm_hash(wav_path: Path) -> str:
+    """16位PCM WAV的音频数据（不含WAV头）的sha256"""
+    from .audio import parse_wav_header
+
+    digest = hashlib.sha256()
+    with open(wav_path, "rb") as f:
+        sample_rate, channels, bits, offset, size = parse_wav_header(f)
+        digest.update(f"pcm:{sample_rate}:{channels}:{bits}:{size}".encode())
+        f.seek(offset)
+        remaining = size
+        while remaining > 0:
+            data = f.read(min(HASH_BLOCK, remaining))
+            if not data:
+                break
+            digest.update(data)
+            remaining -= len(data)
+    return digest.hexdigest()
+
+
+def decoded_fingerprint(wav_path: Path) -> str:
+    """
+    解码后音频（16位PCM WAV）的指纹：对全部PCM数据计算，与WAV头和源文件
+    的封装无关，重新封装但音频相同的文件得到相同的指纹
+
+    结果以 (设备, inode, 大小, mtime) 为键记录在指纹索引中，同一个文件（包括
+    它的硬链接）只在第一次或被修改后读取全文。
+    """
+    stat = Path(wav_path).stat()
+    key = f"pcm:{stat.st_dev}:{stat.st_ino}"
+
+    with _index_lock:
+        record = _load_index().get(key)
+    if record and record["size"] == stat.st_size and record["mtime"] == stat.st_mtime_ns:
+        return record["digest"]
+
+    digest = f"a-{pcm_hash(wav_path)}"
+    with _index_lock:
+        index = _load_index()
+        index[key] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "digest": digest}
+        _save_index(index)
+    return digest
+
+
+def combined_fingerprint(path: Path, decoded: Path = None) -> str:
+    """
+    媒体文件指纹，可选地加入解码后音频的指纹（例如作为转录结果的键，
+    确保解码参数或解码器变化时不会误用旧结果）
+    """
+    fingerprint = file_fingerprint(path)
+    if decoded is None:
+        return fingerprint
+    combined = hashlib.sha256(f"{fingerprint}:{decoded_fingerprint(decoded)}".encode())
+    return f"c-{combined.hexdigest()}"
+
+
+def file_fingerprint(path: Path) -> str:
+    """
+    返回流水线使用的文件内容指纹：默认为包含大小和mtime的抽样指纹（见
+    sampled_fingerprint），TRANSCRIPT_FINGERPRINT=full 时为全文sha256（文件
+    大小和修改时间不变时直接使用记录的结果）
+
+    Returns:
+        str: 十六进制指纹
+    """
+    if os.environ.get("TRANSCRIPT_FINGERPRINT", "sampled") != "full":
+        return sampled_fingerprint(path)
+
+    path = Path(path).resolve()
+    stat = path.stat()
+    key = str(path)
+
+    with _index_lock:
+        record = _load_index().get(key)
+    if record and record["size"] == stat.st_size and record["mtime"] == stat.st_mtime_ns:
+        return record["digest"]
+
+    digest = content_hash(path)
+    with _index_lock:
+        index = _load_index()
+        index[key] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "digest": digest}
+        _save_index(index)
+    return digest
+
+
+def entry_path(namespace: str, key: str, suffix: str = "") -> Path:
+    return cache_dir() / namespace / key[:2] / f"{key}{suffix}"
+
+
+def lookup(namespace: str, key: str, suffix: str = ""):
+    """返回缓存文件路径，不存在时返回None；命中时更新最近使用时间"""
+    path = entry_path(namespace, key, suffix)
+    if not path.is_file():
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return path
+
+
+def get_or_create(namespace: str, key: str, producer, suffix: str = ""):
+    """
+    返回缓存中的文件，不存在时调用 producer(临时路径) 生成后放入缓存
+
+    Args:
+        namespace: 缓存子目录，例如 "wav"
+        key: 缓存键（通常包含源文件指纹和生成参数）
+        producer: 把结果写到给定路径的函数
+        suffix: 文件扩展名
+
+    Returns:
+        tuple: (缓存文件路径, 是否命中)
+    """
+    path = lookup(namespace, key, suffix)
+    if path is not None:
+        return path, True
+
+    path = entry_path(namespace, key, suffix)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.tmp{suffix}")
+    try:
+        producer(tmp)
+        # 只读：硬链接出去的文件被就地改写时会报错，而不是悄悄损坏缓存
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+    prune(namespace, keep=path)
+    return path, False
+
+
+def place(cached: Path, target: Path):
+    """
+    把缓存文件放到目标位置：同一文件系统上用硬链接（不占额外空间），
+    否则复制
+    """
+    target = Path(target)
+    if target.exists() and target.samefile(cached):
+        return
+    if target.exists() or target.is_symlink():
+        target.unlink()
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(cached, target)
+    except OSError:
+        shutil.copyfile(cached, target)
+
+
+def prune(namespace: str, keep: Path = None):
+    """命名空间总大小超过上限时，按最近使用时间淘汰最旧的文件"""
+    limit = _limit_bytes()
+    if limit <= 0:
+        return
+
+    root = cache_dir() / namespace
+    files = []
+    for path in root.glob("*/*"):
+        if path.name.startswith("."):
+            continue
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= limit:
+            break
+        if keep is not None and path == keep:
+            continue
+        try:
+            path.unlink()
+            total -= size
+            print(f"🧹 缓存超过 {limit / 1024 ** 3:.0f}GB，删除 {path.name}")
+        except OSError:
+            pass
@@ -0,0 +1,354 @@
+"""
+长录音分块并行转录
+
+一个进程里的whisperx只能用上有限的几个核，数小时的录音仍然要按顺序一个
+窗口一个窗口地转录。这里把录音按 CHUNK_SECONDS（15分钟）左右切块，切分点
+选在VAD时间线的停顿处，每块前后各多取 CHUNK_OVERLAP 秒；各块由预加载的
+工作进程池（见 pool.run_prefork）同时转录，结果平移回原始时间线后拼接：
+
+- 每块只保留中点落在本块范围（不含重叠部分）内的片段
+- 重叠处两块都识别出的同一句话（文本相同且时间重叠）只保留一次
+
+    if should_chunk(duration):
+        segments = transcribe_chunked(asr, wav, prompt, parallel_workers(asr, duration))
+
+每块完成后立即把结果写入工作目录下的检查点（见 Checkpoint），转录中途
+崩溃或被中断后重新运行 `transcript gen`，已经完成的块直接读取，只转录剩下
+的块。只有一个进程时，只有预计转录耗时（时长 × 后端实测的实时率）超过
+CHECKPOINT_MIN_RUNTIME 时才为了检查点而分块（按顺序转录），较短的录音
+整段转录。
+
+每块的WAV在分派时才从整段WAV中截取（工作进程各自截取），转录完立即删除，
+磁盘上同时最多只有与进程数相同的几块，不会先把整段录音再复制一份。
+
+环境变量：
+- TRANSCRIPT_ASR_WORKERS  并行进程数；默认按CPU核数和可用内存
+- TRANSCRIPT_CHUNK_SECONDS 每块的目标时长（秒）
+- TRANSCRIPT_CHECKPOINT=1 单进程时总是分块保存检查点；=0 不保存检查点
+  （单进程时也不再分块）；默认按预计耗时决定
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+# 每块的目标时长（秒）
+CHUNK_SECONDS = 900
+
+# 每块前后多取的时长（秒），避免切分点附近的字词被截断
+CHUNK_OVERLAP = 2.0
+
+# 在目标切分点前后多少秒内寻找停顿
+CHUNK_SEARCH = 60
+
+# 每个工作进程至少分到的线程数，线程太少时单个进程的效率下降明显
+CHUNK_MIN_THREADS = 4
+
+# 每个工作进程的内存开销估计（int8的large-v2模型副本加转录批）
+CHUNK_WORKER_BYTES = 3 * 1024 ** 3
+
+# 单进程转录时，预计耗时（秒）至少这么长才为了检查点分块
+CHECKPOINT_MIN_RUNTIME = 1800
+
+# 后端还没有实测实时率时假定的值（CPU上的large-v2）
+CHECKPOINT_DEFAULT_RTF = 0.5
+
+# 检查点目录（位于WAV所在的工作目录中）
+CHECKPOINT_DIR = "checkpoints"
+
+# Chunk: 第index块，转录 [start, end) 秒的音频，只保留中点在 [keep_start, keep_end) 内的片段
+Chunk = namedtuple("Chunk", "index start end keep_start keep_end")
+
+
+def chunk_seconds() -> float:
+    return float(os.environ.get("TRANSCRIPT_CHUNK_SECONDS") or CHUNK_SECONDS)
+
+
+def checkpoint_mode() -> str:
+    """TRANSCRIPT_CHECKPOINT："1"、"0" 或 "auto"（默认）"""
+    return os.environ.get("TRANSCRIPT_CHECKPOINT") or "auto"
+
+
+def checkpoints_enabled(asr, duration: float) -> bool:
+    """
+    单进程转录这段录音时是否分块保存检查点：需要切成多块，并且（默认）
+    预计耗时超过 CHECKPOINT_MIN_RUNTIME
+    """
+    mode = checkpoint_mode()
+    if mode == "0" or not should_chunk(duration):
+        return False
+    if mode == "1":
+        return True
+    rtf = asr.realtime_factor() or CHECKPOINT_DEFAULT_RTF
+    return duration * rtf >= CHECKPOINT_MIN_RUNTIME
+
+
+def should_chunk(duration: float) -> bool:
+    """录音是否长到会被切成多块（与 plan_chunks 的判断相同）"""
+    return duration > chunk_seconds() * 1.5
+
+
+class Checkpoint:
+    """
+    一次分块转录的检查点：每块的片段保存为一个JSON文件
+
+    目录名由音频内容、转录设置（后端及其模型、计算类型、批大小等，以及
+    提示词，见 asr.settings_key）和分块方案共同决定，其中任何一项变化都
+    不会读到旧的结果。
+    """
+
+    def __init__(self, root: Path, key: dict):
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+        self.dir = Path(root) / digest
+        self.key = key
+
+    @classmethod
+    def for_chunks(cls, asr, wav: Path, prompt: str, chunks):
+        from .asr import settings_key
+        from .cache import decoded_fingerprint
+
+        wav = Path(wav)
+        key = {
+            "audio": decoded_fingerprint(wav),
+            "backend": asr.name,
+            "settings": settings_key(asr, prompt),
+            "chunks": [[round(c.start, 3), round(c.end, 3)] for c in chunks],
+        }
+        return cls(wav.parent / CHECKPOINT_DIR, key)
+
+    def path(self, index: int) -> Path:
+        return self.dir / f"chunk_{index:03d}.json"
+
+    def load(self, index: int):
+        """已完成的块的片段，没有时返回None"""
+        try:
+            with open(self.path(index), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def write(path: Path, segments):
+        """原子地写入一块的片段（先写临时文件再改名，崩溃时不会留下半个文件）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(segments, f, ensure_ascii=False, default=float)
+        os.replace(tmp, path)
+
+    def save(self, index: int, segments):
+        self.write(self.path(index), segments)
+
+    def start(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self.dir / "key.json", "w", encoding="utf-8") as f:
+            json.dump(self.key, f, ensure_ascii=False, indent=2)
+
+
+def discard_checkpoints(wav: Path):
+    """字幕保存后删除WAV所在工作目录中的全部检查点"""
+    shutil.rmtree(Path(wav).parent / CHECKPOINT_DIR, ignore_errors=True)
+
+
+def plan_chunks(duration: float, timeline=None, seconds: float = None,
+                overlap: float = CHUNK_OVERLAP, search: float = CHUNK_SEARCH):
+    """
+    把 [0, duration) 切成约seconds秒的块
+
+    Args:
+        timeline: VAD时间线，给出时切分点移到搜索范围内最近的停顿中点
+        seconds: 每块的目标时长，默认 chunk_seconds()
+
+    Returns:
+        list: [Chunk]
+    """
+    seconds = seconds or chunk_seconds()
+    cuts = [0.0]
+    # 最后一块不超过目标时长的1.5倍，避免切出很短的尾巴
+    while duration - cuts[-1] > seconds * 1.5:
+        target = cuts[-1] + seconds
+        cut = None
+        if timeline is not None:
+            cut = timeline.nearest_pause(target, search, lo=cuts[-1] + seconds / 2,
+                                         hi=duration - seconds / 2)
+        cuts.append(target if cut is None else cut)
+    cuts.append(float(duration))
+
+    return [
+        Chunk(i, max(0.0, keep_start - overlap), min(duration, keep_end + overlap),
+              keep_start, keep_end)
+        for i, (keep_start, keep_end) in enumerate(zip(cuts, cuts[1:]))
+    ]
+
+
+def parallel_workers(asr, duration: float) -> int:
+    """
+    转录这段录音应使用的并行进程数，返回1时不分块
+
+    Args:
+        asr: ASR后端（见 asr.ASRBackend.supports_parallel）
+        duration: 录音时长（秒）
+    """
+    from .hardware import RESERVED_BYTES, available_memory
+    from .threads import total_threads
+
+    if not should_chunk(duration):
+        return 1
+    chunks = round(duration / chunk_seconds())
+    # 工作进程池中的子进程不能再创建子进程（例如 gen -j）
+    if multiprocessing.current_process().daemon:
+        return 1
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return 1
+
+    env_workers = os.environ.get("TRANSCRIPT_ASR_WORKERS")
+    if env_workers:
+        workers = int(env_workers)
+    else:
+        workers = total_threads() // CHUNK_MIN_THREADS
+        memory = available_memory()
+        if memory:
+            workers = min(workers, (memory - RESERVED_BYTES) // CHUNK_WORKER_BYTES)
+    workers = max(1, min(int(workers), chunks))
+
+    if workers > 1 and not asr.supports_parallel():
+        return 1
+    return workers
+
+
+def _transcribe_chunk(job):
+    """
+    在工作进程中截取一块WAV、转录并写入检查点：job为
+    (后端名, 整段WAV, (开始秒, 结束秒), 块WAV路径, 提示词, 线程数, 检查点文件)
+    """
+    from .asr import get_backend
+
+    name, wav, span, path, prompt, threads, result = job
+    # 工作进程同时加载模型，不能依赖线程预算的实时份额
+    limit = os.environ.get("WHISPERX_THREADS")
+    os.environ["WHISPERX_THREADS"] = str(min(threads, int(limit)) if limit else threads)
+    with _chunk_wav(wav, path, span) as chunk_wav:
+        segments = get_backend(name).transcribe(chunk_wav, prompt)
+    Checkpoint.write(Path(result), segments)
+    return len(segments)
+
+
+@contextmanager
+def _chunk_wav(wav: Path, path: Path, span):
+    """从整段WAV（内存映射读取）中截取一块写到path，用完即删"""
+    from .audio import write_spans
+
+    path = Path(path)
+    write_spans(wav, path, [span])
+    try:
+        yield path
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def _normalize(text: str) -> str:
+    return "".join((text or "").split())
+
+
+def stitch(chunks, results):
+    """
+    把各块的片段平移回原始时间线并拼接，去掉重叠部分的重复片段
+
+    Args:
+        chunks: plan_chunks() 的结果
+        results: 每块的片段列表（时间相对于块的开头）
+
+    Returns:
+        list: 按时间排列的片段
+    """
+    from .transcript import _shift_times
+
+    segments = []
+    last = len(chunks) - 1
+    for chunk, chunk_segments in zip(chunks, results):
+        for segment in chunk_segments or []:
+            segment = _shift_times(segment, chunk.start)
+            middle = (segment["start"] + segment["end"]) / 2
+            if middle < chunk.keep_start or (middle >= chunk.keep_end and chunk.index < last):
+                continue
+            if (segments and _normalize(segment.get("text")) == _normalize(segments[-1].get("text"))
+                    and segment["start"] < segments[-1]["end"]):
+                continue
+            segments.append(segment)
+    segments.sort(key=lambda segment: segment["start"])
+    return segments
+
+
+def transcribe_chunked(asr, wav: Path, prompt: str, workers: int = 1, timeline=None):
+    """
+    分块转录16kHz单声道WAV，每块完成后写入检查点，已有检查点的块不再转录
+
+    Args:
+        asr: ASR后端
+        workers: 并行进程数（见 parallel_workers），为1时在当前进程中按顺序转录
+        timeline: VAD时间线，默认读取共享的时间线（见 vad）
+
+    Returns:
+        list: 原始时间线上的片段
+    """
+    from .asr import audio_duration
+    from .pool import run_prefork
+    from .threads import total_threads
+    from .vad import try_get_timeline
+
+    wav = Path(wav)
+    duration = audio_duration(wav)
+    if timeline is None:
+        timeline = try_get_timeline(wav)
+    chunks = plan_chunks(duration, timeline)
+
+    checkpoint = Checkpoint.for_chunks(asr, wav, prompt, chunks)
+    pending = [chunk for chunk in chunks if checkpoint.load(chunk.index) is None]
+    if len(pending) < len(chunks):
+        print(f"♻️  从检查点恢复 {len(chunks) - len(pending)}/{len(chunks)} 块: {checkpoint.dir}")
+    checkpoint.start()
+    workers = max(1, min(workers, len(pending)))
+
+    chunk_dir = wav.parent / f"{wav.stem}_chunks"
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    try:
+        threads = max(1, total_threads() // workers)
+        print(f"🧩 {duration:.0f}s 音频分为 {len(chunks)} 块，待转录 {len(pending)} 块"
+              + (f"，{workers} 个进程并行（每个 {threads} 线程）" if workers > 1 else ""))
+
+        # 块WAV在分派时才截取（见 _chunk_wav）
+        jobs = [(asr.name, str(wav), (chunk.start, chunk.end),
+                 str(chunk_dir / f"chunk_{chunk.index:03d}.wav"), prompt, threads,
+                 str(checkpoint.path(chunk.index)))
+                for chunk in pending]
+
+        if workers > 1:
+            preload = ("asr",) if asr.name == "whisperx" else ()
+            results = run_prefork(_transcribe_chunk, jobs, workers, preload=preload)
+            failed = [item for item in results if item["error"]]
+            if failed:
+                raise RuntimeError(f"{len(failed)} 个分块转录失败（已完成的块保存在检查点中）: "
+                                   f"{failed[0]['error']}")
+        else:
+            for i, (chunk, job) in enumerate(zip(pending, jobs), 1):
+                print(f"🧩 转录第 {chunk.index + 1}/{len(chunks)} 块: "
+                      f"{chunk.start:.0f}s - {chunk.end:.0f}s（剩余 {len(pending) - i} 块）")
+                with _chunk_wav(wav, job[3], job[2]) as chunk_wav:
+                    checkpoint.save(chunk.index, asr.run(chunk_wav, prompt))
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - started
+
+    segments = stitch(chunks, [checkpoint.load(chunk.index) for chunk in chunks])
+    if workers > 1 and duration:
+        print(f"⏱️  {asr.name} 分块并行实时率 {elapsed / duration:.3f}"
+              f"（{elapsed:.0f}s / {duration:.0f}s 音频）")
+    return segments
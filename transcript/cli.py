@@ -49,8 +49,11 @@ def create_parser():
 示例:
   transcript auto video.mp4                  # 自动处理（无需手动编辑）
   transcript gen video.mp4                   # 生成字幕
+  transcript gen a.mp4 b.mp4 -j 2            # 多个文件并行生成（共享模型内存）
   transcript resume                          # 编辑字幕后继续处理
   transcript status                          # 查看状态
+  transcript daemon                          # 常驻模型，加速gen/resume
+  transcript models preload                  # 预下载并校验模型文件
         """
     )
 
@@ -71,8 +74,13 @@ def create_parser():
         'gen',
         help='生成字幕文件'
     )
-    gen_parser.add_argument('video', help='输入视频或音频文件路径')
+    gen_parser.add_argument('videos', nargs='+', metavar='video', help='输入视频或音频文件路径（可多个）')
     gen_parser.add_argument('-o', '--output', help='输出目录（默认：项目根目录）')
+    gen_parser.add_argument('-j', '--workers', type=int,
+                            help='并行处理多个文件时的工作进程数（共享预加载的说话人模型；'
+                                 'whisper转录模型每个进程各自加载一份）')
+    gen_parser.add_argument('--skip-silence', type=float, metavar='SECONDS',
+                            help='跳过长于此时长的静音后再转录（时间戳保持不变）')
 
     # 3. resume - 编辑字幕后继续处理
     resume_parser = subparsers.add_parser(
@@ -89,6 +97,28 @@ def create_parser():
         help='查看当前处理状态'
     )
 
+    # 5. daemon - 常驻模型守护进程
+    daemon_parser = subparsers.add_parser(
+        'daemon',
+        help='启动/停止常驻模型守护进程（gen/resume会自动使用）'
+    )
+    daemon_parser.add_argument('action', nargs='?', default='start',
+                               choices=['start', 'stop', 'status'],
+                               help='start: 前台运行；stop: 停止；status: 查看状态')
+    daemon_parser.add_argument('--no-preload', action='store_true',
+                               help='启动时不预加载模型，首次请求时再加载')
+
+    # 6. models - 模型文件管理
+    models_parser = subparsers.add_parser(
+        'models',
+        help='查看、预下载和校验模型文件'
+    )
+    models_parser.add_argument('action', nargs='?', default='list',
+                               choices=['list', 'preload', 'verify'],
+                               help='list: 查看本地模型；preload: 下载、校验并预热；verify: 校验文件')
+    models_parser.add_argument('kinds', nargs='*',
+                               help='只处理指定模型：whisper/align/speaker（默认全部）')
+
     return parser
 
 
@@ -191,12 +221,30 @@ def cmd_gen(args):
         from .transcript import transcript
 
         print_banner()
-        print_info(f"开始生成转录文件: {args.video}")
+        print_info(f"开始生成转录文件: {', '.join(args.videos)}")
         print_info("🎭 自动启用说话人分离功能")
 
-        video = validate_video_file(args.video)
+        videos = [validate_video_file(video) for video in args.videos]
         output_dir = Path(args.output) if args.output else None
 
+        if args.skip_silence:
+            # 通过环境变量传递，工作进程池中的子进程同样生效
+            os.environ["TRANSCRIPT_SKIP_SILENCE"] = str(args.skip_silence)
+            print_info(f"⏩ 跳过长于 {args.skip_silence:g}s 的静音")
+
+        if len(videos) > 1:
+            from .pool import transcribe_files
+
+            results = transcribe_files(videos, output_dir, workers=args.workers)
+            failed = [item for item in results if item["error"]]
+            if failed:
+                raise RuntimeError(f"{len(failed)}/{len(results)} 个文件处理失败")
+            print_success(f"{len(results)} 个文件的转录文件生成完成!")
+            print_info("下一步: 编辑SRT字幕文件，然后运行 'transcript resume' 继续处理")
+            return
+
+        video = videos[0]
+
         # 现在transcript函数返回两个文件
         srt_file, speaker_txt = transcript(video, output_dir, enable_diarization=True)
 
@@ -273,6 +321,69 @@ def cmd_status(args):
         sys.exit(1)
 
 
+def cmd_daemon(args):
+    """常驻模型守护进程命令"""
+    try:
+        from . import daemon
+
+        if args.action == 'stop':
+            if daemon.stop():
+                print_success("已通知守护进程退出")
+            else:
+                print_info("守护进程未运行")
+            return
+
+        if args.action == 'status':
+            if daemon.is_running():
+                print_success(f"守护进程运行中: {daemon.socket_path()}")
+            else:
+                print_info("守护进程未运行")
+            return
+
+        print_banner()
+        print_info("启动常驻模型守护进程，按 Ctrl-C 停止")
+        daemon.serve(preload=not args.no_preload)
+
+    except Exception as e:
+        print_error(f"守护进程出错: {e}")
+        sys.exit(1)
+
+
+def cmd_models(args):
+    """模型文件管理命令"""
+    try:
+        from . import resolver
+
+        kinds = args.kinds or list(resolver.MODEL_SPECS)
+        unknown = [kind for kind in kinds if kind not in resolver.MODEL_SPECS]
+        if unknown:
+            raise ValueError(f"未知模型: {', '.join(unknown)}")
+
+        if args.action == 'list':
+            for kind in kinds:
+                repo_id, snapshot = resolver.status()[kind]
+                if snapshot:
+                    print_success(f"{kind}: {repo_id} -> {snapshot}")
+                else:
+                    print_warning(f"{kind}: {repo_id} 未找到本地文件")
+            return
+
+        if args.action == 'preload':
+            ok = resolver.preload(kinds)
+        else:
+            ok = all([resolver.verify(kind) for kind in kinds])
+
+        if ok:
+            print_success("模型文件就绪")
+        else:
+            print_error("部分模型文件缺失或校验失败")
+            sys.exit(1)
+
+    except Exception as e:
+        print_error(f"模型管理失败: {e}")
+        sys.exit(1)
+
+
 def main():
     """主入口函数"""
     parser = create_parser()
@@ -290,6 +401,8 @@ def main():
         'gen': cmd_gen,
         'resume': cmd_resume,
         'status': cmd_status,
+        'daemon': cmd_daemon,
+        'models': cmd_models,
     }
     
     if args.command in command_map:
@@ -0,0 +1,232 @@
+"""
+常驻模型守护进程
+
+`transcript daemon` 启动后将whisperx转录模型、SpeechBrain说话人模型和
+wav2vec2对齐模型常驻内存，通过本地Unix socket处理 transcribe/diarize/align
+请求。`transcript gen` / `transcript resume` 在守护进程运行时自动使用它，
+否则回退到进程内加载模型。
+
+协议：每个连接发送一行JSON请求 {"op": ..., ...}，返回一行JSON响应
+{"ok": true, "result": ...} 或 {"ok": false, "error": ...}。音频以文件路径
+传递，守护进程与CLI共享同一文件系统。
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+from pathlib import Path
+
+# 默认socket路径，可通过环境变量覆盖
+DEFAULT_SOCKET = "/tmp/transcript/daemon.sock"
+
+# 连接守护进程的超时时间（秒）；请求本身可能持续很久，不设超时
+CONNECT_TIMEOUT = 1.0
+
+
+def socket_path() -> Path:
+    """返回守护进程的socket路径"""
+    return Path(os.environ.get("TRANSCRIPT_DAEMON_SOCKET", DEFAULT_SOCKET))
+
+
+def _json_default(obj):
+    """将numpy标量/数组等转换为可JSON序列化的对象"""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "item"):
+        return obj.item()
+    if isinstance(obj, Path):
+        return str(obj)
+    raise TypeError(f"无法序列化的类型: {type(obj)}")
+
+
+def _send(sock_file, payload: dict):
+    data = json.dumps(payload, ensure_ascii=False, default=_json_default)
+    sock_file.write((data + "\n").encode("utf-8"))
+    sock_file.flush()
+
+
+def _call(op: str, **params):
+    """向守护进程发送请求，守护进程未运行时抛出OSError"""
+    path = socket_path()
+    if not path.exists():
+        raise FileNotFoundError(f"守护进程socket不存在: {path}")
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(str(path))
+        sock.settimeout(None)
+        with sock.makefile("rwb") as sock_file:
+            _send(sock_file, {"op": op, **params})
+            line = sock_file.readline()
+
+    if not line:
+        raise ConnectionError("守护进程未返回结果")
+    return json.loads(line)
+
+
+def is_running() -> bool:
+    """检查守护进程是否在运行"""
+    try:
+        return _call("ping").get("ok", False)
+    except (OSError, ValueError):
+        return False
+
+
+def request(op: str, **params):
+    """
+    请求守护进程执行操作
+
+    Returns:
+        操作结果；守护进程未运行或执行失败时返回None，由调用方回退到进程内执行
+    """
+    try:
+        response = _call(op, **params)
+    except (OSError, ValueError):
+        return None
+
+    if not response.get("ok"):
+        print(f"⚠️ 守护进程执行 {op} 失败: {response.get('error')}")
+        print("回退到进程内执行...")
+        return None
+
+    print(f"⚡ 已通过常驻模型守护进程完成 {op}")
+    return response.get("result")
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """处理单个请求：读取一行JSON，执行并返回一行JSON"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        try:
+            req = json.loads(line)
+            op = req.pop("op")
+            result = self.server.dispatch(op, req)
+            response = {"ok": True, "result": result}
+        except Exception as e:
+            print(f"❌ 处理请求失败: {e}")
+            response = {"ok": False, "error": str(e)}
+
+        _send(self.wfile, response)
+
+
+class ModelDaemon(socketserver.UnixStreamServer):
+    """
+    常驻模型服务
+
+    请求按顺序串行处理：模型本身不是线程安全的，串行也避免了多个任务
+    同时争抢CPU。
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            # 上次异常退出留下的socket文件
+            path.unlink()
+        super().__init__(str(path), DaemonHandler)
+        os.chmod(path, 0o600)
+        self.path = path
+
+    def model(self, kind: str, prompt: str = None):
+        """
+        返回常驻模型，首次使用时加载
+
+        模型由进程级的模型注册表持有，守护进程存活期间一直常驻（除非超出
+        TRANSCRIPT_MODEL_RAM_GB 预算被淘汰）。
+        """
+        from . import transcript as core
+
+        if kind == "asr":
+            return core.load_whisperx_model(prompt)
+        if kind == "speaker":
+            return core.load_speaker_model()
+        if kind == "align":
+            return core.load_align_model()
+        raise ValueError(f"未知模型类型: {kind}")
+
+    def preload(self):
+        """预先加载全部模型"""
+        from . import transcript as core
+
+        for kind, prompt in (("asr", core.prompt), ("speaker", None), ("align", None)):
+            try:
+                self.model(kind, prompt)
+            except Exception as e:
+                print(f"⚠️ 预加载{kind}模型失败: {e}")
+
+    def dispatch(self, op: str, params: dict):
+        from . import transcript as core
+
+        if op == "ping":
+            from .models import get_registry
+
+            return {"pid": os.getpid(), "models": get_registry().stats()}
+
+        if op == "shutdown":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return None
+
+        if op == "transcribe":
+            prompt = params.get("prompt", core.prompt)
+            segments, _ = core.whisperx_transcribe(
+                Path(params["audio"]), prompt, model=self.model("asr", prompt)
+            )
+            return segments
+
+        if op == "diarize":
+            from .audio import load_pcm
+
+            audio_path = Path(params["audio"])
+            audio = load_pcm(audio_path)
+            subs = core.speechbrain_speaker_diarization(
+                params["segments"], audio, audio_path,
+                verification=self.model("speaker")
+            )
+            return [{"start": e.start, "end": e.end, "text": e.text} for e in subs.events]
+
+        if op == "align":
+            return core.align_segments(
+                params["segments"], Path(params["audio"]),
+                align_model=self.model("align")
+            )
+
+        raise ValueError(f"未知操作: {op}")
+
+    def server_close(self):
+        super().server_close()
+        if self.path.exists():
+            self.path.unlink()
+
+
+def serve(preload: bool = True):
+    """在前台运行守护进程，直到收到shutdown请求或Ctrl-C"""
+    path = socket_path()
+    if is_running():
+        raise RuntimeError(f"守护进程已在运行: {path}")
+
+    server = ModelDaemon(path)
+    try:
+        if preload:
+            print("预加载模型...")
+            server.preload()
+        print(f"🚀 模型守护进程已启动: {path} (pid={os.getpid()})")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n收到中断信号，停止守护进程")
+    finally:
+        server.server_close()
+        print("守护进程已停止")
+
+
+def stop() -> bool:
+    """请求守护进程退出，返回是否成功发送"""
+    try:
+        _call("shutdown")
+        return True
+    except (OSError, ValueError):
+        return False
@@ -0,0 +1,129 @@
+"""
+按VAD时间线跳过长静音的转录
+
+讲座和播客录音里常有几分钟的准备、休息等无人说话的片段，照样送进
+large-v2 白白消耗时间。开启后（TRANSCRIPT_SKIP_SILENCE=秒数，或
+`transcript gen --skip-silence 秒数`），长于该时长的非语音区间被去掉，两侧
+各保留 SKIP_MARGIN 秒，剩余的语音拼接成一个较短的WAV送去转录，转录结果的
+时间戳再映射回原始时间线：
+
+    speech_map = SpeechMap.from_timeline(timeline, min_gap=5)
+    speech_map.compact(wav, compact_wav)
+    segments = speech_map.remap_segments(asr(compact_wav))
+"""
+
+import bisect
+import os
+from pathlib import Path
+
+# 被跳过的静音两侧各保留的时长（秒），避免切掉字词的起止
+SKIP_MARGIN = 0.25
+
+
+def skip_silence_threshold(value=None):
+    """
+    跳过静音的最小时长（秒）；value为None时读取 TRANSCRIPT_SKIP_SILENCE，
+    未设置或不大于0时返回None（不跳过）
+    """
+    if value is None:
+        value = os.environ.get("TRANSCRIPT_SKIP_SILENCE")
+    if value in (None, ""):
+        return None
+    value = float(value)
+    return value if value > 0 else None
+
+
+class SpeechMap:
+    """
+    保留的原始时间区间 [(start, end)]（秒），以及它们在拼接后音频中的位置
+    """
+
+    def __init__(self, spans, duration: float):
+        self.spans = [(float(s), float(e)) for s, e in spans if e > s]
+        self.duration = float(duration)
+        self.offsets = []
+        position = 0.0
+        for start, end in self.spans:
+            self.offsets.append(position)
+            position += end - start
+        self.compact_duration = position
+
+    @classmethod
+    def from_timeline(cls, timeline, min_gap: float, margin: float = SKIP_MARGIN):
+        """
+        去掉长于min_gap的非语音区间（两侧各保留margin秒）
+
+        Args:
+            timeline: vad.VADTimeline
+        """
+        spans = []
+        cursor = 0.0
+        for start, end in timeline.pauses(0.0, timeline.duration):
+            if end - start < min_gap:
+                continue
+            cut_start = start + margin if start > 0 else 0.0
+            cut_end = end - margin if end < timeline.duration else timeline.duration
+            if cut_end <= cut_start:
+                continue
+            spans.append((cursor, cut_start))
+            cursor = cut_end
+        spans.append((cursor, timeline.duration))
+        return cls(spans, timeline.duration)
+
+    @property
+    def skipped(self) -> float:
+        """跳过的时长（秒）"""
+        return self.duration - self.compact_duration
+
+    def _span_index(self, t: float, end: bool = False) -> int:
+        """
+        t 所在的保留区间；区间交界处，起点属于后一个区间，终点属于前一个
+        """
+        find = bisect.bisect_left if end else bisect.bisect_right
+        return max(0, find(self.offsets, t) - 1)
+
+    def to_original(self, t: float, end: bool = False) -> float:
+        """拼接后音频中的时间 -> 原始时间；end=True 时按终点处理交界"""
+        if not self.spans:
+            return t
+        i = self._span_index(t, end)
+        start, stop = self.spans[i]
+        return min(start + (t - self.offsets[i]), stop)
+
+    def _remap(self, item: dict):
+        """
+        映射一个片段或词的起止：终点限制在起点所在区间的末尾，跨过交界的
+        片段不会在被跳过的静音期间一直显示
+        """
+        if not self.spans:
+            return
+        first = None
+        if "start" in item:
+            first = self._span_index(item["start"])
+            item["start"] = self.to_original(item["start"])
+        if "end" in item:
+            end = self.to_original(item["end"], end=True)
+            if first is not None:
+                end = min(end, self.spans[first][1])
+            item["end"] = end
+
+    def remap_segments(self, segments):
+        """把片段（及其中的词）的时间戳映射回原始时间线，原地修改并返回"""
+        for segment in segments:
+            self._remap(segment)
+            for word in segment.get("words") or []:
+                self._remap(word)
+        return segments
+
+    def compact(self, wav: Path, output: Path):
+        """把保留的区间从16kHz单声道WAV中拼接写出"""
+        from .audio import write_spans
+
+        return write_spans(wav, output, self.spans)
+
+    def report(self):
+        if self.duration <= 0:
+            return
+        print(f"⏩ 跳过 {self.skipped:.0f}s 静音（{self.skipped / self.duration:.0%}），"
+              f"实际转录 {self.compact_duration:.0f}s / {self.duration:.0f}s，"
+              f"共去掉 {len(self.spans) - 1} 段")
@@ -0,0 +1,410 @@
+"""
+Linux服务器的硬件探测与ASR参数自动调优
+
+detect_optimal_device_config() 原来只针对Apple M1-M4做了调优，其它系统一律
+使用固定的 int8 / batch_size=8。这里在Linux上：
+
+1. 读取 /proc/cpuinfo 与 /proc/meminfo：物理/逻辑核数、SIMD指令集
+   （AVX2、AVX-512、VNNI）和可用内存
+2. 根据硬件给出候选的计算类型、线程数和批大小（按校准时的可用内存裁剪，
+   放不下模型的候选直接跳过）
+3. 用合成音频对每组候选参数跑一次批量转录（编码 + 固定 CALIBRATION_TOKENS
+   个token的贪心解码，与whisperx的批量推理相同），按每秒处理的音频秒数选出
+   最快的一组；每组测完立即释放模型，内存中同时只有一个模型
+4. 结果按硬件指纹缓存到 $TRANSCRIPT_CACHE_DIR/hardware.json
+   （默认 ~/.cache/transcript），硬件、CTranslate2版本或模型不变时直接复用
+
+环境变量：
+- TRANSCRIPT_CALIBRATE=0   只用启发式规则，不做实测校准
+- TRANSCRIPT_RECALIBRATE=1 忽略缓存重新校准
+"""
+
+import json
+import os
+import platform
+import time
+from pathlib import Path
+
+from .cache import cache_dir
+
+PROFILE_NAME = "hardware.json"
+
+# 档案格式变化时递增，旧档案自动失效
+PROFILE_VERSION = 2
+
+SAMPLE_RATE = 16000
+
+# whisper按30秒一个窗口编码
+WINDOW_SECONDS = 30
+
+# 批中每个30秒窗口在编码/解码时额外占用的内存（large-v2，经验值）
+BATCH_ITEM_BYTES = 256 * 1024 ** 2
+
+# 为系统和其它进程保留的内存
+RESERVED_BYTES = 2 * 1024 ** 3
+
+# 模型文件按float16存储，加载为各计算类型后相对文件大小的倍数
+COMPUTE_TYPE_SCALE = {"int8": 0.5, "int8_float32": 0.5, "int16": 1.0, "float32": 2.0}
+
+# 找不到模型文件时假定的 model.bin 大小（large-v2）
+DEFAULT_MODEL_FILE_BYTES = 3 * 1024 ** 3
+
+BATCH_CANDIDATES = (4, 8, 16, 32)
+
+# 单次校准允许的总耗时（秒），超出后不再尝试更大的批
+CALIBRATION_BUDGET = 180
+
+# 校准时每个窗口解码的token数（约为10秒中文语音的长度）
+CALIBRATION_TOKENS = 48
+
+
+def parse_cpuinfo(text: str) -> dict:
+    """
+    解析 /proc/cpuinfo 内容
+
+    Returns:
+        dict: model, logical, physical, avx2, avx512, vnni
+    """
+    flags = set()
+    model = ""
+    logical = 0
+    cores = set()
+
+    for block in text.strip().split("\n\n"):
+        fields = {}
+        for line in block.splitlines():
+            key, sep, value = line.partition(":")
+            if sep:
+                fields[key.strip()] = value.strip()
+        if "processor" not in fields:
+            continue
+        logical += 1
+        model = model or fields.get("model name", "")
+        flags.update(fields.get("flags", "").split())
+        cores.add((fields.get("physical id", "0"), fields.get("core id", str(logical))))
+
+    return {
+        "model": model,
+        "logical": logical,
+        "physical": len(cores) or logical,
+        "avx2": "avx2" in flags,
+        "avx512": "avx512f" in flags,
+        "vnni": bool(flags & {"avx512_vnni", "avx_vnni"}),
+    }
+
+
+def parse_meminfo(text: str) -> dict:
+    """解析 /proc/meminfo，返回 total、available（字节）"""
+    values = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        parts = value.split()
+        if parts and parts[0].isdigit():
+            values[key] = int(parts[0]) * 1024
+    return {
+        "total": values.get("MemTotal", 0),
+        "available": values.get("MemAvailable", values.get("MemFree", 0)),
+    }
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def hardware_info() -> dict:
+    """探测本机CPU与内存"""
+    info = parse_cpuinfo(_read("/proc/cpuinfo"))
+    try:
+        # 受cgroup/taskset限制时以可用CPU为准
+        usable = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        usable = os.cpu_count() or 1
+    if not info["logical"]:
+        info["logical"] = info["physical"] = usable
+    elif usable < info["logical"]:
+        ratio = info["logical"] // max(info["physical"], 1)
+        info["logical"] = usable
+        info["physical"] = max(1, usable // max(ratio, 1))
+
+    info.update(parse_meminfo(_read("/proc/meminfo")))
+    info["machine"] = platform.machine()
+    return info
+
+
+def available_memory() -> int:
+    """当前可用内存（字节），无法获取时返回0"""
+    return parse_meminfo(_read("/proc/meminfo"))["available"]
+
+
+def batch_size_for_memory(max_batch: int, available: int = None) -> int:
+    """
+    按当前可用内存给出转录批大小（模型已加载，只计算批本身的开销）
+
+    Args:
+        max_batch: 上限（WHISPERX_BATCH_SIZE）
+        available: 可用内存，默认实时读取；无法获取时直接返回上限
+    """
+    if available is None:
+        available = available_memory()
+    if not available:
+        return max_batch
+    fits = (available - RESERVED_BYTES) // BATCH_ITEM_BYTES
+    return int(max(1, min(max_batch, fits)))
+
+
+def _model_file_bytes(snapshot) -> int:
+    try:
+        return (Path(snapshot) / "model.bin").stat().st_size
+    except (OSError, TypeError):
+        return DEFAULT_MODEL_FILE_BYTES
+
+
+def candidate_configs(info: dict, model_bytes: int = DEFAULT_MODEL_FILE_BYTES):
+    """
+    根据硬件列出候选的 (compute_type, threads, batch_sizes)
+
+    - 有AVX2时int8内核明显快于float32，只校准int8；没有AVX2时int8反而可能
+      更慢，两种都试
+    - 线程数取物理核数，开启超线程时再试逻辑核数
+    - 批大小按可用内存扣除模型大小后能容纳的窗口数裁剪；int8以外的类型
+      至少要能容纳最小的候选批，任何类型连一个窗口都放不下时跳过
+    """
+    compute_types = ["int8"] if info.get("avx2") else ["int8", "float32"]
+
+    threads = [info["physical"]]
+    if info["logical"] > info["physical"]:
+        threads.append(info["logical"])
+
+    available = info.get("available") or 0
+    configs = []
+    for compute_type in compute_types:
+        model_ram = int(model_bytes * COMPUTE_TYPE_SCALE[compute_type])
+        spare = available - model_ram - RESERVED_BYTES
+        minimum = BATCH_ITEM_BYTES if compute_type == "int8" else BATCH_CANDIDATES[0] * BATCH_ITEM_BYTES
+        if available and spare < minimum:
+            continue
+        max_batch = max(1, spare // BATCH_ITEM_BYTES) if available else BATCH_CANDIDATES[1]
+        batches = [b for b in BATCH_CANDIDATES if b <= max_batch] or [min(max_batch, BATCH_CANDIDATES[0])]
+        for n in threads:
+            configs.append((compute_type, n, batches))
+    return configs
+
+
+def heuristic_profile(info: dict, model_bytes: int = DEFAULT_MODEL_FILE_BYTES) -> dict:
+    """
+    不做实测时的默认选择：第一组候选、物理核数、能容纳的最大批（不超过16）；
+    内存放不下任何候选时退回int8、batch_size=1
+    """
+    configs = candidate_configs(info, model_bytes)
+    compute_type, threads, batches = configs[0] if configs else ("int8", info["physical"], [1])
+    batch = max([b for b in batches if b <= 16] or batches[:1])
+    return {
+        "device": "cpu",
+        "compute_type": compute_type,
+        "threads": threads,
+        "batch_size": batch,
+        "calibrated": False,
+    }
+
+
+def synthetic_audio(seconds: float = WINDOW_SECONDS):
+    """生成类语音的合成音频：变化基频的谐波 + 音节包络 + 少量噪声"""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = 150 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t))
+    audio = 0.1 * voice * envelope + 0.01 * rng.standard_normal(len(t))
+    return audio.astype(np.float32)
+
+
+def _decode_batch(model, tokenizer, features, batch: int):
+    """
+    编码batch个相同的窗口后贪心解码固定数量的token（屏蔽结束符，合成音频
+    不会提前结束）
+    """
+    import numpy as np
+
+    prompt = list(tokenizer.sot_sequence) + [tokenizer.no_timestamps]
+    batch_features = np.ascontiguousarray(np.repeat(features[np.newaxis], batch, axis=0))
+    encoded = model.encode(batch_features)
+    model.model.generate(encoded, [prompt] * batch, beam_size=1,
+                         max_length=len(prompt) + CALIBRATION_TOKENS,
+                         suppress_tokens=[tokenizer.eot], suppress_blank=False)
+
+
+def calibrate(info: dict, snapshot, budget: float = CALIBRATION_BUDGET) -> dict:
+    """
+    实测每组候选参数的批量转录吞吐量，返回最快的档案
+
+    计算类型和线程数在加载时固定，每组候选都要重新加载模型；加载耗时同样
+    计入budget，预计超出时不再加载下一组。
+
+    Args:
+        info: hardware_info() 的结果；候选按校准开始时的可用内存重新裁剪
+        snapshot: faster-whisper模型目录
+        budget: 总耗时上限（秒）
+
+    Returns:
+        dict: 档案；包含 trials（每次测量的结果）
+    """
+    import gc
+
+    from faster_whisper import WhisperModel
+    from faster_whisper.tokenizer import Tokenizer
+
+    start = time.time()
+    features = None
+    trials = []
+    load_seconds = 0.0
+
+    info = dict(info, available=available_memory() or info.get("available", 0))
+    for compute_type, threads, batches in candidate_configs(info, _model_file_bytes(snapshot)):
+        if trials and time.time() - start + load_seconds > budget:
+            print(f"⏱️  校准已用 {time.time() - start:.0f}s，跳过其余候选")
+            break
+
+        tick = time.time()
+        try:
+            model = WhisperModel(str(snapshot), device="cpu", compute_type=compute_type,
+                                 cpu_threads=threads, local_files_only=True)
+        except Exception as e:
+            print(f"⚠️ 校准跳过 {compute_type}/{threads}线程: {e}")
+            continue
+        load_seconds = time.time() - tick
+
+        try:
+            if features is None:
+                mel = model.feature_extractor(synthetic_audio())
+                features = mel[:, :model.feature_extractor.nb_max_frames]
+            tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual,
+                                  task="transcribe", language="zh")
+
+            # 预热一次，排除首次运行的内存分配开销
+            _decode_batch(model, tokenizer, features, 1)
+
+            for batch in batches:
+                if trials and time.time() - start > budget:
+                    break
+                tick = time.perf_counter()
+                _decode_batch(model, tokenizer, features, batch)
+                elapsed = time.perf_counter() - tick
+                speed = batch * WINDOW_SECONDS / elapsed
+                trials.append({"compute_type": compute_type, "threads": threads,
+                               "batch_size": batch, "speed": round(speed, 2)})
+                print(f"⏱️  {compute_type} {threads}线程 batch={batch}: "
+                      f"{speed:.1f} 秒音频/秒")
+        except Exception as e:
+            print(f"⚠️ 校准 {compute_type}/{threads}线程 失败: {e}")
+        finally:
+            # 加载下一组之前释放，避免两个模型同时占用内存
+            model = tokenizer = None
+            gc.collect()
+
+    if not trials:
+        raise RuntimeError("没有可用的校准结果")
+
+    # 吞吐量相差5%以内时选占用更少的（批更小、线程更少）
+    best_speed = max(trial["speed"] for trial in trials)
+    best = min((t for t in trials if t["speed"] >= best_speed * 0.95),
+               key=lambda t: (t["batch_size"], t["threads"]))
+    return {
+        "device": "cpu",
+        "compute_type": best["compute_type"],
+        "threads": best["threads"],
+        "batch_size": best["batch_size"],
+        "calibrated": True,
+        "trials": trials,
+    }
+
+
+def fingerprint(info: dict, snapshot=None) -> dict:
+    """硬件指纹：任一项变化都需要重新校准"""
+    try:
+        from importlib.metadata import version
+
+        ct2_version = version("ctranslate2")
+    except Exception:
+        ct2_version = ""
+    return {
+        "version": PROFILE_VERSION,
+        "model": info.get("model", ""),
+        "machine": info.get("machine", ""),
+        "logical": info.get("logical", 0),
+        "physical": info.get("physical", 0),
+        "simd": [name for name in ("avx2", "avx512", "vnni") if info.get(name)],
+        "memory_gb": round(info.get("total", 0) / 1024 ** 3),
+        "ctranslate2": ct2_version,
+        "whisper": Path(snapshot).name if snapshot else "",
+    }
+
+
+def load_profile(expected: dict):
+    """读取缓存的档案，指纹不一致时返回None"""
+    try:
+        with open(cache_dir() / PROFILE_NAME, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("fingerprint") != expected:
+        return None
+    return data.get("profile")
+
+
+def save_profile(profile: dict, fp: dict):
+    path = cache_dir() / PROFILE_NAME
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fp, "profile": profile}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ 无法保存硬件档案: {e}")
+
+
+def tune() -> dict:
+    """
+    返回本机的ASR参数档案（优先使用缓存）
+
+    Returns:
+        dict: device, compute_type, threads, batch_size, calibrated
+    """
+    from .resolver import resolve
+
+    info = hardware_info()
+    snapshot = resolve("whisper")
+    fp = fingerprint(info, snapshot)
+
+    if os.environ.get("TRANSCRIPT_RECALIBRATE", "0") != "1":
+        profile = load_profile(fp)
+        if profile is not None:
+            return profile
+
+    simd = "/".join(fingerprint(info)["simd"]) or "无"
+    print(f"🔍 硬件: {info['model'] or info['machine']}，{info['physical']}核/{info['logical']}线程，"
+          f"SIMD: {simd}，可用内存 {info['available'] / 1024 ** 3:.1f}GB")
+
+    profile = heuristic_profile(info, _model_file_bytes(snapshot))
+    if snapshot is None or os.environ.get("TRANSCRIPT_CALIBRATE", "1") == "0":
+        # 没有模型文件时无法校准；不缓存，等模型就绪后再校准
+        return profile
+
+    print("⏱️  首次运行，使用合成音频校准转录参数...")
+    try:
+        profile = calibrate(info, snapshot)
+    except Exception as e:
+        print(f"⚠️ 校准失败，使用默认参数: {e}")
+        return profile
+
+    save_profile(profile, fp)
+    print(f"✅ 校准完成: {profile['compute_type']}，{profile['threads']}线程，"
+          f"batch_size={profile['batch_size']}（已缓存）")
+    return profile
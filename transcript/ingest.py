@@ -0,0 +1,326 @@
+"""
+一次解码、多种产物的媒体导入阶段
+
+以前同一个媒体文件在各个阶段被反复打开：转换16kHz WAV解码一次，
+get_audio_info、probe_duration、adjust_subtitles_offset 各自调用ffprobe，
+对齐前又为同一个视频再解码一次WAV。这里在一次解码的过程中同时产出后续
+阶段需要的全部数据，写入任务工作目录下的 ingest/<文件名>/：
+
+- audio.wav      16kHz单声道16位PCM（从WAV缓存硬链接）
+- envelope.npy   每0.1秒一帧的平均能量（与 asr_windows 的分帧相同）
+- keyframes.json 视频关键帧时间戳（秒）
+- metadata.json  时长、封装格式和各个流的信息，以及源文件的大小和mtime
+
+关键帧和封装信息由只解封装、不解码的ffprobe取得，与解码同时进行；封装
+信息同时记入媒体信息缓存（见 mediainfo）。
+源文件的大小或mtime变化后，已有的产物不再被使用。
+"""
+
+import json
+import os
+import subprocess
+from pathlib import Path
+
+INGEST_DIR = "ingest"
+
+AUDIO_NAME = "audio.wav"
+ENVELOPE_NAME = "envelope.npy"
+KEYFRAMES_NAME = "keyframes.json"
+METADATA_NAME = "metadata.json"
+
+# 能量包络每帧的时长（秒）
+ENVELOPE_FRAME_SECONDS = 0.1
+
+
+def ingest_dir(media: Path, working_dir: Path = None) -> Path:
+    """媒体文件的导入产物目录，默认放在媒体文件所在的工作目录下"""
+    media = Path(media)
+    return Path(working_dir or media.parent) / INGEST_DIR / media.name
+
+
+def _source_record(media: Path) -> dict:
+    stat = Path(media).stat()
+    return {"path": str(media), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load(media: Path, working_dir: Path = None):
+    """
+    读取媒体文件的导入结果
+
+    Returns:
+        dict: metadata.json的内容（"dir" 为产物目录）；没有导入过或源文件
+            已经变化时返回None
+    """
+    out = ingest_dir(media, working_dir)
+    try:
+        with open(out / METADATA_NAME, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        current = _source_record(media)
+    except (OSError, ValueError):
+        return None
+
+    source = metadata.get("source") or {}
+    if (source.get("size"), source.get("mtime_ns")) != (current["size"], current["mtime_ns"]):
+        return None
+    metadata["dir"] = str(out)
+    return metadata
+
+
+def audio_path(metadata: dict):
+    """导入结果中的16kHz单声道WAV，不存在时返回None"""
+    path = Path(metadata["dir"]) / AUDIO_NAME
+    return path if path.exists() else None
+
+
+def load_envelope(metadata: dict):
+    """能量包络（numpy数组），不存在时返回None"""
+    import numpy as np
+
+    try:
+        return np.load(Path(metadata["dir"]) / ENVELOPE_NAME)
+    except (OSError, ValueError):
+        return None
+
+
+def load_keyframes(metadata: dict) -> list:
+    """视频关键帧时间戳（秒），纯音频文件为空列表"""
+    try:
+        with open(Path(metadata["dir"]) / KEYFRAMES_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def silence_index(metadata: dict, **kwargs):
+    """
+    从能量包络建立整段录音的静音索引（参数见 SilenceIndex.from_envelope），
+    没有包络时返回None
+    """
+    from .silence import SilenceIndex
+
+    envelope = load_envelope(metadata)
+    if envelope is None:
+        return None
+    return SilenceIndex.from_envelope(
+        envelope, metadata.get("envelope_frame_seconds", ENVELOPE_FRAME_SECONDS), **kwargs)
+
+
+def find_envelope(wav: Path):
+    """
+    查找与给定WAV是同一个文件（硬链接到同一个缓存条目）的导入结果，返回
+    它的能量包络；找不到时返回None
+    """
+    wav = Path(wav)
+    root = wav.parent / INGEST_DIR
+    if not wav.exists() or not root.is_dir():
+        return None
+    for candidate in root.glob(f"*/{AUDIO_NAME}"):
+        try:
+            if candidate.samefile(wav):
+                return load_envelope({"dir": str(candidate.parent)})
+        except OSError:
+            continue
+    return None
+
+
+def _start_keyframe_probe(media: Path, out: Path):
+    """
+    后台启动只解封装的ffprobe，列出视频包的时间戳和标志；输出写到文件，
+    避免管道写满时阻塞
+    """
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(media)]
+    listing = open(out / "packets.csv.tmp", "w", encoding="utf-8")
+    try:
+        proc = subprocess.Popen(cmd, stdout=listing, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        listing.close()
+        print(f"⚠️ 无法启动ffprobe读取关键帧: {e}")
+        return None
+    return proc, listing
+
+
+def _finish_keyframe_probe(probe) -> list:
+    if probe is None:
+        return []
+    proc, listing = probe
+    proc.wait()
+    listing.close()
+    path = Path(listing.name)
+    keyframes = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                fields = line.strip().split(",")
+                if len(fields) < 2 or "K" not in fields[1]:
+                    continue
+                try:
+                    keyframes.append(float(fields[0]))
+                except ValueError:
+                    # 没有时间戳（N/A）的包
+                    continue
+    finally:
+        path.unlink(missing_ok=True)
+    return sorted(keyframes)
+
+
+def _cancel_keyframe_probe(probe):
+    if probe is None:
+        return
+    proc, listing = probe
+    if proc.poll() is None:
+        proc.kill()
+        proc.wait()
+    listing.close()
+    Path(listing.name).unlink(missing_ok=True)
+
+
+def _write_outputs(media: Path, out: Path, envelope, samples: int, keyframes: list):
+    """写出包络、关键帧，最后写metadata.json（作为导入完成的标志）"""
+    import numpy as np
+
+    from . import mediainfo
+    from .audio import SAMPLE_RATE
+
+    # 封装信息走媒体信息缓存，之后的 probe_duration 等也不必再探测
+    try:
+        info = mediainfo.probe(media)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"⚠️ {e}")
+        info = {}
+    duration = info.get("duration") or samples / SAMPLE_RATE
+
+    np.save(out / ENVELOPE_NAME, np.asarray(envelope, dtype=np.float32))
+    with open(out / KEYFRAMES_NAME, "w", encoding="utf-8") as f:
+        json.dump(keyframes, f)
+
+    metadata = {
+        "source": _source_record(media),
+        "duration": duration,
+        "audio_duration": samples / SAMPLE_RATE,
+        "format": info.get("format") or {},
+        "streams": info.get("streams") or [],
+        "video": info.get("video"),
+        "audio": info.get("audio"),
+        "envelope_frame_seconds": ENVELOPE_FRAME_SECONDS,
+    }
+    tmp = out / f".{METADATA_NAME}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, out / METADATA_NAME)
+    metadata["dir"] = str(out)
+    return metadata
+
+
+def ingest_stream(media: Path, working_dir: Path = None, tee: Path = None,
+                  threads: int = None):
+    """
+    边解码边产出PCM块（见 audio.stream_pcm），同时计算能量包络、读取关键帧；
+    解码正常结束时把各项产物写入导入目录
+
+    Args:
+        media: 任意音视频文件
+        working_dir: 任务工作目录，默认为媒体文件所在目录
+        tee: 同时写出的16kHz单声道WAV
+        threads: ffmpeg线程数
+
+    Yields:
+        float32数组
+    """
+    import numpy as np
+
+    from .audio import SAMPLE_RATE, stream_pcm
+
+    media = Path(media)
+    out = ingest_dir(media, working_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    frame = int(SAMPLE_RATE * ENVELOPE_FRAME_SECONDS)
+    energies = []
+    carry = np.zeros(0, dtype=np.float32)
+    samples = 0
+
+    probe = _start_keyframe_probe(media, out)
+    finished = False
+    try:
+        for chunk in stream_pcm(media, tee=tee, threads=threads):
+            samples += len(chunk)
+            data = np.concatenate([carry, chunk]) if len(carry) else chunk
+            usable = len(data) // frame * frame
+            if usable:
+                frames = data[:usable].reshape(-1, frame)
+                energies.append(np.einsum("ij,ij->i", frames, frames) / frame)
+            carry = data[usable:].copy()
+            yield chunk
+
+        envelope = np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+        keyframes = _finish_keyframe_probe(probe)
+        finished = True
+        _write_outputs(media, out, envelope, samples, keyframes)
+        print(f"📦 媒体导入完成: {out}（{len(keyframes)} 个关键帧）")
+    finally:
+        if not finished:
+            _cancel_keyframe_probe(probe)
+
+
+def _ingest_from_wav(media: Path, out: Path):
+    """WAV已经在缓存中：从WAV计算包络，不再解码媒体文件"""
+    from .audio import SAMPLE_RATE, frame_energy, load_pcm
+
+    probe = _start_keyframe_probe(media, out)
+    try:
+        audio = load_pcm(out / AUDIO_NAME)
+        try:
+            envelope = frame_energy(audio, int(SAMPLE_RATE * ENVELOPE_FRAME_SECONDS))
+            samples = len(audio)
+        finally:
+            if hasattr(audio, "close"):
+                audio.close()
+    except Exception:
+        _cancel_keyframe_probe(probe)
+        raise
+    return _write_outputs(media, out, envelope, samples, _finish_keyframe_probe(probe))
+
+
+def ingest(media: Path, working_dir: Path = None) -> dict:
+    """
+    确保媒体文件已经导入，返回导入结果（见 load）；已有的产物直接复用，
+    解码结果进入WAV缓存
+
+    Args:
+        media: 任意音视频文件
+        working_dir: 任务工作目录，默认为媒体文件所在目录
+    """
+    from . import cache
+    from .threads import thread_lease
+
+    media = Path(media)
+    out = ingest_dir(media, working_dir)
+    metadata = load(media, working_dir)
+    if metadata is not None and audio_path(metadata) is not None:
+        return metadata
+
+    out.mkdir(parents=True, exist_ok=True)
+    target = out / AUDIO_NAME
+
+    def decode(path: Path):
+        print(f"🎬 导入媒体文件: {media}")
+        with thread_lease("ffmpeg") as lease:
+            for _ in ingest_stream(media, working_dir, tee=path, threads=lease.threads):
+                pass
+
+    if not cache.enabled():
+        decode(target)
+        return load(media, working_dir)
+
+    from .transcript import wav_cache_key
+
+    cached, hit = cache.get_or_create("wav", wav_cache_key(media), decode, suffix=".wav")
+    cache.place(cached, target)
+    if not hit:
+        return load(media, working_dir)
+
+    print(f"♻️  复用已解码的16kHz单声道音频: {target}")
+    if metadata is not None:
+        return metadata
+    return _ingest_from_wav(media, out)
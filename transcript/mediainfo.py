@@ -0,0 +1,150 @@
+"""
+持久化的媒体信息（ffprobe）缓存
+
+get_audio_info、probe_duration、adjust_subtitles_offset 等各自调用ffprobe，
+同一个片头/片尾视频在每次 resume 时都要重新探测。这里对每个文件只运行一次
+`ffprobe -show_streams -show_format`，把完整的结果和常用字段（时长、编码、
+帧率、采样率、声道数）记在 $TRANSCRIPT_CACHE_DIR/mediainfo.json 中，以
+(路径, 大小, mtime) 为键，文件未变化时直接返回记录的结果：
+
+    info = probe(path)
+    info["duration"], info["video"]["frame_rate"], info["audio"]["sample_rate"]
+
+设置 TRANSCRIPT_CACHE=0 时不读写记录，每次都运行ffprobe。
+"""
+
+import json
+import os
+import subprocess
+import threading
+from pathlib import Path
+
+INDEX_NAME = "mediainfo.json"
+
+_index_lock = threading.Lock()
+
+
+def _index_path() -> Path:
+    from .cache import cache_dir
+
+    return cache_dir() / INDEX_NAME
+
+
+def _load_index() -> dict:
+    try:
+        with open(_index_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index: dict):
+    path = _index_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ 无法保存媒体信息缓存: {e}")
+
+
+def _rate(value):
+    """把ffprobe的 "30000/1001" 形式的帧率转换为浮点数"""
+    try:
+        num, _, den = str(value).partition("/")
+        return float(num) / float(den or 1) if float(den or 1) else None
+    except ValueError:
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize(probed: dict) -> dict:
+    """从ffprobe的JSON输出提取常用字段，并保留完整的format和streams"""
+    fmt = probed.get("format") or {}
+    streams = probed.get("streams") or []
+    info = {
+        "duration": _float(fmt.get("duration")),
+        "format_name": fmt.get("format_name"),
+        "codecs": [stream.get("codec_name") for stream in streams],
+        "video": None,
+        "audio": None,
+        "format": fmt,
+        "streams": streams,
+    }
+
+    for stream in streams:
+        kind = stream.get("codec_type")
+        if kind == "video" and info["video"] is None:
+            info["video"] = {
+                "codec": stream.get("codec_name"),
+                "width": stream.get("width"),
+                "height": stream.get("height"),
+                "frame_rate": _rate(stream.get("avg_frame_rate")) or _rate(stream.get("r_frame_rate")),
+            }
+        elif kind == "audio" and info["audio"] is None:
+            info["audio"] = {
+                "codec": stream.get("codec_name"),
+                "sample_rate": int(stream.get("sample_rate") or 0) or None,
+                "channels": stream.get("channels"),
+            }
+
+    if info["duration"] is None:
+        # 部分封装格式只在流上记录时长
+        durations = [_float(stream.get("duration")) for stream in streams]
+        durations = [d for d in durations if d is not None]
+        info["duration"] = max(durations) if durations else None
+    return info
+
+
+def _run_ffprobe(media: Path) -> dict:
+    cmd = ["ffprobe", "-v", "error", "-print_format", "json",
+           "-show_format", "-show_streams", str(media)]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe读取媒体信息失败: {media}: {result.stderr.strip()}")
+    return json.loads(result.stdout)
+
+
+def probe(media: Path) -> dict:
+    """
+    返回媒体文件的信息（见 summarize），文件未变化时使用缓存的结果
+
+    Raises:
+        RuntimeError: ffprobe无法读取文件
+    """
+    from .cache import enabled
+
+    path = Path(media).resolve()
+    stat = path.stat()
+    key = str(path)
+
+    if enabled():
+        with _index_lock:
+            record = _load_index().get(key)
+        if record and record["size"] == stat.st_size and record["mtime"] == stat.st_mtime_ns:
+            return record["info"]
+
+    info = summarize(_run_ffprobe(path))
+
+    if enabled():
+        with _index_lock:
+            index = _load_index()
+            index[key] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "info": info}
+            _save_index(index)
+    return info
+
+
+def duration(media: Path) -> float:
+    """媒体时长（秒）"""
+    value = probe(media)["duration"]
+    if value is None:
+        raise RuntimeError(f"无法确定媒体时长: {media}")
+    return value
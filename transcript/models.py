@@ -0,0 +1,221 @@
+"""
+进程内模型注册表
+
+whisperx、wav2vec2对齐和SpeechBrain说话人模型动辄数GB，同一进程里处理多个
+文件时不应重复加载。注册表按 (模型名, 设备, 计算类型) 缓存模型实例，记录每个
+模型的常驻内存，超过内存预算时按最近最少使用（LRU）顺序淘汰。
+
+内存预算通过环境变量 TRANSCRIPT_MODEL_RAM_GB 配置（单位GB，0表示不限制），
+默认为物理内存的60%。
+"""
+
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# variant 用于区分加载参数不同但模型相同的实例（例如不同的initial_prompt、线程数）
+ModelKey = namedtuple("ModelKey", ["name", "device", "compute_type", "variant"],
+                      defaults=[""])
+
+# 未配置预算时占用物理内存的比例
+DEFAULT_BUDGET_RATIO = 0.6
+
+
+def current_rss() -> int:
+    """返回当前进程的常驻内存（字节），无法获取时返回0"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+        import sys
+
+        # macOS没有/proc，只能拿到峰值RSS；ru_maxrss在macOS上单位为字节，Linux上为KB
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+    except Exception:
+        return 0
+
+
+def physical_memory() -> int:
+    """返回物理内存大小（字节），无法获取时返回0"""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def estimate_model_size(model) -> int:
+    """通过torch参数估算模型大小（字节），无法估算时返回0"""
+    if isinstance(model, (tuple, list)):
+        return sum(estimate_model_size(m) for m in model)
+
+    parameters = getattr(model, "parameters", None)
+    if not callable(parameters):
+        return 0
+    try:
+        return sum(p.numel() * p.element_size() for p in parameters())
+    except Exception:
+        return 0
+
+
+def default_budget() -> int:
+    """读取内存预算配置（字节），0表示不限制"""
+    env_budget = os.environ.get("TRANSCRIPT_MODEL_RAM_GB")
+    if env_budget:
+        return int(float(env_budget) * 1024 ** 3)
+    return int(physical_memory() * DEFAULT_BUDGET_RATIO)
+
+
+class _Entry:
+    __slots__ = ("model", "size", "fork_safe", "loaded_at", "last_used", "hits")
+
+    def __init__(self, model, size: int, fork_safe: bool = True):
+        self.model = model
+        self.size = size
+        self.fork_safe = fork_safe
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.hits = 0
+
+
+class ModelRegistry:
+    """按key共享模型实例，超出内存预算时淘汰最久未使用的模型"""
+
+    def __init__(self, budget: int = None):
+        self.budget = default_budget() if budget is None else budget
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key: ModelKey, loader, fork_safe: bool = True):
+        """
+        返回key对应的模型，不存在时调用loader()加载并登记
+
+        Args:
+            key: ModelKey
+            loader: 无参数的加载函数
+            fork_safe: 模型能否在fork出的子进程中继续使用。CTranslate2等
+                在加载时创建工作线程的模型不能跨fork使用，子进程会重新加载
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.last_used = time.time()
+                entry.hits += 1
+                print(f"♻️  复用已加载模型: {key.name} ({key.device}, {key.compute_type})")
+                return entry.model
+
+            rss_before = current_rss()
+            model = loader()
+            # RSS增量能覆盖CTranslate2等非torch模型；torch参数大小作为下限
+            size = max(current_rss() - rss_before, estimate_model_size(model), 0)
+
+            self._entries[key] = _Entry(model, size, fork_safe)
+            print(f"📦 模型已登记: {key.name} 约 {size / 1024 ** 2:.0f}MB，"
+                  f"常驻合计 {self.resident_bytes / 1024 ** 2:.0f}MB")
+            self._evict(keep=key)
+            return model
+
+    @property
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def _evict(self, keep: ModelKey = None):
+        """淘汰最久未使用的模型，直到满足内存预算（不淘汰keep）"""
+        if self.budget <= 0:
+            return
+
+        evicted = False
+        while self.resident_bytes > self.budget:
+            victim = next((k for k in self._entries if k != keep), None)
+            if victim is None:
+                break
+            entry = self._entries.pop(victim)
+            print(f"🧹 超出内存预算 {self.budget / 1024 ** 3:.1f}GB，"
+                  f"释放模型: {victim.name} ({entry.size / 1024 ** 2:.0f}MB)")
+            del entry
+            evicted = True
+
+        if evicted:
+            gc.collect()
+
+    def evict(self, key: ModelKey) -> bool:
+        """主动释放指定模型"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        del entry
+        gc.collect()
+        return True
+
+    def clear(self):
+        """释放全部模型"""
+        with self._lock:
+            self._entries.clear()
+        gc.collect()
+
+    def _after_fork_in_child(self):
+        """fork后在子进程中调用：移除不能跨fork使用的模型"""
+        self._lock = threading.RLock()
+        for key in [k for k, e in self._entries.items() if not e.fork_safe]:
+            # 不析构这些对象：它们的内部线程在子进程中并不存在，析构时可能
+            # 等待永远不会结束的线程。保留引用的内存与父进程写时复制共享。
+            _fork_orphans.append(self._entries.pop(key))
+
+    def keys(self):
+        """已加载模型的key，按最近使用顺序排列"""
+        with self._lock:
+            return list(self._entries)
+
+    def __contains__(self, key: ModelKey) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self):
+        """返回已加载模型的统计信息，按最近使用顺序排列"""
+        with self._lock:
+            return [
+                {
+                    "name": key.name,
+                    "device": key.device,
+                    "compute_type": key.compute_type,
+                    "size": entry.size,
+                    "hits": entry.hits,
+                    "last_used": entry.last_used,
+                }
+                for key, entry in self._entries.items()
+            ]
+
+
+_registry = None
+
+# fork后子进程中不再使用、但也不能析构的模型
+_fork_orphans = []
+
+
+def get_registry() -> ModelRegistry:
+    """返回进程级共享的模型注册表"""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry()
+    return _registry
+
+
+def _reset_after_fork():
+    if _registry is not None:
+        _registry._after_fork_in_child()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
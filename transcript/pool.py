@@ -0,0 +1,218 @@
+"""
+预加载模型后fork的工作进程池
+
+并行处理多个文件时，如果每个进程各自加载模型，一台机器只能跑两三个进程。
+这里由父进程先把模型加载进模型注册表，再fork出工作进程：子进程继承注册表，
+模型权重与父进程写时复制共享，只要不写权重就不会产生额外的物理内存。
+
+注意：
+- 只能使用fork启动方式（Linux/macOS），Windows不支持
+- whisper转录模型基于CTranslate2，加载时会创建工作线程，线程无法跨fork
+  存活，因此不在父进程中加载，只预热其模型文件的页缓存，子进程各自加载
+  （读取的仍是共享的页缓存），每个子进程各占一份转录模型的内存。wav2vec2
+  对齐模型和ECAPA说话人模型是纯torch模型，在父进程中加载后由所有子进程共享
+- 只预加载任务会用到的模型：`transcript gen` 不做对齐，只在启用说话人
+  分离时预加载说话人模型
+- 既然每个子进程各占一份转录模型，工作进程数除了受CPU核数限制，还按
+  可用内存 / WORKER_BYTES 封顶，避免在多核机器上一核一个模型把内存耗尽
+- 选用whisper.cpp服务后端时，由父进程启动服务，子进程共用同一个服务
+- 父进程在fork前调用 gc.freeze()，避免子进程的垃圾回收触碰对象头而把
+  共享页面复制一份
+"""
+
+import gc
+import multiprocessing
+import os
+import sys
+import traceback
+from functools import partial
+from pathlib import Path
+
+DEFAULT_PRELOAD = ("asr", "asr-server")
+
+# 每个转录工作进程的内存开销估计，与分块转录的工作进程相同
+# （int8的large-v2模型副本加转录批）
+WORKER_BYTES = 3 * 1024 ** 3
+
+
+def memory_stats(pid="self") -> dict:
+    """
+    返回进程内存统计（字节）
+
+    rss: 常驻内存（包含与其它进程共享的页面）
+    pss: 按共享进程数均摊后的内存
+    uss: 进程独占的内存，即多开一个工作进程的真实成本
+    """
+    stats = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[-1] == "kB":
+                    stats[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        from .models import current_rss
+
+        rss = current_rss()
+        return {"rss": rss, "pss": rss, "uss": rss}
+
+    return {
+        "rss": stats.get("Rss", 0),
+        "pss": stats.get("Pss", 0),
+        "uss": stats.get("Private_Clean", 0) + stats.get("Private_Dirty", 0),
+    }
+
+
+def preload_models(kinds=DEFAULT_PRELOAD):
+    """在父进程中加载可以跨fork共享的模型"""
+    from . import transcript as core
+
+    for kind in kinds:
+        try:
+            if kind == "asr":
+                from .resolver import resolve, warm
+
+                snapshot = resolve("whisper")
+                if snapshot is not None:
+                    size = warm(snapshot)
+                    print(f"🔥 已预热whisper模型文件 {size / 1024 ** 2:.0f}MB（子进程各自加载）")
+            elif kind == "asr-server":
+                from .asr import select_backends
+
+                backends = select_backends()
+                if backends and backends[0].name == "whisper.cpp-server":
+                    # 服务由父进程持有，子进程发现服务在运行后直接复用
+                    backends[0].start()
+            elif kind == "align":
+                core.load_align_model()
+            elif kind == "speaker":
+                core.load_speaker_model()
+            else:
+                raise ValueError(f"未知模型类型: {kind}")
+        except Exception as e:
+            print(f"⚠️ 预加载{kind}模型失败，子进程将各自加载: {e}")
+
+
+def _worker_init(threads: int):
+    """子进程初始化：按工作进程数分配线程，避免互相争抢CPU"""
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def _run_job(func, job):
+    """在子进程中执行任务，捕获异常并附带内存统计"""
+    result, error = None, None
+    try:
+        result = func(job)
+    except Exception as e:
+        error = f"{e}\n{traceback.format_exc()}"
+    return {
+        "job": job,
+        "result": result,
+        "error": error,
+        "pid": os.getpid(),
+        "memory": memory_stats(),
+    }
+
+
+def memory_workers(worker_bytes: int) -> int:
+    """可用内存能容纳的工作进程数，无法获取可用内存时返回0（不限制）"""
+    from .hardware import RESERVED_BYTES, available_memory
+
+    memory = available_memory()
+    if not memory or not worker_bytes:
+        return 0
+    return max(1, (memory - RESERVED_BYTES) // worker_bytes)
+
+
+def run_prefork(func, jobs, workers: int = None, preload=DEFAULT_PRELOAD,
+                worker_bytes: int = 0):
+    """
+    预加载模型后fork工作进程，并行执行 func(job)
+
+    Args:
+        func: 可被pickle的函数（模块级函数或partial）
+        jobs: 任务参数列表
+        workers: 工作进程数，默认为 min(任务数, CPU核数)
+        preload: 父进程预加载的模型类型
+        worker_bytes: 每个工作进程各自占用的内存估计（不能共享的模型），
+            非0时工作进程数不超过可用内存能容纳的数量
+
+    Returns:
+        list: 每个任务的 {"job", "result", "error", "pid", "memory"}，顺序与jobs一致
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+
+    from .threads import total_threads
+
+    cpu_count = total_threads()
+    workers = max(1, min(workers or cpu_count, len(jobs)))
+    fits = memory_workers(worker_bytes)
+    if fits and workers > fits:
+        print(f"⚠️ 可用内存只够 {fits} 个工作进程（每个约 {worker_bytes / 1024 ** 3:.0f}GB），"
+              f"由 {workers} 个减少到 {fits} 个")
+        workers = fits
+    # 初始份额；各阶段运行时再通过线程预算按实际并发调整
+    threads = max(1, cpu_count // workers)
+
+    preload_models(preload)
+
+    # 把父进程现有对象移到永久代，子进程的GC不再扫描（也就不会写）这些页面
+    gc.collect()
+    gc.freeze()
+    try:
+        ctx = multiprocessing.get_context("fork")
+        print(f"🚀 启动 {workers} 个工作进程（每个 {threads} 线程）")
+        with ctx.Pool(workers, initializer=_worker_init, initargs=(threads,)) as pool:
+            return pool.map(partial(_run_job, func), jobs, chunksize=1)
+    finally:
+        gc.unfreeze()
+
+
+def _transcript_job(input_file, output_dir=None, enable_diarization=True):
+    from .transcript import transcript
+
+    return transcript(Path(input_file), output_dir, enable_diarization=enable_diarization)
+
+
+def transcribe_files(input_files, output_dir: Path = None, workers: int = None,
+                     enable_diarization=True):
+    """
+    并行生成多个文件的字幕
+
+    注意：transcript() 会把 /tmp/transcript.log 指向最近处理的文件，批量处理后
+    `transcript resume` 只会继续处理最后完成的那个文件。工作目录按文件名
+    （不含扩展名）命名，文件名相同的输入会互相覆盖中间文件，因此直接拒绝。
+
+    Returns:
+        list: run_prefork 的结果
+    """
+    stems = {}
+    for f in input_files:
+        stems.setdefault(Path(f).stem, []).append(str(f))
+    duplicates = [paths for paths in stems.values() if len(paths) > 1]
+    if duplicates:
+        raise ValueError("以下文件同名，会共用同一个工作目录，请分批处理或重命名: "
+                         + "; ".join(", ".join(paths) for paths in duplicates))
+
+    func = partial(_transcript_job, output_dir=output_dir,
+                   enable_diarization=enable_diarization)
+    # 字幕生成阶段不做对齐（在resume阶段进行），不预加载对齐模型
+    preload = DEFAULT_PRELOAD + (("speaker",) if enable_diarization else ())
+    # whisper模型在每个子进程中各自加载，按内存限制工作进程数
+    results = run_prefork(func, [str(f) for f in input_files], workers, preload=preload,
+                          worker_bytes=WORKER_BYTES)
+
+    for item in results:
+        mem = item["memory"]
+        status = "❌" if item["error"] else "✅"
+        print(f"{status} {item['job']} (pid={item['pid']}, "
+              f"USS={mem['uss'] / 1024 ** 2:.0f}MB, PSS={mem['pss'] / 1024 ** 2:.0f}MB)")
+        if item["error"]:
+            print(item["error"])
+
+    return results
@@ -0,0 +1,294 @@
+"""
+模型文件解析器
+
+统一定位whisper（faster-whisper CTranslate2格式）、wav2vec2对齐模型和
+SpeechBrain ECAPA说话人模型在Hugging Face缓存中的快照目录：
+
+- 通过 `refs/main` 直接定位快照，不再 iterdir + stat 扫描目录
+- 解析结果写入清单文件（$HF_HOME/transcript-models.json）固定版本，后续运行
+  只需检查几个文件是否存在
+- 可选地按blob文件名（LFS文件为sha256，普通文件为git sha1）校验文件内容
+
+`transcript models preload` 会下载缺失的模型、校验并预热页缓存。
+"""
+
+import hashlib
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+
+# required: 必须存在的文件；weights: 至少存在其中之一的权重文件
+ModelSpec = namedtuple("ModelSpec", ["repo_id", "required", "weights"])
+
+MODEL_SPECS = {
+    "whisper": ModelSpec(
+        "Systran/faster-whisper-large-v2",
+        ("config.json", "tokenizer.json", "vocabulary.txt"),
+        ("model.bin",),
+    ),
+    "align": ModelSpec(
+        "jonatasgrosman/wav2vec2-large-xlsr-53-chinese-zh-cn",
+        ("config.json", "preprocessor_config.json", "vocab.json"),
+        ("model.safetensors", "pytorch_model.bin"),
+    ),
+    "speaker": ModelSpec(
+        "speechbrain/spkrec-ecapa-voxceleb",
+        ("hyperparams.yaml", "embedding_model.ckpt", "mean_var_norm_emb.ckpt",
+         "classifier.ckpt", "label_encoder.txt"),
+        (),
+    ),
+}
+
+MANIFEST_NAME = "transcript-models.json"
+
+# 计算哈希时每次读取的块大小
+HASH_BLOCK = 1024 * 1024
+
+
+def hf_home() -> Path:
+    from .transcript import hf_home as default_hf_home
+
+    return Path(os.environ.get("HF_HOME", default_hf_home))
+
+
+def cache_roots():
+    """返回可能存放模型的缓存根目录（去重，按优先级排列）"""
+    home = hf_home()
+    candidates = [
+        os.environ.get("HF_HUB_CACHE"),
+        os.environ.get("HUGGINGFACE_HUB_CACHE"),
+        home / "hub",
+        # 旧版本代码把 download_root/model_dir 设为 HF_HOME 本身
+        home,
+    ]
+    roots = []
+    for candidate in candidates:
+        if candidate and Path(candidate) not in roots:
+            roots.append(Path(candidate))
+    return roots
+
+
+def manifest_path() -> Path:
+    return hf_home() / MANIFEST_NAME
+
+
+def _load_manifest() -> dict:
+    try:
+        with open(manifest_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest: dict):
+    path = manifest_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _repo_dir(root: Path, repo_id: str) -> Path:
+    return root / f"models--{repo_id.replace('/', '--')}"
+
+
+def _snapshot_files(snapshot: Path, spec: ModelSpec):
+    """返回快照中需要的文件列表，不完整时返回None"""
+    files = []
+    for name in spec.required:
+        if not (snapshot / name).is_file():
+            return None
+        files.append(name)
+
+    if spec.weights:
+        weights = [name for name in spec.weights if (snapshot / name).is_file()]
+        if not weights:
+            return None
+        files.append(weights[0])
+
+    return files
+
+
+def _file_record(snapshot: Path, name: str) -> dict:
+    path = snapshot / name
+    stat = path.stat()
+    # HF缓存中快照文件是指向 blobs/<etag> 的符号链接
+    blob = path.resolve().name if path.is_symlink() else ""
+    return {"blob": blob, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def _pin(kind: str, snapshot: Path, files, verified: bool = False):
+    manifest = _load_manifest()
+    spec = MODEL_SPECS[kind]
+    manifest[kind] = {
+        "repo_id": spec.repo_id,
+        "revision": snapshot.name,
+        "path": str(snapshot),
+        "files": {name: _file_record(snapshot, name) for name in files},
+        "verified": verified,
+    }
+    _save_manifest(manifest)
+
+
+def _pinned_snapshot(kind: str):
+    """返回清单中固定的快照目录；文件缺失或大小变化时返回None"""
+    entry = _load_manifest().get(kind)
+    if not entry or entry.get("repo_id") != MODEL_SPECS[kind].repo_id:
+        return None
+
+    snapshot = Path(entry["path"])
+    for name, record in entry.get("files", {}).items():
+        try:
+            if (snapshot / name).stat().st_size != record["size"]:
+                return None
+        except OSError:
+            return None
+    return snapshot if entry.get("files") else None
+
+
+def _locate_snapshot(kind: str):
+    """通过 refs/main 在各缓存根目录中定位快照"""
+    spec = MODEL_SPECS[kind]
+    for root in cache_roots():
+        ref = _repo_dir(root, spec.repo_id) / "refs" / "main"
+        try:
+            revision = ref.read_text().strip()
+        except OSError:
+            continue
+
+        snapshot = ref.parent.parent / "snapshots" / revision
+        files = _snapshot_files(snapshot, spec)
+        if files is not None:
+            return snapshot, files
+    return None, None
+
+
+def resolve(kind: str):
+    """
+    返回模型在本地缓存中的快照目录
+
+    Args:
+        kind: "whisper" / "align" / "speaker"
+
+    Returns:
+        Path或None（本地没有完整的模型文件）
+    """
+    snapshot = _pinned_snapshot(kind)
+    if snapshot is not None:
+        return snapshot
+
+    snapshot, files = _locate_snapshot(kind)
+    if snapshot is None:
+        return None
+
+    try:
+        _pin(kind, snapshot, files)
+    except OSError as e:
+        print(f"⚠️ 无法写入模型清单: {e}")
+    return snapshot
+
+
+def _hash_file(path: Path, algorithm: str, git_blob: bool = False) -> str:
+    digest = hashlib.new(algorithm)
+    if git_blob:
+        digest.update(f"blob {path.stat().st_size}\0".encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify(kind: str) -> bool:
+    """按blob名称校验快照文件内容，文件未变化且已校验过时直接返回"""
+    snapshot = resolve(kind)
+    if snapshot is None:
+        print(f"❌ {kind}: 本地没有完整的模型文件")
+        return False
+
+    entry = _load_manifest().get(kind, {})
+    files = entry.get("files", {})
+    unchanged = all(
+        _file_record(snapshot, name)["mtime"] == record["mtime"]
+        for name, record in files.items()
+    )
+    if entry.get("verified") and unchanged:
+        return True
+
+    ok = True
+    for name, record in files.items():
+        blob = record["blob"]
+        path = snapshot / name
+        if len(blob) == 64:
+            actual = _hash_file(path, "sha256")
+        elif len(blob) == 40:
+            actual = _hash_file(path, "sha1", git_blob=True)
+        else:
+            # 非HF缓存布局（例如手动拷贝的目录），无从校验
+            continue
+        if actual != blob:
+            print(f"❌ {kind}: {name} 校验失败 (期望 {blob[:12]}, 实际 {actual[:12]})")
+            ok = False
+
+    if ok:
+        _pin(kind, snapshot, list(files), verified=True)
+        print(f"✅ {kind}: 校验通过 {snapshot}")
+    return ok
+
+
+def download(kind: str):
+    """从Hugging Face下载模型需要的文件，返回快照目录"""
+    from huggingface_hub import snapshot_download
+
+    spec = MODEL_SPECS[kind]
+    root = cache_roots()[0]
+    print(f"⬇️  下载 {spec.repo_id} -> {root}")
+    snapshot_download(
+        spec.repo_id,
+        cache_dir=str(root),
+        allow_patterns=list(spec.required + spec.weights),
+    )
+    return resolve(kind)
+
+
+def warm(snapshot: Path):
+    """顺序读取模型文件，预热页缓存"""
+    total = 0
+    for path in snapshot.iterdir():
+        if not path.is_file():
+            continue
+        with open(path, "rb") as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            while True:
+                block = f.read(16 * HASH_BLOCK)
+                if not block:
+                    break
+                total += len(block)
+    return total
+
+
+def preload(kinds=None) -> bool:
+    """下载缺失的模型、校验并预热，返回是否全部成功"""
+    ok = True
+    for kind in kinds or MODEL_SPECS:
+        snapshot = resolve(kind)
+        if snapshot is None:
+            try:
+                snapshot = download(kind)
+            except Exception as e:
+                print(f"❌ {kind}: 下载失败: {e}")
+                ok = False
+                continue
+        if snapshot is None or not verify(kind):
+            ok = False
+            continue
+        size = warm(snapshot)
+        print(f"🔥 {kind}: 已预热 {size / 1024 ** 2:.0f}MB")
+    return ok
+
+
+def status():
+    """返回每个模型的解析结果 {kind: (repo_id, 快照目录或None)}"""
+    return {kind: (spec.repo_id, resolve(kind)) for kind, spec in MODEL_SPECS.items()}
@@ -0,0 +1,404 @@
+"""
+重新导出的录音只转录变化的部分
+
+同一堂课常常换个片头、替换几分钟内容后重新导出，整段重新转录很浪费。
+这里对解码后的PCM做基于内容的分块（content-defined chunking）：对每
+REUSE_WINDOW 个采样的滚动哈希（gear哈希之和）满足掩码时切分，块的边界只
+取决于附近的音频内容，前面插入或删去一段不会影响后面的切分。每块的摘要
+记录在 $TRANSCRIPT_CACHE_DIR/reuse_index.json 中，每个转录过的文件在缓存的
+reuse/ 下保存块列表和转录片段（按转录设置区分，见 asr.settings_key）。索引在
+进程内和进程间加锁读改写、原子替换；记录已被缓存淘汰的条目随之删除，最多
+保留最近的 REUSE_INDEX_LIMIT 条。
+
+转录新文件时，与旧文件连续相同（且相对位置不变）的块组成复用区间，区间内
+的旧片段平移到新的时间线上直接使用，其余部分拼接成一段较短的音频送去转录，
+时间戳再映射回来（见 gate.SpeechMap）：
+
+    segments = transcribe_incremental(asr, wav, prompt, settings)
+    if segments is None:
+        segments = asr.run(wav, prompt)
+    remember(wav, segments, settings)
+
+注意：只有解码后的采样完全相同的部分才能匹配，例如直接复制音频流、无损
+导出，或者用相同编码参数导出且编辑点对齐编码帧的情况。
+
+环境变量 TRANSCRIPT_REUSE=0 关闭。
+
+比较内容需要完整的WAV。源文件还没有解码过时，默认仍然边解码边转录，只在
+转录完成后登记（remember）；设置 TRANSCRIPT_REUSE_PREDECODE=1 时，若索引
+非空则先完成解码再比较（见 predecode），适合经常重新导出同一批录音的场景。
+"""
+
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+SAMPLE_RATE = 16000
+
+# 滚动哈希的窗口（采样数）
+REUSE_WINDOW = 64
+
+# 哈希低位全为0时切分，平均块长约为 2^16 个采样加最小块长（约5秒）
+REUSE_MASK = (1 << 16) - 1
+
+# 块的最小/最大时长（秒）
+REUSE_MIN_CHUNK = 1.0
+REUSE_MAX_CHUNK = 20.0
+
+# 复用区间的最短时长（秒），太短的相同片段不值得拆开转录
+MIN_REUSE_SECONDS = 30.0
+
+# 复用区间两端各让出的时长（秒）：跨过区间边界的旧片段可能包含已经变化的内容
+REUSE_MARGIN = 1.0
+
+# 短于此时长（秒）的未复用空隙不再单独转录
+MIN_GAP_SECONDS = 0.5
+
+# 计算哈希时每次处理的时长（秒）
+HASH_BLOCK_SECONDS = 60
+
+REUSE_INDEX = "reuse_index.json"
+
+# 索引最多保留的块数（平均每块约5秒，约为280小时的音频）
+REUSE_INDEX_LIMIT = 200000
+
+# 滚动哈希用的随机表（固定种子，所有进程和版本保持一致）
+_GEAR_SEED = 20240601
+
+_gear = None
+_memo = {}
+_index_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    from . import cache
+
+    return cache.enabled() and os.environ.get("TRANSCRIPT_REUSE", "1") != "0"
+
+
+def predecode() -> bool:
+    """
+    是否为了与转录过的文件比较而先完成解码（放弃边解码边转录）：需要
+    TRANSCRIPT_REUSE_PREDECODE=1 且索引非空；只检查索引文件的大小，不解析
+    """
+    if not enabled() or os.environ.get("TRANSCRIPT_REUSE_PREDECODE", "0") != "1":
+        return False
+    try:
+        # 空索引保存为 "{}"
+        return _index_path().stat().st_size > 2
+    except OSError:
+        return False
+
+
+def _gear_table():
+    global _gear
+    if _gear is None:
+        import numpy as np
+
+        _gear = np.random.default_rng(_GEAR_SEED).integers(0, 2 ** 32, 65536, dtype=np.uint64)
+    return _gear
+
+
+def cut_candidates(pcm, window: int = REUSE_WINDOW, mask: int = REUSE_MASK,
+                   block_seconds: float = HASH_BLOCK_SECONDS):
+    """
+    滚动哈希满足掩码的位置（之后切分），逐块计算
+
+    Args:
+        pcm: int16采样数组（例如 PCMBuffer.pcm）
+
+    Returns:
+        numpy数组：切分点（采样下标）
+    """
+    import numpy as np
+
+    gear = _gear_table()
+    total = len(pcm)
+    block = int(block_seconds * SAMPLE_RATE)
+    found = []
+    for first in range(0, total, block):
+        # 带上前一块末尾的 window-1 个采样，窗口跨块时同样计算
+        lo = max(0, first - window + 1)
+        last = min(total, first + block)
+        sums = np.concatenate([np.zeros(1, dtype=np.uint64),
+                               np.cumsum(gear[np.asarray(pcm[lo:last]).view(np.uint16)])])
+        ends = np.arange(max(first, window - 1), last)
+        # 无符号整数溢出回绕，差值仍是窗口内的和（模2^64）
+        hashes = sums[ends - lo + 1] - sums[ends - lo + 1 - window]
+        found.append(ends[(hashes & np.uint64(mask)) == 0] + 1)
+    return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+
+def chunk_bounds(candidates, total: int, min_size: int, max_size: int):
+    """按最小/最大块长从候选切分点中选出块边界 [0, ..., total]"""
+    bounds = [0]
+    for cut in candidates.tolist():
+        if cut - bounds[-1] < min_size or cut >= total:
+            continue
+        while cut - bounds[-1] > max_size:
+            bounds.append(bounds[-1] + max_size)
+        bounds.append(cut)
+    while total - bounds[-1] > max_size:
+        bounds.append(bounds[-1] + max_size)
+    if total > bounds[-1]:
+        bounds.append(total)
+    return bounds
+
+
+def content_chunks(wav: Path):
+    """
+    16kHz单声道WAV按内容分块
+
+    Returns:
+        list: [(start_sample, end_sample, 摘要)]
+    """
+    from .audio import PCMBuffer
+
+    wav = Path(wav)
+    stat = wav.stat()
+    memo_key = (str(wav.resolve()), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _memo:
+        return _memo[memo_key]
+
+    with PCMBuffer(wav) as audio:
+        bounds = chunk_bounds(cut_candidates(audio.pcm), len(audio),
+                              int(REUSE_MIN_CHUNK * SAMPLE_RATE), int(REUSE_MAX_CHUNK * SAMPLE_RATE))
+        chunks = []
+        for start, end in zip(bounds, bounds[1:]):
+            digest = hashlib.blake2b(audio.pcm[start:end].tobytes(), digest_size=8).hexdigest()
+            chunks.append((start, end, digest))
+            audio.release(start, end)
+
+    _memo[memo_key] = chunks
+    return chunks
+
+
+def _index_path() -> Path:
+    from .cache import cache_dir
+
+    return cache_dir() / REUSE_INDEX
+
+
+def load_index() -> dict:
+    """{块摘要: [记录键, 起始采样]}"""
+    try:
+        with open(_index_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+@contextmanager
+def _locked_index():
+    """互斥地读改写索引：进程内用线程锁，进程间（例如工作进程池）用文件锁"""
+    path = _index_path()
+    with _index_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path.with_name(f"{path.name}.lock"), "a") as lock:
+            try:
+                import fcntl
+
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            except ImportError:
+                pass
+            # 关闭文件时释放文件锁
+            yield
+
+
+def _save_index(index: dict):
+    path = _index_path()
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ 无法保存复用索引: {e}")
+
+
+def update_index(chunks, key: str, limit: int = None):
+    """
+    登记一个记录的块：删除记录已被缓存淘汰的条目，新条目排在最后，超过
+    limit（默认 REUSE_INDEX_LIMIT）时丢弃最旧的
+    """
+    from .cache import entry_path
+
+    limit = limit or REUSE_INDEX_LIMIT
+    with _locked_index():
+        index = load_index()
+        for _, _, digest in chunks:
+            index.pop(digest, None)
+
+        alive = {}
+        for digest, entry in list(index.items()):
+            if entry[0] not in alive:
+                alive[entry[0]] = entry_path("reuse", entry[0], ".json").is_file()
+            if not alive[entry[0]]:
+                del index[digest]
+
+        for start, _, digest in chunks:
+            index[digest] = [key, start]
+        if len(index) > limit:
+            index = dict(list(index.items())[-limit:])
+        _save_index(index)
+
+
+def _record_key(wav: Path, settings: str) -> str:
+    from .cache import decoded_fingerprint
+
+    return f"{settings[:16]}-{decoded_fingerprint(wav)}"
+
+
+def remember(wav: Path, segments, settings: str):
+    """
+    记录这个文件的块列表和转录片段，供以后的文件复用
+
+    Args:
+        settings: 转录设置的键（见 asr.settings_key）
+    """
+    from . import cache
+
+    wav = Path(wav)
+    chunks = content_chunks(wav)
+    key = _record_key(wav, settings)
+
+    def write(target: Path):
+        with open(target, "w", encoding="utf-8") as f:
+            json.dump({"chunks": chunks, "segments": segments}, f,
+                      ensure_ascii=False, default=float)
+
+    cache.get_or_create("reuse", key, write, suffix=".json")
+    update_index(chunks, key)
+
+
+def _load_record(key: str):
+    from . import cache
+
+    path = cache.lookup("reuse", key, ".json")
+    if path is None:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def matching_regions(chunks, index: dict, settings: str, exclude: str = None):
+    """
+    与以前转录过的文件相同的连续区间
+
+    Returns:
+        list: [[start_sample, end_sample, 记录键, 偏移]]，旧位置 = 新位置 + 偏移
+    """
+    prefix = settings[:16] + "-"
+    regions = []
+    for start, end, digest in chunks:
+        entry = index.get(digest)
+        if not entry or not entry[0].startswith(prefix) or entry[0] == exclude:
+            continue
+        key, old_start = entry
+        delta = old_start - start
+        last = regions[-1] if regions else None
+        if last and last[1] == start and last[2] == key and last[3] == delta:
+            last[1] = end
+        else:
+            regions.append([start, end, key, delta])
+    return regions
+
+
+def plan(wav: Path, settings: str):
+    """
+    找出可以复用的旧片段
+
+    Returns:
+        tuple: (复用的片段, 覆盖的时间区间 [(start, end)] 秒, 来源记录键集合)；
+        没有值得复用的部分时返回None
+    """
+    from .transcript import _shift_times
+
+    wav = Path(wav)
+    chunks = content_chunks(wav)
+    if not chunks:
+        return None
+    total = chunks[-1][1]
+    regions = matching_regions(chunks, load_index(), settings, exclude=_record_key(wav, settings))
+
+    reused, covered, sources = [], [], set()
+    records = {}
+    for start, end, key, delta in regions:
+        if (end - start) / SAMPLE_RATE < MIN_REUSE_SECONDS:
+            continue
+        if key not in records:
+            records[key] = _load_record(key)
+        record = records[key]
+        if record is None:
+            continue
+
+        # 旧文件中的区间（秒），文件开头/结尾以外的边界向内让出余量
+        lo = (start + delta) / SAMPLE_RATE + (REUSE_MARGIN if start > 0 else 0)
+        hi = (end + delta) / SAMPLE_RATE - (REUSE_MARGIN if end < total else 0)
+        offset = -delta / SAMPLE_RATE
+        inside = [_shift_times(segment, offset) for segment in record["segments"]
+                  if segment["start"] >= lo and segment["end"] <= hi]
+        if not inside:
+            continue
+        reused.extend(inside)
+        covered.append((inside[0]["start"], inside[-1]["end"]))
+        sources.add(key)
+
+    if sum(e - s for s, e in covered) < MIN_REUSE_SECONDS:
+        return None
+    return reused, covered, sources
+
+
+def gaps(covered, duration: float, min_gap: float = MIN_GAP_SECONDS):
+    """覆盖区间之外需要转录的部分"""
+    result = []
+    cursor = 0.0
+    for start, end in sorted(covered):
+        if start - cursor >= min_gap:
+            result.append((cursor, start))
+        cursor = max(cursor, end)
+    if duration - cursor >= min_gap:
+        result.append((cursor, duration))
+    return result
+
+
+def transcribe_incremental(asr, wav: Path, prompt: str, settings: str):
+    """
+    复用以前转录过的相同内容，只转录变化的部分
+
+    Args:
+        asr: ASR后端
+        settings: 转录设置的键（见 asr.settings_key）
+
+    Returns:
+        list: 片段；没有可以复用的内容时返回None
+    """
+    from .gate import SpeechMap
+    from .transcript import run_asr
+
+    wav = Path(wav)
+    found = plan(wav, settings)
+    if found is None:
+        return None
+    reused, covered, sources = found
+
+    duration = content_chunks(wav)[-1][1] / SAMPLE_RATE
+    todo = gaps(covered, duration)
+    kept = duration - sum(e - s for s, e in todo)
+    print(f"♻️  与 {len(sources)} 个已转录的文件相同: 复用 {kept:.0f}s / {duration:.0f}s，"
+          f"转录其余 {len(todo)} 段")
+
+    fresh = []
+    if todo:
+        speech_map = SpeechMap(todo, duration)
+        changed = wav.with_name(f"{wav.stem}_changed.wav")
+        speech_map.compact(wav, changed)
+        try:
+            fresh = speech_map.remap_segments(run_asr(asr, changed, prompt))
+        finally:
+            changed.unlink(missing_ok=True)
+
+    return sorted(reused + fresh, key=lambda segment: segment["start"])
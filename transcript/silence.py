@@ -0,0 +1,186 @@
+"""
+向量化的静音检测和整段录音的静音索引
+
+窗口能量用子帧求和加累积和计算（见 window_energy），不再逐窗口循环；
+静音段由掩码的差分一次找出。SilenceIndex 保存整段录音的静音区间及其平均
+能量，可以按时间范围查询：
+
+    index = SilenceIndex.from_audio(audio)
+    for start, end, energy in index.query(60, 120):
+        ...
+
+已经导入的媒体文件可以直接从导入阶段的能量包络建立索引（from_envelope），
+不需要再读音频。
+"""
+
+import math
+from pathlib import Path
+
+SAMPLE_RATE = 16000
+
+# 默认的静音判定参数（与 detect_silence_boundaries 相同）
+SILENCE_THRESHOLD = 0.01
+MIN_SILENCE_DURATION = 0.3
+
+
+def window_energy(audio, window: int, hop: int):
+    """
+    每个窗口的平均能量（与逐窗口计算 mean(audio[i:i+window] ** 2) 相同）
+
+    先按 gcd(window, hop) 大小的子帧分块求平方和（见 audio.frame_energy，
+    逐块处理，PCMBuffer也不会整段载入内存），再用子帧的累积和得到每个窗口
+    的和。窗口起点为 0, hop, 2*hop, ...，且 起点 < len(audio) - window。
+
+    Returns:
+        float64数组
+    """
+    import numpy as np
+
+    from .audio import frame_energy
+
+    count = len(range(0, len(audio) - window, hop))
+    if count <= 0:
+        return np.zeros(0, dtype=np.float64)
+
+    sub = math.gcd(window, hop)
+    sums = frame_energy(audio, sub).astype(np.float64) * sub
+    cumulative = np.concatenate([[0.0], np.cumsum(sums)])
+    starts = np.arange(count) * (hop // sub)
+    return (cumulative[starts + window // sub] - cumulative[starts]) / window
+
+
+def silent_runs(mask, include_trailing: bool = True):
+    """
+    掩码中连续为True的区间
+
+    Args:
+        include_trailing: 是否包含一直持续到结尾的区间
+
+    Returns:
+        tuple: (起始下标数组, 结束下标数组)，区间为 [start, end)
+    """
+    import numpy as np
+
+    padded = np.concatenate([[False], np.asarray(mask, dtype=bool), [False]])
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    if not include_trailing and len(ends) and ends[-1] == len(mask):
+        starts, ends = starts[:-1], ends[:-1]
+    return starts, ends
+
+
+class SilenceIndex:
+    """整段录音的静音区间 [(start, end, 平均能量)]，时间单位为秒"""
+
+    def __init__(self, starts, ends, energies, duration: float = None):
+        import numpy as np
+
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.energies = np.asarray(energies, dtype=np.float64)
+        self.duration = duration
+
+    @classmethod
+    def from_energy(cls, energy, hop_seconds: float, threshold: float = SILENCE_THRESHOLD,
+                    min_duration: float = MIN_SILENCE_DURATION, duration: float = None,
+                    include_trailing: bool = True):
+        """
+        从逐帧能量建立索引
+
+        Args:
+            energy: 每帧平均能量
+            hop_seconds: 相邻两帧起点的间隔（秒）
+            threshold: 低于此能量的帧视为静音
+            min_duration: 短于此时长的静音段忽略
+        """
+        import numpy as np
+
+        energy = np.asarray(energy, dtype=np.float64)
+        starts, ends = silent_runs(energy < threshold, include_trailing)
+        keep = (ends - starts) * hop_seconds >= min_duration - 1e-9
+        starts, ends = starts[keep], ends[keep]
+
+        cumulative = np.concatenate([[0.0], np.cumsum(energy)])
+        energies = (cumulative[ends] - cumulative[starts]) / np.maximum(ends - starts, 1)
+        return cls(starts * hop_seconds, ends * hop_seconds, energies, duration)
+
+    @classmethod
+    def from_audio(cls, audio, sample_rate: int = SAMPLE_RATE, threshold: float = SILENCE_THRESHOLD,
+                   min_duration: float = MIN_SILENCE_DURATION, window: float = 0.1,
+                   hop: float = 0.05):
+        """从float32数组或PCMBuffer建立索引（默认100ms窗口、50ms步长）"""
+        window_samples = int(window * sample_rate)
+        hop_samples = int(hop * sample_rate)
+        energy = window_energy(audio, window_samples, hop_samples)
+        return cls.from_energy(energy, hop_samples / sample_rate, threshold, min_duration,
+                               duration=len(audio) / sample_rate)
+
+    @classmethod
+    def from_envelope(cls, envelope, frame_seconds: float = 0.1,
+                      threshold: float = SILENCE_THRESHOLD,
+                      min_duration: float = MIN_SILENCE_DURATION):
+        """从导入阶段的能量包络（不重叠的帧）建立索引"""
+        return cls.from_energy(envelope, frame_seconds, threshold, min_duration,
+                               duration=len(envelope) * frame_seconds)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self):
+        return iter(zip(self.starts.tolist(), self.ends.tolist(), self.energies.tolist()))
+
+    def _range(self, start: float, end: float):
+        import numpy as np
+
+        # 区间按时间排列且互不重叠，结束时间同样有序
+        first = int(np.searchsorted(self.ends, start, side="right"))
+        last = int(np.searchsorted(self.starts, end, side="left"))
+        return first, max(first, last)
+
+    def query(self, start: float = 0.0, end: float = math.inf, clip: bool = False):
+        """
+        与 [start, end) 相交的静音区间
+
+        Args:
+            clip: 是否把区间裁剪到查询范围内
+
+        Returns:
+            list: [(start, end, energy)]
+        """
+        first, last = self._range(start, end)
+        result = []
+        for i in range(first, last):
+            s, e = float(self.starts[i]), float(self.ends[i])
+            if clip:
+                s, e = max(s, start), min(e, end)
+            result.append((s, e, float(self.energies[i])))
+        return result
+
+    def boundaries(self, start: float = 0.0, end: float = math.inf):
+        """范围内各静音区间的中点（适合作为切分点）"""
+        first, last = self._range(start, end)
+        mids = (self.starts[first:last] + self.ends[first:last]) / 2
+        return [float(t) for t in mids if start <= t < end]
+
+    def silence_in(self, start: float, end: float) -> float:
+        """[start, end) 内的静音总时长（秒）"""
+        return sum(e - s for s, e, _ in self.query(start, end, clip=True))
+
+    def is_silent(self, t: float) -> bool:
+        first, last = self._range(t, t)
+        return any(self.starts[i] <= t < self.ends[i] for i in range(first, min(last + 1, len(self))))
+
+    def save(self, path: Path):
+        import numpy as np
+
+        np.savez(path, starts=self.starts, ends=self.ends, energies=self.energies,
+                 duration=np.float64(self.duration if self.duration is not None else np.nan))
+
+    @classmethod
+    def load(cls, path: Path):
+        import numpy as np
+
+        with np.load(path) as data:
+            duration = float(data["duration"])
+            return cls(data["starts"], data["ends"], data["energies"],
+                       None if math.isnan(duration) else duration)
@@ -0,0 +1,167 @@
+"""
+全局CPU线程预算
+
+转录（CTranslate2）、对齐/说话人识别（torch）和ffmpeg编码如果各自按固定
+线程数运行，多个阶段或多个任务同时进行时会严重超订CPU。这里把本机可用的
+核数按权重分给当前正在运行的阶段：
+
+    with thread_lease("asr") as lease:
+        model = load(threads=lease.threads)
+
+每个租约在 $TRANSCRIPT_THREAD_DIR（默认 /tmp/transcript/threads）下登记一个
+文件，因此同一台机器上的多个进程（例如预加载工作进程池的各个worker）也能
+看到彼此。阶段开始/结束时租约文件随之增删，后续读取 lease.threads 得到的
+份额随之变化；torch可以在运行中调整线程数（lease.apply_torch()），
+CTranslate2和ffmpeg只能在启动时确定。
+
+总线程数默认为进程可用的CPU数，可通过 TRANSCRIPT_THREADS 覆盖。
+"""
+
+import itertools
+import json
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+# 各阶段的权重：转录是最耗CPU的阶段，分到两倍份额
+STAGE_WEIGHTS = {"asr": 2, "torch": 1, "ffmpeg": 1}
+
+_counter = itertools.count()
+
+
+def total_threads() -> int:
+    """返回可分配的总线程数"""
+    env_threads = os.environ.get("TRANSCRIPT_THREADS")
+    if env_threads:
+        return max(1, int(env_threads))
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Lease:
+    """一个阶段持有的线程份额"""
+
+    def __init__(self, budget, stage: str, weight: int, limit: int, path: Path):
+        self.budget = budget
+        self.stage = stage
+        self.weight = weight
+        self.limit = limit
+        self.path = path
+        self._torch_threads = None
+
+    @property
+    def threads(self) -> int:
+        """按当前活跃的租约重新计算的份额"""
+        return self.budget._share(self.weight, self.limit, registered=True)
+
+    def apply_torch(self) -> int:
+        """把torch线程数调整为当前份额（未导入torch时什么也不做）"""
+        threads = self.threads
+        torch = sys.modules.get("torch")
+        if torch is not None and threads != self._torch_threads:
+            torch.set_num_threads(threads)
+            self._torch_threads = threads
+        return threads
+
+    def release(self):
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+class ThreadBudget:
+    """按阶段权重在所有活跃租约之间分配CPU线程"""
+
+    def __init__(self, total: int = None, state_dir: Path = None):
+        self.total = total or total_threads()
+        self.state_dir = Path(state_dir or os.environ.get(
+            "TRANSCRIPT_THREAD_DIR", "/tmp/transcript/threads"))
+
+    def active(self):
+        """返回活跃租约 [{pid, stage, weight}]，顺便清理已退出进程留下的文件"""
+        leases = []
+        try:
+            paths = list(self.state_dir.glob("*.json"))
+        except OSError:
+            return leases
+
+        for path in paths:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    lease = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not _pid_alive(lease.get("pid", 0)):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+                continue
+            leases.append(lease)
+        return leases
+
+    def _share(self, weight: int, limit: int = None, registered: bool = False) -> int:
+        total_weight = sum(lease.get("weight", 1) for lease in self.active())
+        if not registered:
+            total_weight += weight
+        share = max(1, self.total * weight // max(total_weight, weight))
+        return min(share, limit) if limit else share
+
+    def share(self, stage: str, limit: int = None) -> int:
+        """假如现在开始stage阶段，能分到的线程数（不登记）"""
+        return self._share(STAGE_WEIGHTS.get(stage, 1), limit)
+
+    @contextmanager
+    def lease(self, stage: str, limit: int = None):
+        """
+        登记一个阶段，退出时释放
+
+        Args:
+            stage: "asr" / "torch" / "ffmpeg"
+            limit: 份额上限（例如校准得到的最优线程数）
+        """
+        weight = STAGE_WEIGHTS.get(stage, 1)
+        path = self.state_dir / f"{os.getpid()}-{next(_counter)}-{stage}.json"
+        try:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"pid": os.getpid(), "stage": stage, "weight": weight}, f)
+        except OSError as e:
+            # 无法登记时仍然给出份额，只是其它进程看不到这个阶段
+            print(f"⚠️ 无法登记线程租约: {e}")
+
+        lease = Lease(self, stage, weight, limit, path)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+
+_budget = None
+
+
+def get_budget() -> ThreadBudget:
+    """返回进程级共享的线程预算"""
+    global _budget
+    if _budget is None:
+        _budget = ThreadBudget()
+    return _budget
+
+
+def thread_lease(stage: str, limit: int = None):
+    """get_budget().lease() 的简写"""
+    return get_budget().lease(stage, limit)
@@ -32,23 +32,23 @@ from subprocess import PIPE, STDOUT, Popen
 from typing import Any, List, Tuple
 
 # fire已移除，使用CLI接口
-import jieba
-import opencc
-import pysubs2
+# jieba/opencc/pysubs2/whisperx 均在函数内按需导入：whisperx会连带导入torch，
+# 放在模块顶层会让 `transcript resume`、`transcript status` 等不需要ASR的命令
+# 在启动时白白等待数秒。
 
 # from pywhispercpp.model import Model
 
 
 warnings.filterwarnings("ignore")
 
-import whisperx
-
 
 def detect_optimal_device_config():
-    """检测并配置最优的设备和计算类型（专为M1/M4优化）"""
+    """检测并配置最优的设备和计算类型（Apple M1-M4按芯片型号，Linux按实测校准）"""
     import platform
     import subprocess
 
+    from .threads import total_threads
+
     # 首先检查是否有环境变量覆盖
     env_device = os.environ.get('WHISPERX_DEVICE')
     env_compute_type = os.environ.get('WHISPERX_COMPUTE_TYPE')
@@ -109,11 +109,30 @@ def detect_optimal_device_config():
             os.environ.setdefault('WHISPERX_CHUNK_SIZE', '5')  # 减小chunk_size以获得更短的片段
 
         # 通用Apple优化
-        os.environ.setdefault('OMP_NUM_THREADS', '8')
-        os.environ.setdefault('MKL_NUM_THREADS', '8')
+        # 只是库初始化时的上限，运行时由线程预算按阶段分配
+        total = str(total_threads())
+        os.environ.setdefault('OMP_NUM_THREADS', total)
+        os.environ.setdefault('MKL_NUM_THREADS', total)
+
+    elif system == "Linux":
+        # Linux服务器：按CPU/内存探测并实测校准，结果缓存在磁盘上
+        from .hardware import tune
+
+        profile = tune()
+        device = profile["device"]
+        compute_type = profile["compute_type"]
+        threads = str(profile["threads"])
+        print(f"⚡ Linux {machine}: compute_type={compute_type}, threads={threads}, "
+              f"batch_size={profile['batch_size']}"
+              + ("（已校准）" if profile.get("calibrated") else "（默认）"))
+        os.environ.setdefault('WHISPERX_THREADS', threads)
+        os.environ.setdefault('WHISPERX_BATCH_SIZE', str(profile['batch_size']))
+        os.environ.setdefault('WHISPERX_CHUNK_SIZE', '5')  # 减小chunk_size以获得更短的片段
+        os.environ.setdefault('OMP_NUM_THREADS', threads)
+        os.environ.setdefault('MKL_NUM_THREADS', threads)
 
     else:
-        # 非Apple Silicon系统
+        # 其它系统
         device = "cpu"
         compute_type = "int8"
         os.environ.setdefault('WHISPERX_BATCH_SIZE', '8')
@@ -126,14 +145,25 @@ def detect_optimal_device_config():
 os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'
 os.environ['PYTORCH_MPS_HIGH_WATERMARK_RATIO'] = '0.0'
 
-# 在模块加载时检测最优配置
-optimal_device, optimal_compute_type = detect_optimal_device_config()
+# 设备配置在第一次真正需要ASR时才检测，见 get_device_config()
+_device_config = None
+
+
+def get_device_config():
+    """返回 (device, compute_type)，首次调用时检测并缓存"""
+    global _device_config
+    if _device_config is None:
+        device, compute_type = detect_optimal_device_config()
+
+        # 再次确保设备配置为CPU（防止任何MPS相关问题）
+        if device == "mps":
+            print("⚠️ 检测到MPS设备配置，强制切换到CPU以确保兼容性")
+            device = "cpu"
+            compute_type = "int8"
+
+        _device_config = (device, compute_type)
+    return _device_config
 
-# 再次确保设备配置为CPU（防止任何MPS相关问题）
-if optimal_device == "mps":
-    print("⚠️ 检测到MPS设备配置，强制切换到CPU以确保兼容性")
-    optimal_device = "cpu"
-    optimal_compute_type = "int8"
 
 # 使用更不容易被误识别的prompt
 prompt = "以下是中文音频转录："
@@ -151,6 +181,141 @@ model_dir = os.path.join(hf_home, "hub")
 whisperx_model = "large-v2"  # 支持中文的whisper模型
 w2v_model = "jonatasgrosman/wav2vec2-large-xlsr-53-chinese-zh-cn"  # 中文对齐模型
 
+# 对齐固定使用CPU：Mac ARM上MPS支持不完整，其它平台保持兼容性
+align_device = "cpu"
+
+
+def load_align_model():
+    """
+    从模型注册表获取中文wav2vec2对齐模型，同一进程内只加载一次
+
+    Returns:
+        tuple: (model_a, metadata)
+    """
+    from .models import ModelKey, get_registry
+
+    key = ModelKey(w2v_model, align_device, "float32")
+    return get_registry().get(key, _load_align_model)
+
+
+def _load_align_model():
+    """加载中文wav2vec2对齐模型"""
+    import whisperx
+
+    from .resolver import resolve
+
+    # 加载对齐模型
+    print("加载对齐模型...")
+
+    local_snapshot = resolve("align")
+    if local_snapshot is not None:
+        print(f"使用本地模型: {local_snapshot}")
+        model_name = str(local_snapshot)
+        # 本地文件完整，禁止联网检查更新
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+        os.environ["HF_HUB_OFFLINE"] = "1"
+    else:
+        model_name = w2v_model
+        print(f"使用默认模型名称: {model_name}")
+        print("💡 运行 'transcript models preload' 可预先下载并固定模型文件")
+
+    try:
+        # 使用HF_HOME作为缓存目录
+        model_a, metadata = whisperx.load_align_model(
+            language_code="zh",
+            device=align_device,
+            model_name=model_name,
+            model_dir=hf_home
+        )
+        print("对齐模型加载成功")
+    except Exception as model_error:
+        print(f"模型加载失败: {model_error}")
+        raise
+
+    return model_a, metadata
+
+
+# 对齐时每组字幕覆盖的最长音频（秒）
+ALIGN_WINDOW_SECONDS = 600
+
+# 每组音频在首尾字幕之外多取的余量（秒）
+ALIGN_MARGIN_SECONDS = 1.0
+
+
+def _shift_times(item: dict, offset: float) -> dict:
+    """返回时间戳整体平移后的片段副本（包括words/chars）"""
+    shifted = dict(item)
+    for key in ("start", "end"):
+        if shifted.get(key) is not None:
+            shifted[key] = shifted[key] + offset
+    for child in ("words", "chars"):
+        if shifted.get(child):
+            shifted[child] = [_shift_times(x, offset) for x in shifted[child]]
+    return shifted
+
+
+def align_groups(segments, window: float = None):
+    """把按时间排列的字幕分组，每组跨度不超过window秒（单条过长的字幕单独成组）"""
+    window = window or ALIGN_WINDOW_SECONDS
+    groups, current = [], []
+    for segment in segments:
+        if current and segment["end"] - current[0]["start"] > window:
+            groups.append(current)
+            current = []
+        current.append(segment)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def align_segments(segments, audio_path: Path, align_model=None):
+    """
+    使用wav2vec2模型将字幕段落对齐到音频
+
+    每条字幕只依赖自己时间范围内的音频，因此按组读取音频窗口、把时间戳
+    平移到窗口内对齐后再平移回来，不需要把整段音频解码到内存。
+
+    Args:
+        segments: 字幕段落列表（start/end为秒）
+        audio_path: 16kHz单声道音频文件
+        align_model: 已加载的 (model_a, metadata)，为None时现场加载
+
+    Returns:
+        list: 对齐后的段落列表
+    """
+    import whisperx
+
+    from .audio import PCMBuffer, load_pcm
+    from .threads import thread_lease
+
+    print("加载音频...")
+    audio = load_pcm(audio_path)
+
+    if align_model is None:
+        align_model = load_align_model()
+    model_a, metadata = align_model
+
+    # 执行对齐
+    print(f"对齐 {len(segments)} 个字幕段落...")
+    if not isinstance(audio, PCMBuffer):
+        with thread_lease("torch") as lease:
+            lease.apply_torch()
+            aligned_result = whisperx.align(segments, model_a, metadata, audio, align_device)
+        return aligned_result.get("segments") or []
+
+    aligned = []
+    with thread_lease("torch") as lease:
+        for group in align_groups(segments):
+            lease.apply_torch()
+            offset = max(0.0, group[0]["start"] - ALIGN_MARGIN_SECONDS)
+            window = audio.window(offset, group[-1]["end"] + ALIGN_MARGIN_SECONDS)
+            local = [_shift_times(segment, -offset) for segment in group]
+            result = whisperx.align(local, model_a, metadata, window, align_device)
+            aligned.extend(_shift_times(segment, offset)
+                           for segment in result.get("segments") or [])
+    return aligned
+
+
 def align_subtitles_with_audio(video: Path, original_srt: Path, aligned_srt: Path):
     """
     使用 whisperx 对齐字幕文件与音频。
@@ -161,6 +326,12 @@ def align_subtitles_with_audio(video: Path, original_srt: Path, aligned_srt: Pat
         original_srt: 原始字幕文件路径
         aligned_srt: 对齐后的字幕文件路径
     """
+    import pysubs2
+
+    from .daemon import request as daemon_request
+    from .ingest import audio_path as ingested_audio
+    from .ingest import ingest as media_ingest
+
     print(f"开始字幕对齐: {original_srt} -> {aligned_srt}")
 
     try:
@@ -170,23 +341,10 @@ def align_subtitles_with_audio(video: Path, original_srt: Path, aligned_srt: Pat
         if not Path(original_srt).exists():
             raise FileNotFoundError(f"字幕文件不存在: {original_srt}")
 
-        # 创建专用的16kHz单声道音频文件用于对齐（不覆盖原文件）
+        # 导入合并后的视频：一次解码得到对齐用的16kHz单声道音频（不覆盖原文件）
         video_path = Path(video)
-        audio_path = video_path.parent / f"{video_path.stem}_alignment.wav"
-        print(f"📝 为对齐创建16kHz单声道音频: {audio_path.name}")
-        ensure_16khz_mono_wav(video_path, audio_path, force_convert=True)
-
-        # 设置设备 - Mac ARM优化
-        import platform
-        if platform.system() == "Darwin" and platform.machine() == "arm64":
-            # Mac ARM架构，使用CPU
-            device = "cpu"
-            print("检测到Mac ARM架构，使用CPU进行对齐")
-        else:
-            device = "cpu"  # 保持兼容性
-
-        print("加载音频...")
-        audio = whisperx.load_audio(str(audio_path))
+        audio_path = ingested_audio(media_ingest(video_path))
+        print(f"📝 对齐使用16kHz单声道音频: {audio_path}")
 
         # 加载字幕文件
         print("加载字幕文件...")
@@ -212,48 +370,12 @@ def align_subtitles_with_audio(video: Path, original_srt: Path, aligned_srt: Pat
             shutil.copy2(original_srt, aligned_srt)
             return
 
-        # 设置离线模式环境变量
-        import os
-        os.environ["TRANSFORMERS_OFFLINE"] = "1"
-        os.environ["HF_HUB_OFFLINE"] = "1"
-
-        # 加载对齐模型
-        print("加载对齐模型...")
-        model_name = None
-
-        # 尝试使用HF_HOME缓存路径
-        local_model_path = Path(model_dir) / "models--jonatasgrosman--wav2vec2-large-xlsr-53-chinese-zh-cn"
-        if local_model_path.exists():
-            snapshots_dir = local_model_path / "snapshots"
-            if snapshots_dir.exists():
-                snapshot_dirs = [d for d in snapshots_dir.iterdir() if d.is_dir()]
-                if snapshot_dirs:
-                    latest_snapshot = max(snapshot_dirs, key=lambda x: x.stat().st_mtime)
-                    print(f"使用本地模型: {latest_snapshot}")
-                    model_name = str(latest_snapshot)
-
-        if model_name is None:
-            model_name = w2v_model
-            print(f"使用默认模型名称: {model_name}")
+        # 优先使用常驻模型守护进程，未运行时在进程内加载模型
+        aligned_segments = daemon_request("align", segments=segments, audio=str(audio_path))
+        if aligned_segments is None:
+            aligned_segments = align_segments(segments, audio_path)
 
-        try:
-            # 使用HF_HOME作为缓存目录
-            model_a, metadata = whisperx.load_align_model(
-                language_code="zh",
-                device=device,
-                model_name=model_name,
-                model_dir=hf_home
-            )
-            print("对齐模型加载成功，开始对齐...")
-        except Exception as model_error:
-            print(f"模型加载失败: {model_error}")
-            raise
-
-        # 执行对齐
-        print(f"对齐 {len(segments)} 个字幕段落...")
-        aligned_result = whisperx.align(segments, model_a, metadata, audio, device)
-
-        if "segments" not in aligned_result or not aligned_result["segments"]:
+        if not aligned_segments:
             print("警告: 对齐结果为空")
             shutil.copy2(original_srt, aligned_srt)
             return
@@ -261,7 +383,7 @@ def align_subtitles_with_audio(video: Path, original_srt: Path, aligned_srt: Pat
         # 创建对齐后的字幕
         aligned_subs = pysubs2.SSAFile()
 
-        for i, segment in enumerate(aligned_result["segments"]):
+        for i, segment in enumerate(aligned_segments):
             if "start" in segment and "end" in segment and "text" in segment:
                 event = pysubs2.SSAEvent()
                 event.start = int(segment["start"] * 1000)  # 转换为毫秒
@@ -342,11 +464,14 @@ def transcript_cpp(input_audio: Path, output_srt: Path, prompt: str, dry_run=Fal
         print("试运行模式，跳过实际转录")
         return
 
+    from .threads import thread_lease
+
     whisper = os.path.join(cpp_path, "whisper-cli")
-    cmd = f"{whisper} {input_audio} -l zh -sow -ml 30 -t 8 -m {cpp_model} -osrt -of {output_srt.with_suffix('')} --prompt '{prompt}'"
 
     try:
-        execute(cmd)
+        with thread_lease("asr", limit=asr_thread_limit()) as lease:
+            cmd = f"{whisper} {input_audio} -l zh -sow -ml 30 -t {lease.threads} -m {cpp_model} -osrt -of {output_srt.with_suffix('')} --prompt '{prompt}'"
+            execute(cmd)
     except Exception as e:
         print(f"❌ whisper.cpp转录失败: {e}")
         raise
@@ -361,6 +486,8 @@ def create_speaker_text_file(srt_file: Path, output_txt: Path):
         srt_file: 输入的SRT字幕文件
         output_txt: 输出的文本文件路径
     """
+    import pysubs2
+
     try:
         subs = pysubs2.load(str(srt_file))
 
@@ -393,6 +520,8 @@ def create_clean_srt_file(srt_file: Path, output_srt: Path):
         srt_file: 输入的SRT字幕文件（可能包含说话人标识）
         output_srt: 输出的干净SRT文件路径
     """
+    import pysubs2
+
     try:
         subs = pysubs2.load(str(srt_file))
         clean_subs = pysubs2.SSAFile()
@@ -438,6 +567,7 @@ def init_jieba():
     Returns:
         tuple: (replace_map, warning_words) - 替换词典和警告词列表
     """
+    import jieba
     import yaml
 
     replace_map = {}
@@ -491,254 +621,708 @@ def init_jieba():
     return replace_map, warning_words
 
 
-def transcriptx(input_audio: Path, output_srt: Path, prompt: str):
-    """使用whisperx进行音频转录，支持Apple Silicon优化"""
-    print(f"使用whisperx转录音频: {input_audio} -> {output_srt}")
+def asr_thread_limit():
+    """转录线程数上限（WHISPERX_THREADS，Linux上由硬件校准给出），未设置时返回None"""
+    threads = os.environ.get('WHISPERX_THREADS')
+    return int(threads) if threads else None
+
+
+def load_whisperx_model(prompt: str, threads: int = None):
+    """
+    从模型注册表获取whisperx转录模型，同一进程内只加载一次
+
+    CTranslate2的线程数在加载时确定，之后无法调整，因此注册表的key包含线程
+    数：在CPU上，已加载模型的线程数超过当前份额（会超订CPU）或不到份额的
+    一半（浪费空闲的核）时，释放旧模型并按当前份额重新加载。
+
+    Args:
+        prompt: 转录提示词
+        threads: CTranslate2线程数，为None时取线程预算中转录阶段的份额
+    """
+    from .models import ModelKey, get_registry
+    from .threads import get_budget
 
     # 使用检测到的最优配置
-    device = optimal_device
-    compute_type = optimal_compute_type
+    device, compute_type = get_device_config()
+    if threads is None:
+        threads = get_budget().share("asr", limit=asr_thread_limit())
 
     print(f"🎯 使用设备配置: {device} (compute_type: {compute_type})")
 
+    registry = get_registry()
+    for loaded in registry.keys():
+        if loaded[:3] != (whisperx_model, device, compute_type) or loaded.variant[0] != prompt:
+            continue
+        loaded_threads = loaded.variant[1]
+        # GPU推理不受CPU线程数影响，直接复用
+        if device != "cpu" or loaded_threads <= threads < loaded_threads * 2:
+            threads = loaded_threads
+            break
+        print(f"🔧 转录线程份额 {loaded_threads} -> {threads}，重新加载whisperx模型")
+        registry.evict(loaded)
+
+    key = ModelKey(whisperx_model, device, compute_type, variant=(prompt, threads))
+    # CTranslate2在加载时创建工作线程，fork后的子进程需要重新加载
+    return registry.get(
+        key, lambda: _load_whisperx_model(prompt, device, compute_type, threads),
+        fork_safe=False
+    )
+
+
+def _load_whisperx_model(prompt: str, device: str, compute_type: str, threads: int):
+    """加载whisperx转录模型，加载失败时降级为base模型"""
+    import whisperx
+
+    from .resolver import resolve
+
+    options = {"initial_prompt": prompt}
+    print("加载whisperx模型...")
     try:
-        options = {"initial_prompt": prompt}
-        print("加载whisperx模型...")
-        try:
-            # 使用HF_HOME环境变量设置的缓存目录
-            download_root = hf_home
+        # 使用HF_HOME环境变量设置的缓存目录
+        download_root = hf_home
+
+        # 本地已有完整快照时直接按路径加载，不再联网查询
+        local_snapshot = resolve("whisper")
+        if local_snapshot is not None:
+            whisper_arch = str(local_snapshot)
+            local_files_only = True
+        else:
+            whisper_arch = whisperx_model
             local_files_only = os.environ.get('HF_HUB_OFFLINE', '0') == '1'
 
-            print(f"🔧 模型缓存目录: {download_root}")
-            print(f"🔧 离线模式: {local_files_only}")
+        print(f"🔧 模型: {whisper_arch}")
+        print(f"🔧 模型缓存目录: {download_root}")
+        print(f"🔧 离线模式: {local_files_only}")
+        print(f"🔧 线程数: {threads}")
 
+        model = whisperx.load_model(
+            whisper_arch,
+            device=device,
+            compute_type=compute_type,
+            asr_options=options,
+            language="zh",
+            threads=threads,
+            download_root=download_root,
+            local_files_only=local_files_only
+        )
+    except Exception as model_error:
+        print(f"⚠️ 加载whisperx模型失败: {model_error}")
+        print("尝试使用本地模型或降级模型...")
+        # 尝试使用更简单的模型
+        try:
             model = whisperx.load_model(
-                whisperx_model,
+                "base",  # 使用基础模型
                 device=device,
                 compute_type=compute_type,
                 asr_options=options,
                 language="zh",
-                threads=8,
-                download_root=download_root,
-                local_files_only=local_files_only
+                threads=threads,
+                local_files_only=False
             )
-        except Exception as model_error:
-            print(f"⚠️ 加载whisperx模型失败: {model_error}")
-            print("尝试使用本地模型或降级模型...")
-            # 尝试使用更简单的模型
+            print("✅ 成功加载基础模型")
+        except Exception as fallback_error:
+            print(f"❌ 基础模型也加载失败: {fallback_error}")
+            raise model_error
+
+    return model
+
+
+# 长音频按窗口依次转录（秒），批大小回退后只需重试当前窗口
+ASR_WINDOW_SECONDS = 600
+
+# 在目标切分点前后多少秒内寻找最安静的位置
+ASR_BOUNDARY_SEARCH = 30
+
+
+def is_out_of_memory(error: Exception) -> bool:
+    """判断异常是否为内存分配失败（CTranslate2以RuntimeError报告bad_alloc）"""
+    if isinstance(error, MemoryError):
+        return True
+    message = str(error).lower()
+    return any(key in message for key in ("out of memory", "bad_alloc", "cannot allocate"))
+
+
+def _quiet_cut(energy, lo: int, hi: int, target: int) -> int:
+    """在 energy[lo:hi] 中选择最安静的帧，同样安静时取离target最近的"""
+    import numpy as np
+
+    if hi <= lo:
+        return target
+    quiet = np.flatnonzero(energy[lo:hi] == energy[lo:hi].min()) + lo
+    return int(quiet[np.argmin(np.abs(quiet - target))])
+
+
+def asr_windows(audio, window: float = None, search: float = ASR_BOUNDARY_SEARCH,
+                sample_rate=16000, energy=None, timeline=None):
+    """
+    把音频切成约window秒的窗口，切分点选在目标位置附近能量最低处
+
+    Args:
+        energy: 预先算好的每0.1秒一帧的能量（例如导入阶段的能量包络），
+            为None时从音频计算
+        timeline: VAD时间线（见 vad.VADTimeline），给出时优先切在最近的
+            停顿中点，搜索范围内没有停顿时再按能量选择
+
+    Returns:
+        list: [(start_sample, end_sample)]
+    """
+    from .audio import frame_energy
+
+    total = len(audio)
+    window_samples = int((window or ASR_WINDOW_SECONDS) * sample_rate)
+    if total <= window_samples:
+        return [(0, total)]
+
+    frame = sample_rate // 10
+    n_frames = total // frame
+    if energy is not None and len(energy) < n_frames:
+        energy = None
+
+    bounds = []
+    start = 0
+    search_frames = int(search * 10)
+    while total - start > window_samples:
+        target = (start + window_samples) // frame
+        # 窗口至少保留一半长度，避免搜索范围大于窗口时切出过短的窗口
+        lo = max(start // frame + window_samples // frame // 2, target - search_frames)
+        hi = min(n_frames, target + search_frames)
+
+        cut = None
+        if timeline is not None:
+            seconds = frame / sample_rate
+            pause = timeline.nearest_pause(target * seconds, search, lo * seconds, hi * seconds)
+            if pause is not None:
+                cut = int(pause * sample_rate)
+        if cut is None:
+            if energy is None:
+                energy = frame_energy(audio, frame)
+            cut = _quiet_cut(energy, lo, hi, target) * frame
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, total))
+    return bounds
+
+
+def stream_windows(chunks, window: float = None, search: float = ASR_BOUNDARY_SEARCH,
+                   sample_rate=16000):
+    """
+    asr_windows 的流式版本：从解码器逐块接收音频，攒够一个窗口加搜索余量
+    后立即切出窗口，不必等整段音频解码完成
+
+    Args:
+        chunks: 产生float32数组的可迭代对象（例如 audio.stream_pcm()）
+
+    Yields:
+        tuple: (start_sample, float32窗口)
+    """
+    import numpy as np
+
+    from .audio import frame_energy
+
+    window_samples = int((window or ASR_WINDOW_SECONDS) * sample_rate)
+    frame = sample_rate // 10
+    search_frames = int(search * 10)
+    lookahead = window_samples + search_frames * frame
+
+    pending = np.zeros(0, dtype=np.float32)
+    start = 0
+    for chunk in chunks:
+        pending = np.concatenate([pending, chunk])
+        while len(pending) >= lookahead:
+            energy = frame_energy(pending, frame)
+            target = window_samples // frame
+            lo = max(window_samples // frame // 2, target - search_frames)
+            hi = min(len(energy), target + search_frames)
+            cut = _quiet_cut(energy, lo, hi, target) * frame
+            yield start, pending[:cut]
+            pending = pending[cut:]
+            start += cut
+
+    # 剩余部分不超过一个窗口加搜索余量，按非流式规则切分
+    for begin, end in asr_windows(pending, window, search, sample_rate):
+        if end > begin:
+            yield start + begin, pending[begin:end]
+
+
+def transcribe_windows(model, windows, batch_size: int, chunk_size: int, sample_rate=16000,
+                       timeline=None):
+    """
+    依次转录 (start_sample, float32窗口)，内存不足时批大小减半并重试当前窗口
+
+    每个窗口开始前按可用内存重新估算批大小（不超过当前值），已完成的窗口
+    不会重做。给出VAD时间线且设置了 TRANSCRIPT_BUCKET_BATCH=1 时，窗口内的语音
+    片段按时长分桶组批（见 batching）。
+
+    Returns:
+        tuple: (segments, effective_batch_size)
+    """
+    import gc
+
+    from . import batching
+    from .hardware import batch_size_for_memory
+
+    batch = batch_size_for_memory(batch_size)
+    if batch < batch_size:
+        print(f"🔧 可用内存有限，batch_size {batch_size} -> {batch}")
+
+    segments = []
+    for i, (start, samples) in enumerate(windows, 1):
+        batch = min(batch, batch_size_for_memory(batch_size))
+        offset = start / sample_rate
+        print(f"🎧 转录窗口 {i}: {offset:.0f}s - "
+              f"{offset + len(samples) / sample_rate:.0f}s (batch_size={batch})")
+
+        spans = None
+        if timeline is not None and batching.enabled():
+            speech = timeline.speech_in(offset, offset + len(samples) / sample_rate)
+            spans = batching.merge_spans([(s - offset, e - offset) for s, e in speech], chunk_size)
+
+        while True:
             try:
-                model = whisperx.load_model(
-                    "base",  # 使用基础模型
-                    device=device,
-                    compute_type=compute_type,
-                    asr_options=options,
-                    language="zh",
-                    threads=8,
-                    local_files_only=False
-                )
-                print("✅ 成功加载基础模型")
-            except Exception as fallback_error:
-                print(f"❌ 基础模型也加载失败: {fallback_error}")
-                raise model_error
-
-        print("加载音频文件...")
-        audio = whisperx.load_audio(str(input_audio))
+                result = None
+                if spans:
+                    bucketed = batching.transcribe_bucketed(model, samples, spans, batch, sample_rate)
+                    if bucketed is not None:
+                        result = {"segments": bucketed}
+                if result is None:
+                    result = model.transcribe(
+                        samples, language="zh", print_progress=True,
+                        batch_size=batch, chunk_size=chunk_size
+                    )
+                break
+            except Exception as e:
+                if not is_out_of_memory(e) or batch <= 1:
+                    raise
+                gc.collect()
+                batch = max(1, batch // 2)
+                print(f"⚠️ 内存不足，batch_size减半为 {batch}，重试当前窗口: {e}")
+
+        for segment in result.get("segments") or []:
+            segment["start"] += offset
+            segment["end"] += offset
+            for word in segment.get("words") or []:
+                for key in ("start", "end"):
+                    if key in word:
+                        word[key] += offset
+            segments.append(segment)
+
+    print(f"🔧 实际使用 batch_size={batch}")
+    return segments, batch
+
+
+def transcribe_array(model, audio, batch_size: int, chunk_size: int, sample_rate=16000,
+                     energy=None, timeline=None):
+    """
+    分窗口转录音频（float32数组或PCMBuffer），见 transcribe_windows
+
+    Returns:
+        tuple: (segments, effective_batch_size)
+    """
+    windows = ((start, audio[start:end])
+               for start, end in asr_windows(audio, sample_rate=sample_rate, energy=energy,
+                                             timeline=timeline))
+    return transcribe_windows(model, windows, batch_size, chunk_size, sample_rate,
+                              timeline=timeline)
+
+
+def whisperx_transcribe(input_audio: Path, prompt: str, model=None):
+    """
+    使用whisperx转录16kHz单声道音频
+
+    Args:
+        input_audio: 输入音频文件路径
+        prompt: 转录提示词
+        model: 已加载的whisperx模型，为None时现场加载
+
+    Returns:
+        tuple: (segments, audio) - 转录片段列表和音频（PCMBuffer）
+    """
+    from .audio import load_pcm
+    from .ingest import find_envelope
+    from .threads import thread_lease
+    from .vad import try_get_timeline
+
+    print("加载音频文件...")
+    # 内存映射，每个转录窗口只解码自己的一段
+    audio = load_pcm(input_audio)
+    # 窗口切在VAD时间线的停顿处（时间线缓存后供说话人分离等阶段共用），
+    # 没有停顿时用导入阶段算好的能量包络
+    energy = find_envelope(input_audio)
+    timeline = try_get_timeline(input_audio)
+
+    # 从环境变量获取批处理配置；batch_size是上限，实际值按可用内存调整
+    batch_size = int(os.environ.get('WHISPERX_BATCH_SIZE', '8'))
+    chunk_size = int(os.environ.get('WHISPERX_CHUNK_SIZE', '10'))
+
+    with thread_lease("asr", limit=asr_thread_limit()) as lease:
+        if model is None:
+            model = load_whisperx_model(prompt, threads=lease.threads)
 
         print("开始转录...")
+        print(f"🔧 转录参数: batch_size<={batch_size}, chunk_size={chunk_size}")
 
-        # 从环境变量获取批处理配置
-        batch_size = int(os.environ.get('WHISPERX_BATCH_SIZE', '8'))
-        chunk_size = int(os.environ.get('WHISPERX_CHUNK_SIZE', '10'))
+        segments, _ = transcribe_array(model, audio, batch_size, chunk_size,
+                                       energy=energy, timeline=timeline)
 
-        print(f"🔧 转录参数: batch_size={batch_size}, chunk_size={chunk_size}")
+    return segments, audio
 
-        result = model.transcribe(
-            audio, language="zh", print_progress=True,
-            batch_size=batch_size, chunk_size=chunk_size
-        )
 
-        if "segments" not in result or not result["segments"]:
-            print("⚠️ 转录结果为空，创建空字幕文件")
-            # 创建一个空的字幕文件
-            empty_subs = pysubs2.SSAFile()
-            empty_subs.save(str(output_srt))
-        else:
-            print(f"转录完成，共 {len(result['segments'])} 个片段")
-            subs = pysubs2.load_from_whisper(result["segments"])
-            subs.save(str(output_srt))
-            print(f"字幕文件已保存: {output_srt}")
+def whisperx_transcribe_stream(source: Path, prompt: str, tee: Path = None, model=None):
+    """
+    边解码边转录：ffmpeg把媒体文件解码为PCM写入管道，攒够一个窗口就开始
+    转录，不需要先写出再读回完整的WAV。解码过程同时完成媒体导入（能量
+    包络、关键帧、元数据，见 ingest.ingest_stream）
 
-    except Exception as e:
-        print(f"❌ whisperx转录失败: {e}")
-        # 创建一个空的字幕文件以避免后续错误
-        print("创建空字幕文件以避免后续错误...")
-        empty_subs = pysubs2.SSAFile()
-        empty_subs.save(str(output_srt))
-        raise
-    # 2. Align whisper output
-    # model_a, metadata = whisperx.load_align_model(
-    #     language_code=result["language"], device=device, model_name = w2v_model
-    # )
-    # result = whisperx.align(
-    #     result["segments"],
-    #     model_a,
-    #     metadata,
-    #     audio,
-    #     device,
-    #     return_char_alignments=False,
-    # )
-
-    # print(result["segments"])  # after alignment
+    Args:
+        source: 任意音视频文件
+        prompt: 转录提示词
+        tee: 同时写出的16kHz单声道WAV（供说话人分离和对齐使用）
+        model: 已加载的whisperx模型，为None时现场加载
 
+    Returns:
+        list: 转录片段
+    """
+    from contextlib import closing
 
-def transcriptx_with_diarization(input_audio: Path, output_srt: Path, prompt: str):
-    """使用whisperx进行音频转录，支持说话人分离和Apple Silicon优化"""
-    print(f"使用whisperx转录音频（含说话人分离）: {input_audio} -> {output_srt}")
-    print("🎭 启用说话人分离功能")
+    from .ingest import ingest_stream
+    from .threads import thread_lease
 
-    # 使用检测到的最优配置
-    device = optimal_device
-    compute_type = optimal_compute_type
+    batch_size = int(os.environ.get('WHISPERX_BATCH_SIZE', '8'))
+    chunk_size = int(os.environ.get('WHISPERX_CHUNK_SIZE', '10'))
 
-    print(f"🎯 使用设备配置: {device} (compute_type: {compute_type})")
+    # 解码和转录同时进行：先登记两个租约再确定各自的线程数，两者之和不超过
+    # 线程预算（转录的份额在加载模型时就固定了）
+    with thread_lease("asr", limit=asr_thread_limit()) as lease, \
+            thread_lease("ffmpeg") as decoder:
+        if model is None:
+            model = load_whisperx_model(prompt, threads=lease.threads)
+
+        print(f"🎬 流式解码并转录: {source}")
+        print(f"🔧 转录参数: batch_size<={batch_size}, chunk_size={chunk_size}")
+        # closing: 转录出错时立即结束ffmpeg进程
+        with closing(ingest_stream(source, tee=tee, threads=decoder.threads)) as chunks:
+            segments, _ = transcribe_windows(model, stream_windows(chunks),
+                                             batch_size, chunk_size)
+    return segments
+
+
+def diarize_segments(segments, input_audio: Path):
+    """
+    说话人分离阶段：为任意ASR后端产出的片段标注说话人
+
+    优先使用常驻模型守护进程；失败时回退为不带说话人标识的字幕。
+
+    Returns:
+        pysubs2.SSAFile
+    """
+    import pysubs2
+
+    from .daemon import request as daemon_request
 
     try:
-        options = {"initial_prompt": prompt}
-        print("加载whisperx模型...")
+        print("🔄 开始说话人分离...")
+
+        # 直接进行说话人分离，跳过对齐步骤
+        # 注意：对齐将在用户编辑字幕后的resume阶段进行
+        events = daemon_request("diarize", segments=segments, audio=str(input_audio))
+        if events is not None:
+            subs = pysubs2.SSAFile()
+            subs.events = [pysubs2.SSAEvent(**event) for event in events]
+            return subs
+
+        print("加载说话人分离模型...")
         try:
-            # 使用HF_HOME环境变量设置的缓存目录
-            download_root = hf_home
-            local_files_only = os.environ.get('HF_HUB_OFFLINE', '0') == '1'
+            from .audio import load_pcm
 
-            print(f"🔧 模型缓存目录: {download_root}")
-            print(f"🔧 离线模式: {local_files_only}")
+            audio = load_pcm(input_audio)
 
-            model = whisperx.load_model(
-                whisperx_model,
-                device=device,
-                compute_type=compute_type,
-                asr_options=options,
-                language="zh",
-                threads=8,
-                download_root=download_root,
-                local_files_only=local_files_only
-            )
-        except Exception as model_error:
-            print(f"⚠️ 加载whisperx模型失败: {model_error}")
-            print("尝试使用本地模型或降级模型...")
-            # 尝试使用更简单的模型
-            try:
-                model = whisperx.load_model(
-                    "base",  # 使用基础模型
-                    device=device,
-                    compute_type=compute_type,
-                    asr_options=options,
-                    language="zh",
-                    threads=8,
-                    local_files_only=False
-                )
-                print("✅ 成功加载基础模型")
-            except Exception as fallback_error:
-                print(f"❌ 基础模型也加载失败: {fallback_error}")
-                raise model_error
-
-        print("加载音频文件...")
-        audio = whisperx.load_audio(str(input_audio))
+            # 使用SpeechBrain进行说话人分离
+            return speechbrain_speaker_diarization(segments, audio, input_audio)
 
-        print("开始转录...")
+        except ImportError as import_error:
+            print(f"❌ 缺少SpeechBrain依赖: {import_error}")
+            print("请安装说话人分离依赖:")
+            print("pip install speechbrain")
+            raise Exception("说话人分离需要安装speechbrain")
 
-        # 从环境变量获取批处理配置
-        batch_size = int(os.environ.get('WHISPERX_BATCH_SIZE', '8'))
-        chunk_size = int(os.environ.get('WHISPERX_CHUNK_SIZE', '10'))
+        except Exception as diarize_error:
+            print(f"❌ 说话人分离失败: {diarize_error}")
+            print("可能的原因:")
+            print("1. 网络连接问题，无法下载模型")
+            print("2. 音频文件格式不支持")
+            print("3. 内存不足")
+            raise
 
-        print(f"🔧 转录参数: batch_size={batch_size}, chunk_size={chunk_size}")
+    except Exception as diarize_error:
+        print(f"⚠️ 说话人分离失败: {diarize_error}")
+        print("回退到普通转录模式（不含说话人分离）...")
+        return pysubs2.load_from_whisper(segments)
 
-        result = model.transcribe(
-            audio, language="zh", print_progress=True,
-            batch_size=batch_size, chunk_size=chunk_size
-        )
 
-        if "segments" not in result or not result["segments"]:
-            print("⚠️ 转录结果为空，创建空字幕文件")
-            empty_subs = pysubs2.SSAFile()
-            empty_subs.save(str(output_srt))
-            return
+def run_asr(asr, input_audio: Path, prompt: str, source: Path = None):
+    """
+    用指定后端转录；长录音分块转录并逐块保存检查点，CPU核数足够时多个
+    进程并行（见 chunks）
+
+    Args:
+        input_audio: 16kHz单声道WAV；给出source时由本函数（或后端）生成
+        source: 原始音视频文件
+    """
+    from . import cache
+    from .asr import audio_duration
+    from .chunks import checkpoints_enabled, parallel_workers, transcribe_chunked
+    from .ingest import audio_path, ingest
+    from .mediainfo import duration as media_duration
 
-        print(f"转录完成，共 {len(result['segments'])} 个片段")
+    try:
+        duration = media_duration(source) if source is not None else audio_duration(input_audio)
+    except Exception:
+        duration = 0
+    workers = parallel_workers(asr, duration)
+    if workers <= 1 and not checkpoints_enabled(asr, duration):
+        return asr.run(input_audio, prompt, source=source)
 
-        try:
-            print("🔄 开始说话人分离...")
+    if source is not None:
+        # 分块需要完整的WAV，不走边解码边转录
+        cache.place(audio_path(ingest(source)), input_audio)
+    return transcribe_chunked(asr, input_audio, prompt, workers)
 
-            # 直接进行说话人分离，跳过对齐步骤
-            # 注意：对齐将在用户编辑字幕后的resume阶段进行
-            print("加载说话人分离模型...")
+
+def transcribe_speech_only(asr, input_audio: Path, prompt: str, min_gap: float,
+                           source: Path = None):
+    """
+    跳过长于min_gap秒的静音后转录（见 gate），返回映射回原始时间线的片段
+
+    Args:
+        asr: ASR后端
+        input_audio: 16kHz单声道WAV；给出source时由本函数生成
+        source: 原始音视频文件
+    """
+    from . import cache
+    from .gate import SpeechMap
+    from .ingest import audio_path, ingest
+    from .vad import get_timeline
+
+    if source is not None:
+        # 需要先有完整的WAV才能决定跳过哪些部分，不走边解码边转录
+        cache.place(audio_path(ingest(source)), input_audio)
+
+    speech_map = SpeechMap.from_timeline(get_timeline(input_audio), min_gap)
+    if len(speech_map.spans) <= 1 and speech_map.skipped <= 0:
+        print(f"没有长于 {min_gap:g}s 的静音，转录完整音频")
+        # 同样按时长分块并行转录、写检查点
+        return run_asr(asr, input_audio, prompt)
+
+    compact = input_audio.with_name(f"{input_audio.stem}_speech.wav")
+    speech_map.compact(input_audio, compact)
+    speech_map.report()
+    segments = run_asr(asr, compact, prompt)
+    return speech_map.remap_segments(segments)
+
+
+def transcribe_cached(asr, input_audio: Path, prompt: str, source: Path = None,
+                      min_gap: float = None):
+    """
+    转录并缓存原始片段；同一段音频用相同的后端设置、提示词和分块参数再次
+    转录时直接返回缓存的片段（见 asr.result_key）。与以前转录过的文件部分
+    相同时只转录变化的部分（见 reuse；源文件尚未解码时只在
+    TRANSCRIPT_REUSE_PREDECODE=1 时比较，默认边解码边转录）
+
+    Args:
+        input_audio: 16kHz单声道WAV；给出source时由转录过程生成
+        source: 原始音视频文件
+        min_gap: 跳过长于此时长的静音（见 transcribe_speech_only）
+    """
+    from . import cache, reuse
+    from .asr import result_key, settings_key
+    from .chunks import CHUNK_OVERLAP, checkpoint_mode, chunk_seconds
+    from .ingest import audio_path, ingest
+
+    def run(source):
+        if min_gap:
+            return transcribe_speech_only(asr, input_audio, prompt, min_gap, source=source)
+        return run_asr(asr, input_audio, prompt, source=source)
+
+    if not cache.enabled():
+        return run(source)
+
+    if source is not None:
+        # 已经解码过的文件先放好WAV，才能按音频指纹查找转录结果
+        decoded = cache.lookup("wav", wav_cache_key(source), ".wav")
+        if decoded is not None:
+            cache.place(decoded, input_audio)
+            source = None
+        elif reuse.predecode():
+            # 要与转录过的文件比较内容，先完成解码，不再边解码边转录
+            cache.place(audio_path(ingest(source)), input_audio)
+            source = None
+
+    options = {"skip_silence": min_gap, "chunk_seconds": chunk_seconds(),
+               "chunk_overlap": CHUNK_OVERLAP, "checkpoint": checkpoint_mode()}
+    if source is None:
+        hit = cache.lookup("asr", result_key(asr, input_audio, prompt, options), ".json")
+        if hit is not None:
+            print(f"♻️  复用缓存的{asr.name}转录结果: {hit}")
+            with open(hit, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+    settings = settings_key(asr, prompt, options)
+    segments = None
+    if source is None and reuse.enabled():
+        segments = reuse.transcribe_incremental(asr, input_audio, prompt, settings)
+    if segments is None:
+        segments = run(source)
+
+    def write(target: Path):
+        with open(target, "w", encoding="utf-8") as f:
+            json.dump(segments, f, ensure_ascii=False, default=float)
+
+    try:
+        cache.get_or_create("asr", result_key(asr, input_audio, prompt, options), write,
+                            suffix=".json")
+        if reuse.enabled():
+            reuse.remember(input_audio, segments, settings)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 无法缓存转录结果: {e}")
+    return segments
+
+
+def transcribe_to_srt(input_audio: Path, output_srt: Path, prompt: str,
+                      enable_diarization=False, backend: str = None, source: Path = None,
+                      skip_silence: float = None):
+    """
+    转录16kHz单声道音频并保存为SRT
+
+    按本机实测的实时率选择最快的可用ASR后端，失败时依次尝试其它后端；
+    说话人分离作为独立阶段处理任意后端的输出。
+
+    Args:
+        input_audio: 输入音频文件路径
+        output_srt: 输出字幕文件路径
+        prompt: 转录提示词
+        enable_diarization: 是否进行说话人分离
+        backend: 指定的ASR后端名称（见 transcript.asr）
+        source: 原始音视频文件。给出时由后端生成input_audio，支持的后端
+            （whisperx）会边解码边转录
+        skip_silence: 跳过长于此时长（秒）的静音后再转录，默认读取
+            TRANSCRIPT_SKIP_SILENCE，未设置时转录完整音频
+
+    Returns:
+        str: 实际使用的后端名称
+    """
+    import pysubs2
+
+    from .asr import select_backends
+    from .chunks import discard_checkpoints
+    from .gate import skip_silence_threshold
+
+    min_gap = skip_silence_threshold(skip_silence)
+
+    try:
+        backends = select_backends(backend)
+        if not backends:
+            raise RuntimeError("没有可用的ASR后端（需要安装whisperx或配置whisper.cpp）")
+
+        for i, asr in enumerate(backends):
+            rtf = asr.realtime_factor()
+            speed = f"，实时率 {rtf:.3f}" if rtf is not None else "，尚无测速数据"
+            print(f"🚀 使用{asr.name}转录音频{speed}: {input_audio} -> {output_srt}")
             try:
-                # 使用SpeechBrain进行说话人分离
-                subs = speechbrain_speaker_diarization(result["segments"], audio, input_audio)
-
-            except ImportError as import_error:
-                print(f"❌ 缺少SpeechBrain依赖: {import_error}")
-                print("请安装说话人分离依赖:")
-                print("pip install speechbrain")
-                raise Exception("说话人分离需要安装speechbrain")
-
-            except Exception as diarize_error:
-                print(f"❌ 说话人分离失败: {diarize_error}")
-                print("可能的原因:")
-                print("1. 网络连接问题，无法下载模型")
-                print("2. 音频文件格式不支持")
-                print("3. 内存不足")
-                raise
+                segments = transcribe_cached(asr, input_audio, prompt, source=source,
+                                             min_gap=min_gap)
+                break
+            except Exception as e:
+                print(f"⚠️ {asr.name}转录失败: {e}")
+                if i == len(backends) - 1:
+                    raise
+                print(f"回退到{backends[i + 1].name}转录...")
 
-        except Exception as diarize_error:
-            print(f"⚠️ 说话人分离失败: {diarize_error}")
-            print("回退到普通转录模式（不含说话人分离）...")
-            subs = pysubs2.load_from_whisper(result["segments"])
+        if not segments:
+            print("⚠️ 转录结果为空，创建空字幕文件")
+            pysubs2.SSAFile().save(str(output_srt))
+            discard_checkpoints(input_audio)
+            return asr.name
+
+        print(f"转录完成，共 {len(segments)} 个片段")
+
+        if enable_diarization:
+            print("🎭 启用说话人分离功能")
+            subs = diarize_segments(segments, input_audio)
+        else:
+            subs = pysubs2.load_from_whisper(segments)
 
         subs.save(str(output_srt))
         print(f"字幕文件已保存: {output_srt}")
+        # 转录失败时保留检查点，重新运行时从已完成的块继续
+        discard_checkpoints(input_audio)
+        return asr.name
 
     except Exception as e:
-        print(f"❌ whisperx转录失败: {e}")
+        print(f"❌ 转录失败: {e}")
         # 创建一个空的字幕文件以避免后续错误
         print("创建空字幕文件以避免后续错误...")
-        empty_subs = pysubs2.SSAFile()
-        empty_subs.save(str(output_srt))
+        pysubs2.SSAFile().save(str(output_srt))
         raise
 
 
+def transcriptx(input_audio: Path, output_srt: Path, prompt: str):
+    """使用whisperx进行音频转录，支持Apple Silicon优化"""
+    return transcribe_to_srt(input_audio, output_srt, prompt, backend="whisperx")
+
 
+def transcriptx_with_diarization(input_audio: Path, output_srt: Path, prompt: str):
+    """使用whisperx进行音频转录，支持说话人分离和Apple Silicon优化"""
+    return transcribe_to_srt(input_audio, output_srt, prompt,
+                             enable_diarization=True, backend="whisperx")
 
 
 def get_audio_info(audio_file: Path):
     """
-    获取音频文件的采样率和声道信息
+    获取音频文件的采样率和声道信息（走媒体信息缓存，见 mediainfo）
 
     Returns:
         tuple: (sample_rate, channels) 或 (None, None) 如果检测失败
     """
+    from . import mediainfo
+
     try:
-        import subprocess
-        cmd = [
-            "ffprobe", "-v", "quiet", "-print_format", "json", "-show_streams",
-            str(audio_file)
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode == 0:
-            import json
-            data = json.loads(result.stdout)
-            for stream in data.get("streams", []):
-                if stream.get("codec_type") == "audio":
-                    sample_rate = int(stream.get("sample_rate", 0))
-                    channels = int(stream.get("channels", 0))
-                    return sample_rate, channels
+        audio = mediainfo.probe(audio_file)["audio"]
+        if audio:
+            return audio["sample_rate"], audio["channels"]
         return None, None
     except Exception as e:
         print(f"⚠️ 获取音频信息失败: {e}")
         return None, None
 
 
+def wav_format(wav_file: Path):
+    """
+    从WAV头读取采样率和声道数；不是WAV文件时用ffprobe
+
+    Returns:
+        tuple: (sample_rate, channels) 或 (None, None) 如果检测失败
+    """
+    from .audio import parse_wav_header
+
+    try:
+        with open(wav_file, "rb") as f:
+            sample_rate, channels, _, _, _ = parse_wav_header(f)
+        return sample_rate, channels
+    except Exception:
+        return get_audio_info(wav_file)
+
+
+# 转换参数，作为WAV缓存键的一部分；修改转换命令时需要同步修改
+WAV_PARAMS = "16000hz-mono-s16le"
+
+
+def wav_cache_key(input_file: Path) -> str:
+    """16kHz单声道WAV在缓存中的键：源文件内容指纹 + 转换参数"""
+    from . import cache
+
+    return f"{cache.file_fingerprint(input_file)}-{WAV_PARAMS}"
+
+
 def ensure_16khz_mono_wav(input_file: Path, output_wav: Path, force_convert=False):
     """
     确保音频文件为16kHz单声道WAV格式
@@ -748,11 +1332,13 @@ def ensure_16khz_mono_wav(input_file: Path, output_wav: Path, force_convert=Fals
         output_wav: 输出WAV文件路径
         force_convert: 是否强制转换（即使已经是正确格式）
     """
+    from .threads import thread_lease
+
     need_convert = force_convert
 
     if output_wav.exists() and not force_convert:
         # 检查现有文件的格式
-        sample_rate, channels = get_audio_info(output_wav)
+        sample_rate, channels = wav_format(output_wav)
         if sample_rate == 16000 and channels == 1:
             print(f"✅ 音频已是16kHz单声道格式: {output_wav}")
             return
@@ -763,13 +1349,28 @@ def ensure_16khz_mono_wav(input_file: Path, output_wav: Path, force_convert=Fals
         need_convert = True
 
     if need_convert:
-        print(f"🔄 转换音频为16kHz单声道WAV: {input_file} -> {output_wav}")
-        # 统一的转换命令：16kHz, 单声道, PCM 16位
-        cmd = f"ffmpeg -i '{input_file}' -vn -acodec pcm_s16le -ar 16000 -ac 1 -y '{output_wav}' -v error"
-        execute(cmd)
+        from . import cache
+
+        def convert(target: Path):
+            print(f"🔄 转换音频为16kHz单声道WAV: {input_file} -> {output_wav}")
+            # 统一的转换命令：16kHz, 单声道, PCM 16位
+            with thread_lease("ffmpeg") as lease:
+                cmd = f"ffmpeg -threads {lease.threads} -i '{input_file}' -vn -acodec pcm_s16le -ar 16000 -ac 1 -f wav -y '{target}' -v error"
+                execute(cmd)
+
+        if cache.enabled():
+            # 按源文件内容和转换参数缓存，源文件未变化时不再重新解码
+            cached, hit = cache.get_or_create("wav", wav_cache_key(input_file), convert,
+                                              suffix=".wav")
+            cache.place(cached, output_wav)
+            if hit:
+                print(f"♻️  复用已解码的16kHz单声道音频: {output_wav}")
+                return
+        else:
+            convert(output_wav)
 
-        # 验证转换结果
-        sample_rate, channels = get_audio_info(output_wav)
+        # 验证转换结果：只读WAV头，不再调用ffprobe
+        sample_rate, channels = wav_format(output_wav)
         if sample_rate == 16000 and channels == 1:
             print(f"✅ 音频转换成功: 16kHz单声道")
         else:
@@ -795,8 +1396,11 @@ def detect_silence_boundaries(audio_segment, sample_rate=16000, silence_threshol
     """
     检测音频片段中的静音边界，用于进一步分割长片段
 
+    能量计算和静音段查找都是向量化的（见 silence.SilenceIndex），整段录音
+    也可以直接使用。
+
     Args:
-        audio_segment: 音频数据
+        audio_segment: 音频数据（float32数组或PCMBuffer）
         sample_rate: 采样率
         silence_threshold: 静音阈值
         min_silence_duration: 最小静音持续时间（秒）
@@ -804,43 +1408,17 @@ def detect_silence_boundaries(audio_segment, sample_rate=16000, silence_threshol
     Returns:
         list: 静音边界的时间点（相对于片段开始的秒数）
     """
-    import numpy as np
-
-    # 计算音频能量
-    window_size = int(0.1 * sample_rate)  # 100ms窗口
-    energy = []
-
-    for i in range(0, len(audio_segment) - window_size, window_size // 2):
-        window = audio_segment[i:i + window_size]
-        energy.append(np.mean(window ** 2))
+    from .silence import SilenceIndex, window_energy
 
-    energy = np.array(energy)
+    # 100ms窗口，50%重叠
+    window_size = int(0.1 * sample_rate)
+    hop = window_size // 2
+    energy = window_energy(audio_segment, window_size, hop)
 
-    # 检测静音区域
-    silence_mask = energy < silence_threshold
-
-    # 找到静音区域的边界
-    boundaries = []
-    in_silence = False
-    silence_start = 0
-
-    for i, is_silent in enumerate(silence_mask):
-        time_pos = i * (window_size // 2) / sample_rate
-
-        if is_silent and not in_silence:
-            # 静音开始
-            silence_start = time_pos
-            in_silence = True
-        elif not is_silent and in_silence:
-            # 静音结束
-            silence_duration = time_pos - silence_start
-            if silence_duration >= min_silence_duration:
-                # 在静音中点添加边界
-                boundary_time = silence_start + silence_duration / 2
-                boundaries.append(boundary_time)
-            in_silence = False
-
-    return boundaries
+    # 延续到片段末尾的静音没有结束点，不作为边界
+    index = SilenceIndex.from_energy(energy, hop / sample_rate, silence_threshold,
+                                     min_silence_duration, include_trailing=False)
+    return index.boundaries()
 
 
 def filter_prompt_artifacts(segments, prompts_to_remove=None):
@@ -889,13 +1467,14 @@ def filter_prompt_artifacts(segments, prompts_to_remove=None):
     return filtered_segments
 
 
-def split_long_segments_by_punctuation(segments, max_duration=4.0):
+def split_long_segments_by_punctuation(segments, max_duration=4.0, timeline=None):
     """
     基于标点符号和时长将过长的片段分割
 
     Args:
         segments: 原始片段列表
         max_duration: 最大片段持续时间（秒）
+        timeline: VAD时间线，给出时把按字数比例估算的分割时间移到附近的停顿
 
     Returns:
         list: 分割后的片段列表
@@ -937,6 +1516,14 @@ def split_long_segments_by_punctuation(segments, max_duration=4.0):
             # 按时间比例分配
             time_ratio = len(text1) / len(text)
             split_time = segment["start"] + duration * time_ratio
+            if timeline is not None:
+                # 两侧各至少保留五分之一，避免切出过短的片段
+                margin = duration / 5
+                pause = timeline.nearest_pause(split_time, duration / 4,
+                                               segment["start"] + margin,
+                                               segment["end"] - margin)
+                if pause is not None:
+                    split_time = pause
 
             new_segments.append({
                 "start": segment["start"],
@@ -956,7 +1543,31 @@ def split_long_segments_by_punctuation(segments, max_duration=4.0):
     return new_segments
 
 
-def speechbrain_speaker_diarization(segments, audio, audio_file_path):
+def load_speaker_model():
+    """从模型注册表获取SpeechBrain ECAPA说话人识别模型"""
+    from .models import ModelKey, get_registry
+
+    key = ModelKey("speechbrain/spkrec-ecapa-voxceleb", "cpu", "float32")
+    return get_registry().get(key, _load_speaker_model)
+
+
+def _load_speaker_model():
+    """加载SpeechBrain ECAPA说话人识别模型"""
+    from speechbrain.inference import SpeakerRecognition
+
+    from .resolver import resolve
+
+    print("加载SpeechBrain说话人识别模型...")
+    local_snapshot = resolve("speaker")
+    # savedir使用HF_HOME下的固定绝对路径，避免在当前工作目录下重复生成模型文件
+    return SpeakerRecognition.from_hparams(
+        source=str(local_snapshot) if local_snapshot else 'speechbrain/spkrec-ecapa-voxceleb',
+        savedir=str(Path(hf_home) / "speechbrain" / "spkrec-ecapa-voxceleb")
+    )
+
+
+def speechbrain_speaker_diarization(segments, audio, audio_file_path, verification=None,
+                                    timeline=None):
     """
     使用SpeechBrain进行说话人分离，支持长片段的智能分割
 
@@ -964,14 +1575,18 @@ def speechbrain_speaker_diarization(segments, audio, audio_file_path):
         segments: WhisperX转录的片段
         audio: 音频数据
         audio_file_path: 音频文件路径
+        verification: 已加载的说话人识别模型，为None时现场加载
+        timeline: VAD时间线，为None时读取（或计算）audio_file_path的时间线；
+            用于在停顿处分割长片段，并在提取特征前去掉片段两端的非语音部分
 
     Returns:
         pysubs2.SSAFile: 带说话人标签的字幕对象
     """
+    import pysubs2
+
     print("🎭 使用SpeechBrain进行说话人分离...")
 
     try:
-        from speechbrain.inference import SpeakerRecognition
         import torch
         import numpy as np
 
@@ -983,53 +1598,69 @@ def speechbrain_speaker_diarization(segments, audio, audio_file_path):
         if original_count > filtered_count:
             print(f"已过滤 {original_count - filtered_count} 个无效片段")
 
+        if timeline is None:
+            from .vad import try_get_timeline
+
+            timeline = try_get_timeline(audio_file_path)
+
         # 然后分割过长的片段
         print("🔪 分割过长的音频片段...")
-        segments = split_long_segments_by_punctuation(segments, max_duration=4.0)
+        segments = split_long_segments_by_punctuation(segments, max_duration=4.0,
+                                                      timeline=timeline)
         print(f"最终共有 {len(segments)} 个有效片段")
 
         # 加载说话人识别模型
-        print("加载SpeechBrain说话人识别模型...")
-        verification = SpeakerRecognition.from_hparams(
-            source='speechbrain/spkrec-ecapa-voxceleb',
-            savedir='tmp/spkrec-ecapa-voxceleb'
-        )
+        if verification is None:
+            verification = load_speaker_model()
+
+        from .threads import thread_lease
 
         # 为每个片段提取说话人特征
         print("提取说话人特征...")
         speaker_embeddings = []
         valid_segments = []
 
-        for i, segment in enumerate(segments):
-            start_time = segment["start"]
-            end_time = segment["end"]
-
-            # 提取音频片段
-            start_sample = int(start_time * 16000)  # 假设16kHz采样率
-            end_sample = int(end_time * 16000)
-
-            if end_sample > len(audio):
-                end_sample = len(audio)
-            if start_sample >= end_sample:
-                continue
-
-            audio_segment = audio[start_sample:end_sample]
-
-            # 确保音频片段足够长（至少0.5秒）
-            if len(audio_segment) < 8000:  # 0.5秒 * 16000Hz
-                continue
-
-            # 转换为torch tensor
-            audio_tensor = torch.FloatTensor(audio_segment).unsqueeze(0)
-
-            # 提取说话人嵌入
-            try:
-                embedding = verification.encode_batch(audio_tensor)
-                speaker_embeddings.append(embedding.squeeze().cpu().numpy())
-                valid_segments.append(segment)
-            except Exception as e:
-                print(f"⚠️ 片段 {i} 特征提取失败: {e}")
-                continue
+        with thread_lease("torch") as lease:
+            for i, segment in enumerate(segments):
+                # 其它阶段开始或结束时跟着调整torch线程数
+                if i % 20 == 0:
+                    lease.apply_torch()
+
+                start_time = segment["start"]
+                end_time = segment["end"]
+                if timeline is not None:
+                    # 只用有语音的部分提取特征；完全没有语音的片段不参与聚类
+                    trimmed = timeline.trim(start_time, end_time)
+                    if trimmed is None:
+                        continue
+                    start_time, end_time = trimmed
+
+                # 提取音频片段
+                start_sample = int(start_time * 16000)  # 假设16kHz采样率
+                end_sample = int(end_time * 16000)
+
+                if end_sample > len(audio):
+                    end_sample = len(audio)
+                if start_sample >= end_sample:
+                    continue
+
+                audio_segment = audio[start_sample:end_sample]
+
+                # 确保音频片段足够长（至少0.5秒）
+                if len(audio_segment) < 8000:  # 0.5秒 * 16000Hz
+                    continue
+
+                # 转换为torch tensor
+                audio_tensor = torch.FloatTensor(audio_segment).unsqueeze(0)
+
+                # 提取说话人嵌入
+                try:
+                    embedding = verification.encode_batch(audio_tensor)
+                    speaker_embeddings.append(embedding.squeeze().cpu().numpy())
+                    valid_segments.append(segment)
+                except Exception as e:
+                    print(f"⚠️ 片段 {i} 特征提取失败: {e}")
+                    continue
 
         if len(speaker_embeddings) < 2:
             print("⚠️ 有效音频片段太少，无法进行说话人分离")
@@ -1145,7 +1776,8 @@ def is_video_file(file_path: Path) -> bool:
     return file_path.suffix.lower() in video_extensions
 
 
-def transcript(input_file: Path, output_dir: Path = None, dry_run=False, enable_diarization=True):
+def transcript(input_file: Path, output_dir: Path = None, dry_run=False, enable_diarization=True,
+               skip_silence: float = None):
     """
     将视频或音频文件转换为字幕文件，自动生成两个版本：
     1. SRT文件（不带对话人标识）
@@ -1154,9 +1786,16 @@ def transcript(input_file: Path, output_dir: Path = None, dry_run=False, enable_
     Args:
         input_file: 输入视频或音频文件路径
         output_dir: 输出目录，如果为None则将srt文件保存到项目根目录
-        dry_run: 是否为试运行模式
+        dry_run: 是否为试运行模式（不转录，只返回将要生成的文件路径）
         enable_diarization: 是否启用说话人分离功能（默认为True）
+        skip_silence: 跳过长于此时长（秒）的静音再转录，时间戳映射回原始
+            时间线；默认读取 TRANSCRIPT_SKIP_SILENCE，未设置时不跳过
+
+    Returns:
+        tuple: (srt文件路径, 带说话人标识的文本文件路径)
     """
+    from . import artifacts
+
     input_file = Path(input_file)
 
     # 验证输入文件存在
@@ -1198,11 +1837,12 @@ def transcript(input_file: Path, output_dir: Path = None, dry_run=False, enable_
             "timestamp": datetime.datetime.now().isoformat()
             }, f, indent=2)
 
-    # 复制文件到工作目录
+    # 把文件放进工作目录：优先硬链接/reflink/符号链接，跨设备才复制；
+    # 各种方式都保留mtime，后续阶段可以凭 (大小, mtime) 认出原始文件的导入结果
     media_file = working_dir / input_file.name
-    if not media_file.exists():
-        print(f"复制{'音频' if is_audio else '视频'}文件到工作目录: {input_file} -> {media_file}")
-        shutil.copy(input_file, media_file)
+    method = artifacts.stage(input_file, media_file)
+    if method != "reuse":
+        print(f"放置{'音频' if is_audio else '视频'}文件到工作目录（{method}）: {input_file} -> {media_file}")
 
     # 设置临时srt文件路径（在工作目录中）
     temp_srt = working_dir / f"{name}.srt"
@@ -1219,40 +1859,42 @@ def transcript(input_file: Path, output_dir: Path = None, dry_run=False, enable_
     # 创建专用的16kHz单声道音频文件用于转录（不覆盖原文件）
     transcription_wav = media_file.parent / f"{media_file.stem}_transcription.wav"
 
-    # 统一处理：无论音频还是视频，都转换为16kHz单声道用于转录
+    # 统一处理：无论音频还是视频，都转换为16kHz单声道用于转录。解码由ASR
+    # 后端完成，whisperx可以边解码边转录
     file_type = "音频" if is_audio else "视频"
     print(f"📝 从{file_type}创建16kHz单声道音频用于转录: {transcription_wav.name}")
-    ensure_16khz_mono_wav(media_file, transcription_wav, force_convert=True)
 
     # 生成字幕到临时位置
     print("生成字幕...")
 
-    # 检查whisper.cpp是否可用，如果不可用则使用whisperx
-    whisper_cpp_available = cpp_path.exists() and cpp_model.exists()
+    final_clean_srt = final_output_dir / f"{name}.srt"
+    final_speaker_txt = final_output_dir / f"{name}-speakers.txt"
 
-    if enable_diarization:
-        # 说话人分离必须使用whisperx，不使用whisper.cpp
-        print("🎭 说话人分离功能需要使用whisperx...")
-        transcriptx_with_diarization(transcription_wav, temp_srt, prompt)
-    elif whisper_cpp_available and not dry_run:
-        # 使用whisper.cpp进行纯转录（无说话人分离）
-        try:
-            print("🚀 使用whisper.cpp进行转录...")
-            transcript_cpp(transcription_wav, temp_srt, prompt, dry_run)
-        except Exception as e:
-            print(f"⚠️ whisper.cpp转录失败: {e}")
-            print("回退到whisperx转录...")
-            transcriptx(transcription_wav, temp_srt, prompt)
-    else:
-        # 使用whisperx进行转录
-        if not whisper_cpp_available:
-            print("⚠️ whisper.cpp不可用，使用whisperx转录...")
-        transcriptx(transcription_wav, temp_srt, prompt)
+    if dry_run:
+        from .asr import select_backends
+
+        names = [backend.name for backend in select_backends()]
+        print(f"试运行模式，跳过实际转录（可用后端: {', '.join(names) or '无'}）")
+        return final_clean_srt, final_speaker_txt
+
+    # 按实测速度选择ASR后端；说话人分离是独立阶段，任何后端都可以使用
+    transcribe_to_srt(transcription_wav, temp_srt, prompt,
+                      enable_diarization=enable_diarization, source=media_file,
+                      skip_silence=skip_silence)
 
     # 检查字幕文件是否生成成功
     if not temp_srt.exists():
         raise FileNotFoundError(f"字幕生成失败，文件不存在: {temp_srt}")
 
+    # 转录时已经完成一次解码；补齐导入产物（通常只是从缓存链接WAV），
+    # 剪辑和对齐阶段直接使用，不再重新探测或解码
+    from .ingest import ingest as media_ingest
+
+    try:
+        media_ingest(media_file)
+    except Exception as e:
+        print(f"⚠️ 媒体导入失败，后续阶段将直接读取媒体文件: {e}")
+
     print(f"✅ 字幕文件生成成功: {temp_srt}")
 
     # 应用自定义词典纠错
@@ -1263,14 +1905,13 @@ def transcript(input_file: Path, output_dir: Path = None, dry_run=False, enable_
     print("生成两个版本的转录文件...")
 
     # 1. 生成干净的SRT文件（不带对话人标识）
-    final_clean_srt = final_output_dir / f"{name}.srt"
     create_clean_srt_file(temp_srt, final_clean_srt)
 
     # 2. 生成带说话人标识的文本文件
-    final_speaker_txt = final_output_dir / f"{name}-speakers.txt"
     create_speaker_text_file(temp_srt, final_speaker_txt)
 
     cost(start, prefix="字幕生成完成 ")
+    artifacts.report()
     print(f"\n=== 转录文件生成完成 ===")
     print(f"✅ SRT字幕文件（无说话人标识）: {final_clean_srt}")
     print(f"✅ 文本文件（含说话人标识）: {final_speaker_txt}")
@@ -1283,30 +1924,56 @@ def transcript(input_file: Path, output_dir: Path = None, dry_run=False, enable_
     return final_clean_srt, final_speaker_txt
 
 
-def probe_duration(video):
-    """returns duration of a video in seconds"""
-    cmd = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-show_entries",
-        "format=duration",
-        "-of",
-        "default=noprint_wrappers=1:nokey=1",
-        video,
-    ]
-    duration = float(subprocess.check_output(cmd).strip())
-    return duration
+def probe_duration(video, working_dir: Path = None):
+    """returns duration of a video in seconds
 
+    已经导入（见 ingest）的文件直接使用导入时记录的时长，其它文件走媒体
+    信息缓存（见 mediainfo），同一个文件只探测一次
+    """
+    from . import ingest, mediainfo
 
-def cut_video(input_video: Path, to_del: List[Tuple[int, int, int]], out_dir: Path):
-    """根据slices剪去视频片段
+    metadata = ingest.load(Path(video), working_dir)
+    if metadata is not None:
+        return metadata["duration"]
 
-    ffmpeg -hide_banner -ss '60.08300' -i '/private/tmp/fa.mp4' -t '178.00000' -avoid_negative_ts make_zero -map '0:0' '-c:0' copy -map '0:1' '-c:1' copy -map_metadata 0 -movflags '+faststart' -default_mode infer_no_subs -ignore_unknown -f mp4 -y '/private/tmp/fa-00.01.00.083-00.03.58.083-seg2.mp4'
+    return mediainfo.duration(Path(video))
+
+
+# 剪辑点落在语音中时，向附近停顿移动的最大距离（秒）
+CUT_SNAP_SECONDS = 0.3
+
+
+def _media_timeline(media: Path, working_dir: Path = None):
+    """已导入媒体文件的VAD时间线，没有导入结果时返回None"""
+    from . import ingest
+    from .vad import try_get_timeline
+
+    metadata = ingest.load(Path(media), working_dir)
+    audio = ingest.audio_path(metadata) if metadata is not None else None
+    return try_get_timeline(audio) if audio is not None else None
+
+
+def plan_slices(to_del, duration: float, timeline=None):
     """
-    duration = probe_duration(input_video) * 1000
+    根据要删除的字幕区间计算保留的片段
 
+    Args:
+        to_del: [[index, start_ms, end_ms]]
+        duration: 媒体时长（毫秒）
+        timeline: VAD时间线，给出时把落在语音中的剪辑点移到
+            CUT_SNAP_SECONDS 内最近的停顿，避免切断字词
+
+    Returns:
+        list: [(start_ms, end_ms)]
+    """
     edges = [item for sublist in to_del for item in sublist[1:]]
+    if timeline is not None:
+        snapped = [int(round(timeline.snap(edge / 1000, CUT_SNAP_SECONDS) * 1000))
+                   for edge in edges]
+        # 移动后仍保持剪辑点的先后顺序
+        edges = []
+        for edge in snapped:
+            edges.append(max(edge, edges[-1]) if edges else edge)
     edges.insert(0, 0)
     edges.append(int(duration))
 
@@ -1314,6 +1981,57 @@ def cut_video(input_video: Path, to_del: List[Tuple[int, int, int]], out_dir: Pa
         edges = edges[2:]
 
     slices = [(edges[i], edges[i + 1]) for i in range(0, len(edges) - 1, 2)]
+    # 剪辑点移动后可能与相邻的剪辑点重合，去掉长度为0的片段
+    return [(start, end) for start, end in slices if end > start]
+
+
+def map_to_slices(ms: int, slices) -> int:
+    """
+    原时间轴上的时间（毫秒）在保留片段拼接之后的位置；落在删除部分中的
+    时间移到下一个保留片段的开头
+    """
+    offset = 0
+    for start, end in slices:
+        if ms < start:
+            return offset
+        if ms <= end:
+            return offset + ms - start
+        offset += end - start
+    return offset
+
+
+def _media_slices(media: Path, to_del, working_dir: Path = None):
+    """媒体文件要保留的片段（见 plan_slices）"""
+    duration = probe_duration(media, working_dir) * 1000
+    return plan_slices(to_del, duration, _media_timeline(media, working_dir))
+
+
+def _warn_off_keyframe(slices, keyframes, tolerance: float = 0.5):
+    """copy模式只能从关键帧开始，起点前最近的关键帧相差较多时提示"""
+    import bisect
+
+    for i, (start, _) in enumerate(slices):
+        secs = start / 1000
+        pos = bisect.bisect_right(keyframes, secs + 1e-3) - 1
+        if pos >= 0 and secs - keyframes[pos] > tolerance:
+            print(f"⚠️ 片段 {i} 起点 {secs:.3f}s 不在关键帧上，copy模式将从 "
+                  f"{keyframes[pos]:.3f}s 的关键帧开始")
+
+
+def cut_video(input_video: Path, to_del: List[Tuple[int, int, int]], out_dir: Path,
+              working_dir: Path = None, slices=None):
+    """根据slices剪去视频片段（slices为None时由to_del计算，见 plan_slices）
+
+    ffmpeg -hide_banner -ss '60.08300' -i '/private/tmp/fa.mp4' -t '178.00000' -avoid_negative_ts make_zero -map '0:0' '-c:0' copy -map '0:1' '-c:1' copy -map_metadata 0 -movflags '+faststart' -default_mode infer_no_subs -ignore_unknown -f mp4 -y '/private/tmp/fa-00.01.00.083-00.03.58.083-seg2.mp4'
+    """
+    from . import ingest
+
+    if slices is None:
+        slices = _media_slices(input_video, to_del, working_dir)
+
+    metadata = ingest.load(Path(input_video), working_dir)
+    if metadata is not None:
+        _warn_off_keyframe(slices, ingest.load_keyframes(metadata))
 
     tmp_files = []
 
@@ -1337,21 +2055,14 @@ def cut_video(input_video: Path, to_del: List[Tuple[int, int, int]], out_dir: Pa
     return list_file
 
 
-def cut_audio(input_audio: Path, to_del: List[Tuple[int, int, int]], out_dir: Path):
+def cut_audio(input_audio: Path, to_del: List[Tuple[int, int, int]], out_dir: Path,
+              working_dir: Path = None, slices=None):
     """根据slices剪去音频片段
 
     类似cut_video但处理音频文件
     """
-    duration = probe_duration(input_audio) * 1000
-
-    edges = [item for sublist in to_del for item in sublist[1:]]
-    edges.insert(0, 0)
-    edges.append(int(duration))
-
-    if edges[:2] == [0, 0]:
-        edges = edges[2:]
-
-    slices = [(edges[i], edges[i + 1]) for i in range(0, len(edges) - 1, 2)]
+    if slices is None:
+        slices = _media_slices(input_audio, to_del, working_dir)
 
     tmp_files = []
 
@@ -1385,6 +2096,9 @@ def sub(srt_file: Path):
     Args:
         srt_file (str): _description_
     """
+    import jieba
+    import pysubs2
+
     try:
         subs = pysubs2.load(str(srt_file))
     except Exception as e:
@@ -1454,6 +2168,9 @@ def cut():
     Args:
         working_dir: 工作目录，如果为None则从/tmp/transcript.log文件读取
     """
+    import jieba
+    import pysubs2
+
     # 读取工作日志
     log_file = Path("/tmp/transcript.log")
     if not log_file.exists():
@@ -1509,31 +2226,27 @@ def cut():
 
     subs = pysubs2.load(str(srt_file))
     keep_subs = pysubs2.SSAFile()
-    cum_lag: int = 0
 
-    def remove_event(to_del: list, i: int, event: Any) -> int:
+    def remove_event(to_del: list, i: int, event: Any):
         # 遇到连续删除，要进行合并
         if len(to_del) > 0 and to_del[-1][0] == i - 1:
             item = to_del[-1]
             item[0] = i
-            lag = event.end - item[2]
             item[2] = event.end
-            return lag
         else:
             to_del.append([i, event.start, event.end])
-            return event.duration
 
     deleted_count = 0
     for i, event in enumerate(subs.events):
         text = event.text
         if len(text) == 1 and text in markers:
-            cum_lag += remove_event(to_del, i, event)
+            remove_event(to_del, i, event)
             deleted_count += 1
             print(f"删除语助词: {event.text}")
             continue
 
         if text.startswith("[del]") or text.startswith("[DEL]"):
-            cum_lag += remove_event(to_del, i, event)
+            remove_event(to_del, i, event)
             deleted_count += 1
             print(f"删除标记字幕: {event.text}")
             continue
@@ -1549,10 +2262,15 @@ def cut():
         for word in warning_words:
             if word in event.text:
                 print(f"⚠️  警告: 字幕中发现需要人工复检的词汇 '{word}': {event.text}")
-        event.start -= cum_lag
-        event.end -= cum_lag
         keep_subs.events.append(event)
 
+    # 剪辑点可能被移到附近的停顿（见 plan_slices），字幕按实际保留的片段平移
+    slices = _media_slices(media_file, to_del, parent) if to_del else None
+    if slices is not None:
+        for event in keep_subs.events:
+            event.start = map_to_slices(event.start, slices)
+            event.end = map_to_slices(event.end, slices)
+
     keep_subs.save(str(out_srt))
     print(f"删除了 {deleted_count} 个字幕片段")
     print(f"保留了 {len(keep_subs.events)} 个字幕片段")
@@ -1561,11 +2279,11 @@ def cut():
     if to_del:
         if file_type == "audio":
             print("开始切分音频...")
-            cut_audio(media_file, to_del, workspace)
+            cut_audio(media_file, to_del, workspace, working_dir=parent, slices=slices)
             print("音频切分完成，开始合并")
         else:
             print("开始切分视频...")
-            cut_video(media_file, to_del, workspace)
+            cut_video(media_file, to_del, workspace, working_dir=parent, slices=slices)
             print("视频切分完成，开始合并和压缩")
     else:
         print("没有需要删除的片段，直接进行合并")
@@ -1578,15 +2296,9 @@ def cut():
 
 
 def adjust_subtitles_offset(srt: Path, opening_video: Path, full_srt: Path):
-    # dur_ms = int(round(probe_duration(opening_video) * 1000))
-    cmd = [
-        "ffprobe",
-        "-v", "error",
-        "-show_entries", "format=duration",
-        "-of", "default=noprint_wrappers=1:nokey=1",
-        opening_video,
-    ]
-    dur_ms = int(round(float(subprocess.check_output(cmd).strip()) * 1000))
+    import pysubs2
+
+    dur_ms = int(round(probe_duration(opening_video) * 1000))
 
     subs = pysubs2.load(str(srt))
     for event in subs.events:
@@ -1604,6 +2316,8 @@ def optimize_subtitles_for_display(srt_file: Path, output_srt: Path = None):
         srt_file: 输入字幕文件
         output_srt: 输出字幕文件，如果为None则覆盖原文件
     """
+    import pysubs2
+
     if output_srt is None:
         output_srt = srt_file
 
@@ -1693,6 +2407,8 @@ def get_adaptive_subtitle_style(srt_file: Path):
     Returns:
         str: FFmpeg字幕样式字符串
     """
+    import pysubs2
+
     subs = pysubs2.load(str(srt_file))
 
     # 分析字幕特征
@@ -1751,6 +2467,9 @@ def merge(output_path: Path = None,
 
     这一步之后，所有的字幕及剪辑都应该正确完成了
     """
+    from . import artifacts
+    from .threads import thread_lease
+
     # 读取工作日志
     log_file = Path("/tmp/transcript.log")
     if not log_file.exists():
@@ -1828,8 +2547,9 @@ def merge(output_path: Path = None,
             except RuntimeError:
                 print("⚠️ copy模式失败，尝试重新编码...")
                 # 如果copy模式失败，使用重新编码
-                cmd_encode = f"ffmpeg -hide_banner -f concat -safe 0 -i {merge_list} -fflags +genpts -c:v libx264 -preset medium -crf 23 -c:a aac -b:a 128k -map 0:v -map 0:a -movflags +faststart -y -f mp4 -video_track_timescale 600 -v error {merged_video}"
-                execute(cmd_encode, msg="合并完整视频(重新编码)")
+                with thread_lease("ffmpeg") as lease:
+                    cmd_encode = f"ffmpeg -hide_banner -f concat -safe 0 -i {merge_list} -fflags +genpts -c:v libx264 -preset medium -crf 23 -threads {lease.threads} -c:a aac -b:a 128k -map 0:v -map 0:a -movflags +faststart -y -f mp4 -video_track_timescale 600 -v error {merged_video}"
+                    execute(cmd_encode, msg="合并完整视频(重新编码)")
 
             # 如果有片头，需要调整字幕时间偏移
             if opening_video_path:
@@ -1869,12 +2589,13 @@ def merge(output_path: Path = None,
         print(f"剪辑音频: {final_audio}")
         print(f"字幕文件: {final_srt}")
 
-        # 复制剪辑后的音频文件
-        print("复制剪辑后的音频...")
-        shutil.copy2(merged_media, final_audio)
+        # 交付剪辑后的音频文件（同一文件系统上不复制数据）
+        print("输出剪辑后的音频...")
+        artifacts.publish(merged_media, final_audio)
 
-        # 复制字幕文件
-        shutil.copy2(aligned_srt, final_srt)
+        # 交付字幕文件
+        artifacts.publish(aligned_srt, final_srt)
+        artifacts.report()
 
         print("\n=== 音频处理完成 ===")
         print(f"✅ 剪辑音频: {final_audio}")
@@ -1902,16 +2623,19 @@ def merge(output_path: Path = None,
         # 获取自适应字幕样式
         subtitle_style = get_adaptive_subtitle_style(optimized_srt)
 
-        cmd = f"ffmpeg -hide_banner -i {merged_media} -vf \"subtitles={optimized_srt}:force_style='{subtitle_style}'\" -c:v libx264 -preset slow -crf 23 -c:a copy -v error -y '{final_with_sub}'"
-        execute(cmd, msg="生成带字幕版本")
+        with thread_lease("ffmpeg") as lease:
+            cmd = f"ffmpeg -hide_banner -i {merged_media} -vf \"subtitles={optimized_srt}:force_style='{subtitle_style}'\" -c:v libx264 -preset slow -crf 23 -threads {lease.threads} -c:a copy -v error -y '{final_with_sub}'"
+            execute(cmd, msg="生成带字幕版本")
 
         # 压缩未加字幕的视频
         print("生成无字幕版本...")
-        cmd = f"ffmpeg -hide_banner -i {merged_media} -c:v libx264 -preset slow -crf 23 -c:a copy -v error -y '{final_no_sub}'"
-        execute(cmd, msg="生成无字幕版本")
+        with thread_lease("ffmpeg") as lease:
+            cmd = f"ffmpeg -hide_banner -i {merged_media} -c:v libx264 -preset slow -crf 23 -threads {lease.threads} -c:a copy -v error -y '{final_no_sub}'"
+            execute(cmd, msg="生成无字幕版本")
 
-        # 复制字幕文件
-        shutil.copy2(aligned_srt, final_srt)
+        # 交付字幕文件
+        artifacts.publish(aligned_srt, final_srt)
+        artifacts.report()
 
         print("\n=== 视频处理完成 ===")
         print(f"✅ 带字幕视频: {final_with_sub}")
@@ -1923,6 +2647,9 @@ def merge(output_path: Path = None,
 
 def t2s(srt: str):
     """将繁中转换为简中"""
+    import opencc
+    import pysubs2
+
     srt_file = Path(srt)
     if not srt_file.exists():
         raise FileNotFoundError(f"字幕文件不存在: {srt_file}")
@@ -2040,43 +2767,13 @@ def auto(input_video: str, output_path: str = None,
 
 def test():
     """测试模型加载功能"""
-    import os
     print("HF_ENDPOINT:", os.environ.get("HF_ENDPOINT"))
     print("HF_HOME:", hf_home)
     print("Model directory:", model_dir)
 
-    # 设置离线模式
-    os.environ["TRANSFORMERS_OFFLINE"] = "1"
-    os.environ["HF_HUB_OFFLINE"] = "1"
-
-    device = "cpu"
     try:
         print("Loading align model...")
-
-        # 尝试使用本地路径
-        local_model_path = Path(model_dir) / "models--jonatasgrosman--wav2vec2-large-xlsr-53-chinese-zh-cn"
-        if local_model_path.exists():
-            # 查找最新的快照目录
-            snapshots_dir = local_model_path / "snapshots"
-            if snapshots_dir.exists():
-                snapshot_dirs = [d for d in snapshots_dir.iterdir() if d.is_dir()]
-                if snapshot_dirs:
-                    latest_snapshot = max(snapshot_dirs, key=lambda x: x.stat().st_mtime)
-                    print(f"Using local model from: {latest_snapshot}")
-                    model_name = str(latest_snapshot)
-                else:
-                    model_name = "jonatasgrosman/wav2vec2-large-xlsr-53-chinese-zh-cn"
-            else:
-                model_name = "jonatasgrosman/wav2vec2-large-xlsr-53-chinese-zh-cn"
-        else:
-            model_name = "jonatasgrosman/wav2vec2-large-xlsr-53-chinese-zh-cn"
-
-        model_a, metadata = whisperx.load_align_model(
-            language_code="zh",
-            device=device,
-            model_name=model_name,
-            model_dir=hf_home
-        )
+        model_a, metadata = load_align_model()
         print("✅ Model loaded successfully!")
         print(f"Model type: {type(model_a)}")
         print(f"Metadata: {metadata}")
@@ -0,0 +1,228 @@
+"""
+每个录音只计算一次的语音活动（VAD）时间线
+
+转录、说话人分离、长片段分割和剪辑规划都需要知道哪里有人说话、哪里是
+停顿。这里由能量包络（导入阶段已经算好，否则从WAV逐块计算）得到语音区间：
+噪声底取能量的低分位数，阈值为噪声底的若干倍（限制在固定范围内），短于
+VAD_MIN_SILENCE 的停顿并入语音，语音区间两端各留 VAD_PAD 秒余量。
+
+时间线按解码后音频的指纹缓存在 $TRANSCRIPT_CACHE_DIR/vad/ 中，进程内也会
+记住已经读取过的时间线，同一个任务的各个阶段只计算一次：
+
+    timeline = get_timeline(wav)
+    timeline.speech_in(10, 20)       # [(start, end)]
+    timeline.nearest_pause(600, 30)  # 600秒附近最近的停顿中点
+
+注意：whisperx 的 transcribe() 自带VAD，默认的转录路径仍会在每个转录窗口
+上再做一次（它的接口不接受外部给出的语音区间）；只有启用按时长分桶组批
+（TRANSCRIPT_BUCKET_BATCH=1，见 batching）时，转录才直接使用这里的时间线。
+"""
+
+import bisect
+import json
+import os
+from pathlib import Path
+
+# 算法或参数变化时修改，旧的缓存自动失效
+VAD_VERSION = "energy-v1"
+
+# 能量包络每帧的时长（秒），与导入阶段相同
+VAD_FRAME_SECONDS = 0.1
+
+# 噪声底取能量的分位数，阈值为噪声底的倍数，并限制在 [MIN, MAX] 之间
+VAD_NOISE_PERCENTILE = 10
+VAD_NOISE_RATIO = 8.0
+VAD_MIN_THRESHOLD = 1e-5
+VAD_MAX_THRESHOLD = 0.01
+
+# 短于此时长的停顿不算停顿（秒）
+VAD_MIN_SILENCE = 0.3
+
+# 语音区间两端的余量（秒）
+VAD_PAD = 0.1
+
+_memo = {}
+
+
+class VADTimeline:
+    """语音区间 [(start, end)]（秒，按时间排列、互不重叠）"""
+
+    def __init__(self, speech, duration: float, threshold: float = None):
+        self.speech = [(float(s), float(e)) for s, e in speech]
+        self.duration = float(duration)
+        self.threshold = threshold
+        self._starts = [s for s, _ in self.speech]
+        self._ends = [e for _, e in self.speech]
+
+    @classmethod
+    def from_energy(cls, energy, frame_seconds: float = VAD_FRAME_SECONDS):
+        """从逐帧平均能量（不重叠的帧）计算时间线"""
+        import numpy as np
+
+        from .silence import silent_runs
+
+        energy = np.asarray(energy, dtype=np.float64)
+        duration = len(energy) * frame_seconds
+        if not len(energy):
+            return cls([], 0.0, VAD_MAX_THRESHOLD)
+
+        noise = float(np.percentile(energy, VAD_NOISE_PERCENTILE))
+        threshold = min(VAD_MAX_THRESHOLD, max(VAD_MIN_THRESHOLD, noise * VAD_NOISE_RATIO))
+
+        voiced = energy >= threshold
+        # 把短停顿并入语音
+        starts, ends = silent_runs(~voiced)
+        min_frames = int(round(VAD_MIN_SILENCE / frame_seconds))
+        for s, e in zip(starts, ends):
+            if e - s < min_frames and s > 0 and e < len(energy):
+                voiced[s:e] = True
+
+        speech = []
+        for s, e in zip(*silent_runs(voiced)):
+            start = max(0.0, s * frame_seconds - VAD_PAD)
+            end = min(duration, e * frame_seconds + VAD_PAD)
+            if speech and start <= speech[-1][1]:
+                speech[-1] = (speech[-1][0], end)
+            else:
+                speech.append((start, end))
+        return cls(speech, duration, threshold)
+
+    def _overlapping(self, start: float, end: float) -> range:
+        first = bisect.bisect_right(self._ends, start)
+        last = bisect.bisect_left(self._starts, end)
+        return range(first, max(first, last))
+
+    def speech_in(self, start: float, end: float):
+        """[start, end) 内的语音区间（裁剪到范围内）"""
+        return [(max(self.speech[i][0], start), min(self.speech[i][1], end))
+                for i in self._overlapping(start, end)]
+
+    def speech_duration(self, start: float = 0.0, end: float = None) -> float:
+        end = self.duration if end is None else end
+        return sum(e - s for s, e in self.speech_in(start, end))
+
+    def is_speech(self, t: float) -> bool:
+        i = bisect.bisect_right(self._starts, t) - 1
+        return i >= 0 and t < self.speech[i][1]
+
+    def pauses(self, start: float = 0.0, end: float = None):
+        """[start, end) 内的非语音区间"""
+        end = self.duration if end is None else end
+        gaps = []
+        cursor = start
+        for s, e in self.speech_in(start, end):
+            if s > cursor:
+                gaps.append((cursor, s))
+            cursor = max(cursor, e)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def nearest_pause(self, t: float, search: float, lo: float = None, hi: float = None):
+        """
+        离t最近的停顿中点，只在 [t - search, t + search] 与 [lo, hi] 内查找；
+        停顿只有一部分在范围内时，中点限制到范围内
+
+        Returns:
+            float 或 None（范围内没有停顿）
+        """
+        lo = t - search if lo is None else max(lo, t - search)
+        hi = t + search if hi is None else min(hi, t + search)
+        if hi <= lo:
+            return None
+        if not self.is_speech(t) and lo <= t <= hi:
+            return t
+
+        # 与范围相交的完整停顿：相邻语音区间之间，以及开头和结尾
+        bounds = [0.0] + [x for pair in self.speech for x in pair] + [self.duration]
+        best = None
+        for i in range(0, len(bounds), 2):
+            s, e = bounds[i], bounds[i + 1]
+            if e <= s or e < lo or s > hi:
+                continue
+            mid = min(max((s + e) / 2, lo), hi)
+            if best is None or abs(mid - t) < abs(best - t):
+                best = mid
+        return best
+
+    def snap(self, t: float, limit: float) -> float:
+        """t落在语音中时，移到limit秒内最近的停顿；找不到时保持不变"""
+        pause = self.nearest_pause(t, limit)
+        return t if pause is None else pause
+
+    def trim(self, start: float, end: float):
+        """
+        去掉 [start, end) 两端的非语音部分
+
+        Returns:
+            tuple: (start, end)；范围内没有语音时返回None
+        """
+        speech = self.speech_in(start, end)
+        if not speech:
+            return None
+        return speech[0][0], speech[-1][1]
+
+    def to_dict(self) -> dict:
+        return {"version": VAD_VERSION, "duration": self.duration,
+                "threshold": self.threshold, "speech": self.speech}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data["speech"], data["duration"], data.get("threshold"))
+
+
+def compute_timeline(wav: Path) -> VADTimeline:
+    """从导入阶段的能量包络（没有时从WAV逐块计算）得到时间线"""
+    from .audio import SAMPLE_RATE, frame_energy, load_pcm
+    from .ingest import find_envelope
+
+    envelope = find_envelope(wav)
+    if envelope is None:
+        audio = load_pcm(wav)
+        try:
+            envelope = frame_energy(audio, int(SAMPLE_RATE * VAD_FRAME_SECONDS))
+        finally:
+            if hasattr(audio, "close"):
+                audio.close()
+    return VADTimeline.from_energy(envelope, VAD_FRAME_SECONDS)
+
+
+def get_timeline(wav: Path) -> VADTimeline:
+    """
+    返回16kHz单声道WAV的VAD时间线，按解码后音频的指纹缓存
+    """
+    from . import cache
+
+    wav = Path(wav)
+    stat = wav.stat()
+    memo_key = (str(wav.resolve()), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _memo:
+        return _memo[memo_key]
+
+    if not cache.enabled():
+        timeline = compute_timeline(wav)
+    else:
+        key = f"{cache.decoded_fingerprint(wav)}-{VAD_VERSION}"
+
+        def produce(target: Path):
+            print(f"🗣️  计算VAD时间线: {wav.name}")
+            with open(target, "w", encoding="utf-8") as f:
+                json.dump(compute_timeline(wav).to_dict(), f)
+
+        path, _ = cache.get_or_create("vad", key, produce, suffix=".json")
+        with open(path, "r", encoding="utf-8") as f:
+            timeline = VADTimeline.from_dict(json.load(f))
+
+    _memo[memo_key] = timeline
+    return timeline
+
+
+def try_get_timeline(wav: Path):
+    """get_timeline，失败时打印原因并返回None（VAD只用于改进结果，不是必需的）"""
+    if os.environ.get("TRANSCRIPT_VAD", "1") == "0":
+        return None
+    try:
+        return get_timeline(wav)
+    except Exception as e:
+        print(f"⚠️ 无法计算VAD时间线: {e}")
+        return None
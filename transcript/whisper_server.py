@@ -0,0 +1,201 @@
+"""
+常驻的whisper.cpp服务进程
+
+`whisper-cli` 每转录一个文件都要重新加载一次ggml模型，结果还要经过SRT文件
+中转。这里改为启动一次whisper.cpp自带的 `whisper-server`，之后每个文件都以
+multipart流式上传到 /inference，并直接取回带时间戳的JSON片段
+（response_format=verbose_json）。
+
+- 服务地址默认 http://127.0.0.1:8178，可通过 TRANSCRIPT_WHISPER_SERVER_URL
+  指向已经在运行的服务（此时不会启动或停止任何进程）
+- 地址上已经有服务在运行时直接复用（例如预加载工作进程池的父进程启动的服务）
+- 本进程启动的服务在进程退出时停止
+"""
+
+import atexit
+import http.client
+import json
+import os
+import subprocess
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlsplit
+
+DEFAULT_URL = "http://127.0.0.1:8178"
+
+# whisper.cpp不同版本中服务程序的名称
+SERVER_NAMES = ("whisper-server", "server")
+
+# 等待服务加载模型的最长时间（秒）
+STARTUP_TIMEOUT = 180
+
+# 上传音频时每次读取的块大小
+UPLOAD_BLOCK = 1024 * 1024
+
+_process = None
+
+
+def server_url() -> str:
+    return os.environ.get("TRANSCRIPT_WHISPER_SERVER_URL", DEFAULT_URL).rstrip("/")
+
+
+def find_server_binary(cpp_path: Path):
+    """在whisper.cpp目录中查找服务程序"""
+    for name in SERVER_NAMES:
+        for candidate in (Path(cpp_path) / name, Path(cpp_path) / "build" / "bin" / name):
+            if candidate.is_file() and os.access(candidate, os.X_OK):
+                return candidate
+    return None
+
+
+def _connection(url: str, timeout=None):
+    parts = urlsplit(url)
+    return http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+
+
+def is_running(url: str = None) -> bool:
+    """检查服务是否可以响应请求"""
+    try:
+        conn = _connection(url or server_url(), timeout=1.0)
+        try:
+            conn.request("GET", "/")
+            return conn.getresponse().status < 500
+        finally:
+            conn.close()
+    except OSError:
+        return False
+
+
+def start(cpp_path: Path, model: Path, threads: int, url: str = None) -> str:
+    """
+    确保服务在运行，必要时启动，返回服务地址
+
+    Args:
+        cpp_path: whisper.cpp目录
+        model: ggml模型文件
+        threads: 服务使用的线程数（启动后不再调整）
+    """
+    global _process
+
+    url = url or server_url()
+    if is_running(url):
+        return url
+
+    if "TRANSCRIPT_WHISPER_SERVER_URL" in os.environ:
+        raise ConnectionError(f"whisper.cpp服务不可用: {url}")
+
+    binary = find_server_binary(cpp_path)
+    if binary is None:
+        raise FileNotFoundError(f"找不到whisper.cpp服务程序: {cpp_path}")
+
+    parts = urlsplit(url)
+    cmd = [str(binary), "-m", str(model), "--host", parts.hostname,
+           "--port", str(parts.port or 80), "-t", str(threads), "-l", "zh"]
+    print(f"🚀 启动whisper.cpp服务: {' '.join(cmd)}")
+    _process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    atexit.register(stop)
+
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if _process.poll() is not None:
+            raise RuntimeError(f"whisper.cpp服务启动失败，退出码 {_process.returncode}")
+        if is_running(url):
+            print(f"✅ whisper.cpp服务已就绪: {url}")
+            return url
+        time.sleep(0.2)
+
+    stop()
+    raise TimeoutError(f"whisper.cpp服务在 {STARTUP_TIMEOUT} 秒内没有就绪")
+
+
+def stop():
+    """停止本进程启动的服务"""
+    global _process
+    if _process is None:
+        return
+    if _process.poll() is None:
+        _process.terminate()
+        try:
+            _process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _process.kill()
+    _process = None
+
+
+def _multipart(fields: dict, file_field: str, file_path: Path, boundary: str):
+    """返回 (各部分的生成器, 总长度)，文件内容按块读取，不整体载入内存"""
+    head = b""
+    for name, value in fields.items():
+        head += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+                 f"{value}\r\n").encode("utf-8")
+    head += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{file_field}\"; "
+             f"filename=\"{file_path.name}\"\r\nContent-Type: audio/wav\r\n\r\n").encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+    def body():
+        yield head
+        with open(file_path, "rb") as f:
+            while True:
+                block = f.read(UPLOAD_BLOCK)
+                if not block:
+                    break
+                yield block
+        yield tail
+
+    return body(), len(head) + file_path.stat().st_size + len(tail)
+
+
+def parse_segments(payload: dict):
+    """把verbose_json响应转换为 [{"start", "end", "text"}]（秒）"""
+    segments = []
+    for segment in payload.get("segments") or []:
+        if "start" in segment:
+            start, end = float(segment["start"]), float(segment["end"])
+        else:
+            # 旧版本服务返回厘秒单位的 t0/t1
+            start, end = segment["t0"] / 100, segment["t1"] / 100
+        text = (segment.get("text") or "").strip()
+        if text:
+            segments.append({"start": start, "end": end, "text": text})
+    return segments
+
+
+def transcribe(audio_path: Path, prompt: str, url: str = None):
+    """
+    上传16kHz单声道WAV并返回片段列表
+
+    Returns:
+        list: [{"start", "end", "text"}]，时间单位为秒
+    """
+    audio_path = Path(audio_path)
+    fields = {
+        "response_format": "verbose_json",
+        "language": "zh",
+        "temperature": "0.0",
+        "prompt": prompt,
+    }
+    boundary = uuid.uuid4().hex
+    body, length = _multipart(fields, "file", audio_path, boundary)
+
+    # 转录可能持续很久，不设读超时
+    conn = _connection(url or server_url())
+    try:
+        conn.putrequest("POST", "/inference")
+        conn.putheader("Content-Type", f"multipart/form-data; boundary={boundary}")
+        conn.putheader("Content-Length", str(length))
+        conn.endheaders()
+        for block in body:
+            conn.send(block)
+        response = conn.getresponse()
+        data = response.read()
+    finally:
+        conn.close()
+
+    if response.status != 200:
+        raise RuntimeError(f"whisper.cpp服务返回 {response.status}: {data[:200]!r}")
+
+    payload = json.loads(data)
+    if "error" in payload:
+        raise RuntimeError(f"whisper.cpp服务出错: {payload['error']}")
+    return parse_segments(payload)